@@ -4,17 +4,28 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from routes.grammar import grammar_bp
 from routes.vocab import vocab_bp
 from routes.akinator import akinator_bp
-from routes.flashcard import flashcard_bp
+from routes.flashcard import flashcard_bp, flashcard_log_writer
+from error_handler import error_log_sink
 from routes.youtube_listening import youtube_listening_bp
 from routes.blog import blog_bp
 from routes.admin import admin_bp
 from models import db, User, Feedback, OAuth
+from migrations import database_uri, ensure_schema, upgrade as upgrade_schema
+from log_retention import compact_log_tables
+from metrics_rollup import run_metrics_rollup, METRICS_ROLLUP_MINUTES
+from blog_metadata import metadata_index
+from blog_search import search_index
+from blog_publish import publish_changes
+from blog_sync import sync_blog, BLOG_SYNC_INTERVAL_SECONDS
+from google_drive_helper import warm_blog_documents, BLOG_CACHE_TTL_SECONDS
+from utils import instrumentation, tracing
 from forms import LoginForm, RegistrationForm
 from translations import get_text, get_user_language, get_user_font
 import datetime as dt
 import random
 import json
 import os
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
@@ -34,9 +45,9 @@ def get_blog_article_title(ref_link):
         # /blog/post/document_id の形式からdocument_idを抽出
         if '/blog/post/' in ref_link:
             document_id = ref_link.split('/blog/post/')[-1]
-            # google_drive_helperから記事の内容を取得
-            from google_drive_helper import get_document_content
-            document_content = get_document_content(document_id)
+            # 変換済みHTMLのキャッシュから記事の内容を取得
+            from blog_cache import get_rendered_post
+            document_content = get_rendered_post(document_id)
             if document_content:
                 return document_content['title']
     except Exception as e:
@@ -50,6 +61,11 @@ app.secret_key = os.getenv('FLASK_SECRET_KEY', 'fallback-key-for-development-onl
 # Fix Railway reverse proxy for HTTPS
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 
+# リクエストごとのレイテンシ・DBクエリ・外部API時間の計測と /metrics
+instrumentation.init_app(app)
+# 外部API呼び出しのトレース（/admin/traces、TRACE_EXPORT_PATH へのOTLP出力）
+tracing.init_app(app)
+
 # Force HTTPS for OAuth in production
 app.config['PREFERRED_URL_SCHEME'] = 'https'
 # app.config['SERVER_NAME'] = 'web-production-65363.up.railway.app'  # Comment out for local testing
@@ -82,18 +98,9 @@ google_bp.redirect_url = "https://japanese-b.com/auth/google/authorized"
 
 app.register_blueprint(google_bp, url_prefix="/auth")
 
-# Database configuration - Railway compatible
-database_url = os.getenv('DATABASE_URL')
-if database_url:
-    # Use Railway PostgreSQL
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-else:
-    # Railway SQLite fallback - use current directory which is persistent
-    db_dir = os.path.join(os.getcwd(), 'data')
-    if not os.path.exists(db_dir):
-        os.makedirs(db_dir, exist_ok=True)
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_dir}/app.db'
-    
+# Database configuration - Railway compatible (PostgreSQL, or SQLite under data/)
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize extensions
@@ -230,30 +237,97 @@ def cleanup_inactive_users():
     db.session.commit()
     print(f"Cleaned up {len(inactive_users)} inactive users")
 
+def run_log_retention():
+    """保持期間を過ぎたログを日次集計にまとめ、パーティションを管理"""
+    with app.app_context():
+        compact_log_tables()
+
+def run_metrics_rollup_job():
+    """管理画面用のメトリクスを集計してSystemMetricsに保存"""
+    with app.app_context():
+        try:
+            run_metrics_rollup()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Metrics rollup error: {e}")
+
+def refresh_blog_index_job():
+    """Drive の変更をキャッシュとメタデータインデックスに反映し、静的フラグメントを公開し直す"""
+    try:
+        result = sync_blog()
+        if result is None:
+            # 変更フィードが使えないときは TTL 付きの一覧と比べる
+            metadata_index.refresh()
+            search_index.refresh()
+        elif not (result.changed or result.removed):
+            return
+        # フラグメントの描画で url_for を使うためリクエストコンテキストを用意する
+        with app.test_request_context('/'):
+            publish_changes()
+    except Exception as e:
+        print(f"Blog index refresh error: {e}")
+
 # Schedule cleanup job to run daily at 3:00 AM
 scheduler.add_job(cleanup_inactive_users, 'cron', hour=3)
-scheduler.start()
+# Schedule log retention job to run daily at 4:00 AM
+scheduler.add_job(run_log_retention, 'cron', hour=4)
+# Schedule metrics rollup for the admin dashboard
+scheduler.add_job(run_metrics_rollup_job, 'interval', minutes=METRICS_ROLLUP_MINUTES)
+# Keep the blog caches in step with the Drive change feed
+scheduler.add_job(refresh_blog_index_job, 'interval', seconds=BLOG_SYNC_INTERVAL_SECONDS)
+
+# 日替わりクイズは日付ごとに CACHE_FILE に保存する（今日の分と、ウォーマーが先に作った明日の分）
+# 作成は _quiz_build_lock の中で行い、リクエストとウォーマーが同時に作らないようにする
+_quiz_build_lock = threading.Lock()
+
+def _load_quiz_cache():
+    """{日付: クイズ}（旧形式の {"date", "quiz"} も読む）"""
+    if not os.path.exists(CACHE_FILE):
+        return {}
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if "quizzes" in cache:
+            return cache["quizzes"]
+        if cache.get("date"):
+            return {cache["date"]: cache["quiz"]}
+    except Exception:
+        # 壊れたキャッシュファイルは削除
+        if os.path.exists(CACHE_FILE):
+            os.remove(CACHE_FILE)
+    return {}
+
+def _save_quiz_cache(quizzes):
+    """今日以降のクイズだけを保存"""
+    today_str = dt.datetime.now().date().isoformat()
+    quizzes = {date: quiz for date, quiz in quizzes.items() if date >= today_str}
+    tmp_path = f"{CACHE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"quizzes": quizzes}, f, ensure_ascii=False)
+    os.replace(tmp_path, CACHE_FILE)
 
 # Helper to get or generate today's quiz
 def get_today_quiz():
     today_str = dt.datetime.now().date().isoformat()
-    # Try to load cache
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+    quiz = _load_quiz_cache().get(today_str)
+    if quiz is not None:
+        return quiz
+    # 通常はウォーマーが作成済み。起動直後などで無ければその場で作る
+    with _quiz_build_lock:
+        quizzes = _load_quiz_cache()
+        quiz = quizzes.get(today_str)
+        if quiz is None:
+            quiz = build_daily_quiz(today_str)
+            quizzes[today_str] = quiz
             try:
-                cache = json.load(f)
-                cached_date = cache.get("date")
-                # 日付が有効で、今日の日付と一致する場合のみキャッシュを使用
-                if cached_date and cached_date == today_str:
-                    return cache["quiz"]
-                else:
-                    # 無効な日付の場合はキャッシュファイルを削除
-                    os.remove(CACHE_FILE)
-            except Exception:
-                # エラーが発生した場合もキャッシュファイルを削除
-                if os.path.exists(CACHE_FILE):
-                    os.remove(CACHE_FILE)
-    
+                _save_quiz_cache(quizzes)
+            except OSError as e:
+                # 保存できなくても作ったクイズは表示する
+                print(f"Daily quiz cache save error: {e}")
+    return quiz
+
+def build_daily_quiz(today_str):
+    """指定した日付（ISO形式）の日替わりクイズを作る（同じ日付なら同じオノマトペ）"""
     # Generate new quiz with date-based deterministic selection
     from onomatopoeia_data import get_random_onomatopoeia
     
@@ -365,11 +439,51 @@ def get_today_quiz():
         if image_urls:
             quiz["image_urls"] = image_urls
     
-    # Save to cache
-    with open(CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump({"date": today_str, "quiz": quiz}, f, ensure_ascii=False)
     return quiz
 
+def warm_daily_quiz_job():
+    """今日と明日の日替わりクイズを先に作っておく（日付が変わった直後のリクエストに作らせない）"""
+    try:
+        today = dt.datetime.now().date()
+        with _quiz_build_lock:
+            quizzes = _load_quiz_cache()
+            missing = [date.isoformat() for date in (today, today + timedelta(days=1))
+                       if date.isoformat() not in quizzes]
+            for date_str in missing:
+                quizzes[date_str] = build_daily_quiz(date_str)
+            if missing:
+                _save_quiz_cache(quizzes)
+    except Exception as e:
+        print(f"Daily quiz warm-up error: {e}")
+
+def warm_blog_sidebar_job():
+    """サイドバーのブログ一覧をTTL切れの前に取得し直す（変更フィードの同期中は何もしない）"""
+    try:
+        warm_blog_documents(BLOG_CACHE_TTL_SECONDS / 2)
+    except Exception as e:
+        print(f"Blog sidebar warm-up error: {e}")
+
+# ウォーマーはキャッシュが切れる前に実行する
+scheduler.add_job(warm_daily_quiz_job, 'cron', minute=50)
+scheduler.add_job(warm_blog_sidebar_job, 'interval', seconds=BLOG_CACHE_TTL_SECONDS // 4)
+
+# アプリの提供開始時に一度だけ実行するジョブ（最初のリクエストより先にキャッシュを用意する）
+BOOT_JOBS = (refresh_blog_index_job, warm_daily_quiz_job, warm_blog_sidebar_job)
+
+def start_background_jobs():
+    """スケジューラとログの書き込みスレッドを開始し、BOOT_JOBS をすぐに実行する
+
+    import では開始しない（migrations.py やテストが app を import してもジョブが走らないように）。
+    gunicorn.conf.py の post_worker_init と `python app.py` から呼ぶ。
+    """
+    if scheduler.running:
+        return
+    flashcard_log_writer.start()
+    error_log_sink.start()
+    scheduler.start()
+    for job in BOOT_JOBS:
+        scheduler.add_job(job, 'date', run_date=datetime.now())
+
 # Domain redirect middleware
 @app.before_request
 def redirect_to_custom_domain():
@@ -703,9 +817,13 @@ app.register_blueprint(youtube_listening_bp)
 app.register_blueprint(blog_bp)
 app.register_blueprint(admin_bp)
 
+# 分析用ログのバッファ書き込み（スレッドは start_background_jobs で開始する）
+flashcard_log_writer.init_app(app)
+error_log_sink.init_app(app)
+
 # Patreon OAuth removed - using Google login only
 
-# Initialize database tables (works with both Flask dev server and gunicorn)
+# Check schema version (works with both Flask dev server and gunicorn)
 try:
     with app.app_context():
         # Ensure database directory exists for SQLite
@@ -715,44 +833,21 @@ try:
             db_dir = os.path.dirname(db_path)
             os.makedirs(db_dir, exist_ok=True)
         
-        db.create_all()
-        
-        # GrammarQuizLogテーブルにmodel_answer列を安全に追加
-        try:
-            from sqlalchemy import inspect, text
-            inspector = inspect(db.engine)
-            
-            # テーブルが存在するかチェック
-            if inspector.has_table('grammar_quiz_log'):
-                columns = [col['name'] for col in inspector.get_columns('grammar_quiz_log')]
-                
-                if 'model_answer' not in columns:
-                    pass
-                    
-                    # PostgreSQLとSQLiteの両方に対応
-                    try:
-                        with db.engine.connect() as conn:
-                            # PostgreSQL/SQLiteで動作するSQL
-                            conn.execute(text('ALTER TABLE grammar_quiz_log ADD COLUMN model_answer TEXT'))
-                            conn.commit()
-                    except Exception as sql_error:
-                        print(f"DEBUG: SQL execution error: {sql_error}")
-                        # 手動でcreate_allを再実行してテーブル構造を更新
-                        db.create_all()
-                else:
-                    pass
-            else:
-                pass
-        except Exception as migration_error:
-            print(f"DEBUG: Database migration error (non-fatal): {migration_error}")
-            import traceback
-            traceback.print_exc()
-            
+        # スキーマバージョンが最新なら何もしない（マイグレーションはデプロイ時に migrations.py で適用）
+        ensure_schema()
+
 except Exception as e:
-    print(f"DEBUG: Database table creation error: {e}")
+    print(f"DEBUG: Database schema check error: {e}")
     import traceback
     traceback.print_exc()
 
+@app.cli.command("db-upgrade")
+def db_upgrade_command():
+    """未適用のスキーママイグレーションを適用"""
+    version = upgrade_schema()
+    print(f"Schema is at version {version}")
+
 if __name__ == "__main__":
+    start_background_jobs()
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, port=port, host='0.0.0.0')
\ No newline at end of file
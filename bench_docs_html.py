@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Google ドキュメント→HTML 変換のベンチマーク
+
+Docs API の documents.get と同じ形の大きなサンプルJSON（見出し・装飾付きの
+テキスト・リンク・番号付き／点の箇条書き・表・画像）を生成し、docs_html の
+変換速度を測る。
+
+目標: 1スレッドで Docs JSON 20MB/秒 以上（1記事 200KB 程度なら 10ms 以内）。
+下回った場合は終了コード1で終わる。
+
+    python bench_docs_html.py                 # 既定の大きさで測る
+    python bench_docs_html.py --paragraphs 20000 --repeat 5
+    python bench_docs_html.py --save fixture.json   # 生成したJSONを保存
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from docs_html import convert_to_html
+
+TARGET_MB_PER_SECOND = 20
+
+_WORDS = ['日本語', 'の', '勉強', 'は', '毎日', '続ける', 'ことが', '大切', 'です', 'JLPT', 'N3',
+          '文法', '単語', 'を', '覚え', 'ましょう', '例文', 'Practice', 'makes', 'perfect']
+_FONTS = ['Arial', 'Noto Sans JP', 'Courier New', 'Georgia', 'M PLUS Rounded 1c']
+
+
+def _color(rng):
+    return {'color': {'rgbColor': {'red': rng.random(), 'green': rng.random(), 'blue': rng.random()}}}
+
+
+def _text_style(rng):
+    # 実際の記事と同じく、少数の装飾が何度も繰り返される
+    choice = rng.randrange(8)
+    if choice < 3:
+        return {}
+    if choice == 3:
+        return {'bold': True}
+    if choice == 4:
+        return {'italic': True, 'underline': True}
+    if choice == 5:
+        return {'link': {'url': f'https://example.com/{rng.randrange(5)}'}, 'underline': True,
+                'foregroundColor': {'color': {'rgbColor': {'blue': 0.8}}}}
+    if choice == 6:
+        return {'fontSize': {'magnitude': rng.choice([10, 12, 14]), 'unit': 'PT'},
+                'weightedFontFamily': {'fontFamily': rng.choice(_FONTS), 'weight': 400}}
+    return {'backgroundColor': {'color': {'rgbColor': {'red': 1, 'green': 0.95, 'blue': 0.6}}}, 'bold': True}
+
+
+def _sentence(rng, words=12):
+    return ''.join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _paragraph(rng, style=None, bullet=None, runs=None):
+    runs = runs if runs is not None else rng.randint(1, 4)
+    elements = [{'startIndex': 0, 'endIndex': 0,
+                 'textRun': {'content': _sentence(rng, rng.randint(3, 15)), 'textStyle': _text_style(rng)}}
+                for _ in range(runs)]
+    elements.append({'textRun': {'content': '\n', 'textStyle': {}}})
+    paragraph = {'elements': elements,
+                 'paragraphStyle': style or {'namedStyleType': 'NORMAL_TEXT', 'direction': 'LEFT_TO_RIGHT'}}
+    if bullet:
+        paragraph['bullet'] = bullet
+    return {'startIndex': 0, 'endIndex': 0, 'paragraph': paragraph}
+
+
+def _table(rng, rows=4, columns=3):
+    return {'table': {'rows': rows, 'columns': columns, 'tableRows': [
+        {'tableCells': [{'content': [_paragraph(rng, runs=1)],
+                         'tableCellStyle': {'backgroundColor': _color(rng)} if r == 0 else {}}
+                        for _ in range(columns)]}
+        for r in range(rows)]}}
+
+
+def sample_document(paragraphs=2000, seed=0, bullets=True):
+    """documents.get と同じ形のサンプル（body.content と lists）"""
+    rng = random.Random(seed)
+    content = [{'endIndex': 1, 'sectionBreak': {'sectionStyle': {}}}]
+    lists = {}
+    while len(content) < paragraphs:
+        kind = rng.randrange(20)
+        if kind == 0:
+            content.append(_paragraph(rng, style={'namedStyleType': rng.choice(['HEADING_1', 'HEADING_2', 'HEADING_3'])},
+                                      runs=1))
+        elif kind == 1:
+            content.append(_table(rng))
+        elif kind == 2:
+            content.append({'paragraph': {'elements': [
+                {'inlineObjectElement': {'inlineObjectId': f'kix.{rng.randrange(10 ** 6)}'}},
+                {'textRun': {'content': '\n', 'textStyle': {}}}], 'paragraphStyle': {'namedStyleType': 'NORMAL_TEXT'}}})
+        elif kind == 3:
+            content.append({'paragraph': {'elements': [{'textRun': {'content': '\n', 'textStyle': {}}}],
+                                          'paragraphStyle': {'namedStyleType': 'NORMAL_TEXT'}}})
+        elif kind == 4:
+            content.append(_paragraph(rng, style={'namedStyleType': 'NORMAL_TEXT', 'alignment': 'CENTER',
+                                                  'lineSpacing': 115, 'spaceAbove': {'magnitude': 6, 'unit': 'PT'}}))
+        elif kind == 5 and bullets:
+            list_id = f'kix.list{len(lists)}'
+            ordered = rng.random() < 0.5
+            lists[list_id] = {'listProperties': {'nestingLevels': [
+                {'glyphType': 'DECIMAL', 'startNumber': 1} if ordered else {'glyphSymbol': '●'},
+                {'glyphType': 'ALPHA', 'startNumber': 1} if ordered else {'glyphSymbol': '○'},
+                {'glyphType': 'ROMAN', 'startNumber': 1} if ordered else {'glyphSymbol': '■'},
+            ]}}
+            for _ in range(rng.randint(2, 8)):
+                content.append(_paragraph(rng, bullet={'listId': list_id, 'nestingLevel': rng.randint(0, 2)}))
+        else:
+            content.append(_paragraph(rng))
+    return {'title': 'benchmark', 'body': {'content': content}, 'lists': lists}
+
+
+def run(paragraphs, repeat, seed=0):
+    """(JSONのバイト数, 1回あたりの秒数（最速）, HTMLの文字数)"""
+    document = sample_document(paragraphs, seed)
+    size = len(json.dumps(document, ensure_ascii=False).encode('utf-8'))
+    content, lists = document['body']['content'], document['lists']
+    best = None
+    html = ''
+    for _ in range(repeat):
+        started = time.perf_counter()
+        html = convert_to_html(content, lists)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return size, best, len(html)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paragraphs', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='生成したサンプルJSONの保存先')
+    args = parser.parse_args()
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(sample_document(args.paragraphs, args.seed), f, ensure_ascii=False)
+
+    size, seconds, html_length = run(args.paragraphs, args.repeat, args.seed)
+    throughput = size / seconds / 1024 / 1024
+    print(f"Docs JSON: {size / 1024 / 1024:.1f}MB, {args.paragraphs} elements -> HTML {html_length / 1024:.0f}KB")
+    print(f"best of {args.repeat}: {seconds * 1000:.1f}ms ({throughput:.1f}MB/s, target {TARGET_MB_PER_SECOND}MB/s)")
+    return 0 if throughput >= TARGET_MB_PER_SECOND else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
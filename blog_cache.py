@@ -0,0 +1,124 @@
+"""
+ブログ記事の変換済みHTMLのキャッシュ
+
+Docs API の取得と convert_to_html の結果（タイトル・HTML・タグ）を、
+メモリ上のLRUとディスク（BLOG_HTML_CACHE_DIR）の2段で保持する。
+キャッシュの有効性は get_blog_documents() が返す modifiedTime で判定するため、
+記事が編集されない限り Google への問い合わせは発生しない。
+ディスクのキャッシュは再起動後や、同じディレクトリを使う他のワーカーからも読める。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from google_drive_helper import get_blog_documents, get_document_content
+from utils.tracing import trace_span
+
+BLOG_HTML_CACHE_DIR = os.getenv('BLOG_HTML_CACHE_DIR', '.blog_cache')
+BLOG_HTML_CACHE_ENTRIES = int(os.getenv('BLOG_HTML_CACHE_ENTRIES', '64'))
+
+# キャッシュに保存する項目（raw_content は大きいので持たない）
+CACHED_FIELDS = ('title', 'content', 'tags')
+
+
+class RenderedPostCache:
+    def __init__(self, directory=None, max_entries=64):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # document_id -> (modified_at, document)
+        self._lock = threading.Lock()
+
+    def _path(self, document_id):
+        name = hashlib.sha1(document_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{name}.json')
+
+    def get(self, document_id, modified_at):
+        """modified_at が一致するキャッシュ（無ければNone）"""
+        with self._lock:
+            cached = self._entries.get(document_id)
+            if cached is not None and cached[0] == modified_at:
+                self._entries.move_to_end(document_id)
+                return cached[1]
+        document = self._read(document_id, modified_at)
+        if document is not None:
+            self._remember(document_id, modified_at, document)
+        return document
+
+    def put(self, document_id, modified_at, document):
+        document = {field: document.get(field) for field in CACHED_FIELDS}
+        self._remember(document_id, modified_at, document)
+        self._write(document_id, modified_at, document)
+        return document
+
+    def invalidate(self, document_id):
+        with self._lock:
+            self._entries.pop(document_id, None)
+        if self.directory:
+            try:
+                os.remove(self._path(document_id))
+            except OSError:
+                pass
+
+    def _remember(self, document_id, modified_at, document):
+        with self._lock:
+            self._entries[document_id] = (modified_at, document)
+            self._entries.move_to_end(document_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read(self, document_id, modified_at):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(document_id), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('modified_at') != modified_at:
+            return None
+        return data.get('document')
+
+    def _write(self, document_id, modified_at, document):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(document_id)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'document_id': document_id, 'modified_at': modified_at, 'document': document},
+                          f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Blog HTML cache write error: {e}")
+
+
+post_cache = RenderedPostCache(BLOG_HTML_CACHE_DIR, max_entries=BLOG_HTML_CACHE_ENTRIES)
+
+
+def get_modified_at(document_id):
+    """ブログ一覧（TTLキャッシュ済み）から記事の modifiedTime を引く（一覧に無ければNone）"""
+    for post in get_blog_documents():
+        if post['id'] == document_id:
+            return post.get('modified_at')
+    return None
+
+
+def get_rendered_post(document_id, modified_at=None):
+    """記事のタイトル・HTML・タグ（キャッシュが有効なら Google に問い合わせない）"""
+    modified_at = modified_at or get_modified_at(document_id)
+    if modified_at:
+        cached = post_cache.get(document_id, modified_at)
+        if cached is not None:
+            with trace_span('google', 'docs.documents.get', cache_hit=True):
+                return cached
+    document = get_document_content(document_id)
+    if document is None:
+        return None
+    if not modified_at:
+        # 一覧に無い記事は版が分からないのでキャッシュしない
+        return document
+    return post_cache.put(document_id, modified_at, document)
@@ -0,0 +1,110 @@
+"""
+ブログ記事のコメントツリーとお気に入り数のキャッシュ
+
+記事ページのコメント欄は、記事のコメントを投稿者と一緒に1回のクエリで読み
+（返信も同じ document_id を持つ）、Python でツリーに組み立てる。
+お気に入り数は blog_post_stats.favorite_count に非正規化して持ち、
+お気に入りの切り替えと同じトランザクションで増減する。
+
+どちらも記事ごとにプロセス内でキャッシュし、コメントの投稿・お気に入りの
+切り替えで無効化する。他のワーカーでの書き込みは INTERACTIONS_CACHE_TTL_SECONDS
+で反映される。キャッシュにはセッションから切り離した値（CommentView）だけを入れる。
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy.orm import joinedload
+
+from models import db, BlogComment, BlogFavorite, BlogPostStats
+
+INTERACTIONS_CACHE_TTL_SECONDS = int(os.getenv('BLOG_INTERACTIONS_CACHE_TTL', '300'))
+INTERACTIONS_CACHE_ENTRIES = 256
+
+CommentView = namedtuple('CommentView', 'id author is_admin_reply created_at content replies')
+Interactions = namedtuple('Interactions', 'comments favorite_count')
+
+
+def _comment_view(comment, replies=()):
+    return CommentView(comment.id, comment.anonymized_username, comment.is_admin_reply,
+                       comment.created_at, comment.content, tuple(replies))
+
+
+def load_comment_tree(document_id):
+    """記事のコメント（新しい順）と、それぞれへの返信（古い順）"""
+    comments = (BlogComment.query
+                .options(joinedload(BlogComment.user))
+                .filter_by(document_id=document_id, is_deleted=False)
+                .order_by(BlogComment.created_at, BlogComment.id)
+                .all())
+    replies = {}
+    for comment in comments:
+        if comment.parent_comment_id is not None:
+            replies.setdefault(comment.parent_comment_id, []).append(_comment_view(comment))
+    top_level = [_comment_view(comment, replies.get(comment.id, ()))
+                 for comment in comments if comment.parent_comment_id is None]
+    top_level.reverse()
+    return top_level
+
+
+def load_favorite_count(document_id):
+    stats = db.session.get(BlogPostStats, document_id)
+    return stats.favorite_count if stats else 0
+
+
+def add_favorite_count(document_id, delta):
+    """お気に入り数を増減する（呼び出し側のトランザクションでコミットする）
+
+    集計行がまだ無い記事は、その時点の件数から作る。
+    """
+    db.session.flush()
+    table = BlogPostStats.__table__
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    current_count = (db.select(db.func.count()).select_from(BlogFavorite.__table__)
+                     .where(BlogFavorite.__table__.c.document_id == document_id).scalar_subquery())
+    upsert = insert(table).values(document_id=document_id, favorite_count=current_count)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[table.c.document_id],
+        set_={'favorite_count': table.c.favorite_count + delta})
+    db.session.execute(upsert)
+
+
+class InteractionsCache:
+    def __init__(self, ttl=300, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # document_id -> (cached_at, Interactions)
+        self._generations = {}  # document_id -> 無効化した回数
+        self._lock = threading.Lock()
+
+    def get(self, document_id):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(document_id)
+            if cached is not None and now - cached[0] < self.ttl:
+                self._entries.move_to_end(document_id)
+                return cached[1]
+            generation = self._generations.get(document_id, 0)
+        interactions = Interactions(load_comment_tree(document_id), load_favorite_count(document_id))
+        with self._lock:
+            # 読み込み中に書き込みがあった場合は古い内容をキャッシュしない
+            if self._generations.get(document_id, 0) != generation:
+                return interactions
+            self._entries[document_id] = (now, interactions)
+            self._entries.move_to_end(document_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return interactions
+
+    def invalidate(self, document_id):
+        with self._lock:
+            self._entries.pop(document_id, None)
+            self._generations[document_id] = self._generations.get(document_id, 0) + 1
+
+
+interactions_cache = InteractionsCache(INTERACTIONS_CACHE_TTL_SECONDS, max_entries=INTERACTIONS_CACHE_ENTRIES)
@@ -0,0 +1,170 @@
+"""
+ブログ記事のメタデータインデックス
+
+ブログ一覧ページで使うタグ・タイトル・抜粋・文字数を、ドキュメントIDごとに
+modifiedTime と一緒に保持する。一覧ページはこのインデックスだけを読むため、
+Docs API の呼び出しは発生しない。
+
+- refresh(): get_blog_documents() の modifiedTime と比べて変わった記事だけを
+  スレッドプールで並列に取得し直し、削除された記事はインデックスから外す
+- refresh_async(): 上の処理をバックグラウンドスレッドで1本だけ走らせる
+  （一覧ページで古い記事に気付いたとき、および APScheduler の定期ジョブから呼ぶ）
+- BLOG_INDEX_PATH を設定すると、インデックスをJSONファイルに保存して再起動後も使う
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google_drive_helper import get_blog_documents
+from blog_cache import get_rendered_post
+
+BLOG_INDEX_PATH = os.getenv('BLOG_INDEX_PATH')
+BLOG_INDEX_WORKERS = int(os.getenv('BLOG_INDEX_WORKERS', '4'))
+
+EXCERPT_LENGTH = 120
+
+# 一覧ページからのバックグラウンド更新の最短間隔（API障害中に何度も走らせない）
+ASYNC_REFRESH_INTERVAL_SECONDS = 30
+
+_TAG_RE = re.compile(r'##[a-zA-Z0-9_\-]+')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+# 英数字は単語ごと、かな・漢字は1文字ごとに数える
+_WORD_RE = re.compile(r"[A-Za-z0-9']+|[\u3040-\u30ff\u3400-\u9fff]")
+
+
+def plain_text(html_content):
+    """HTMLからタグと##tagを除いたテキスト"""
+    text = _HTML_TAG_RE.sub(' ', html_content or '')
+    text = _TAG_RE.sub(' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def build_entry(post, document):
+    """記事1件のインデックスの内容"""
+    text = plain_text(document.get('content', ''))
+    excerpt = text[:EXCERPT_LENGTH] + ('…' if len(text) > EXCERPT_LENGTH else '')
+    return {
+        'modified_at': post.get('modified_at', ''),
+        'title': document.get('title') or post.get('title', ''),
+        'tags': sorted(document.get('tags', [])),
+        'excerpt': excerpt,
+        'word_count': len(_WORD_RE.findall(text)),
+    }
+
+
+class BlogMetadataIndex:
+    def __init__(self, path=None, workers=4):
+        self.path = path
+        self.workers = workers
+        self._entries = {}  # document_id -> entry
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.built = False
+        self._async_started_at = None
+        self._load()
+
+    def get(self, document_id):
+        with self._lock:
+            return self._entries.get(document_id)
+
+    def stale_posts(self, posts):
+        """インデックスに無い、または modifiedTime が変わった記事"""
+        with self._lock:
+            return [post for post in posts
+                    if self._entries.get(post['id'], {}).get('modified_at') != post.get('modified_at', '')]
+
+    def refresh(self, posts=None):
+        """変わった記事だけを取得し直し、更新した件数を返す"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            posts = get_blog_documents() if posts is None else posts
+            stale = self.stale_posts(posts)
+            updated = {}
+            if stale:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    # 取得した記事は変換済みHTMLのキャッシュにも入る
+                    documents = executor.map(lambda post: get_rendered_post(post['id'], post.get('modified_at')),
+                                             stale)
+                    for post, document in zip(stale, documents):
+                        # 取得に失敗した記事は次回また試す
+                        if document:
+                            updated[post['id']] = build_entry(post, document)
+            current_ids = {post['id'] for post in posts}
+            with self._lock:
+                removed = [doc_id for doc_id in self._entries if doc_id not in current_ids]
+                for doc_id in removed:
+                    del self._entries[doc_id]
+                self._entries.update(updated)
+                self.built = True
+            if updated or removed:
+                self._save()
+            return len(updated)
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_async(self):
+        """バックグラウンドで refresh()（実行中なら何もしない）"""
+        now = time.monotonic()
+        if self._refresh_lock.locked() or (
+                self._async_started_at is not None
+                and now - self._async_started_at < ASYNC_REFRESH_INTERVAL_SECONDS):
+            return
+        self._async_started_at = now
+        threading.Thread(target=self._refresh_in_background, name='blog-index-refresh', daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Blog index refresh error: {e}")
+
+    def annotate(self, posts):
+        """記事リストのコピーにタグ・抜粋・文字数を付けて返す
+
+        古い記事があればバックグラウンドで更新する（その間は前回の内容で表示する）。
+        一度も作っていないときだけ、その場で作る。
+        """
+        if not self.built and not self._entries:
+            # 検索結果など一部の記事だけが渡されることがあるので、全件で作る
+            self.refresh()
+        elif self.stale_posts(posts):
+            self.refresh_async()
+        annotated = []
+        for post in posts:
+            entry = self.get(post['id']) or {}
+            annotated.append(dict(post, tags=entry.get('tags', []), excerpt=entry.get('excerpt', ''),
+                                  word_count=entry.get('word_count', 0)))
+        return annotated
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Blog index load error: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = dict(self._entries)
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Blog index save error: {e}")
+
+
+metadata_index = BlogMetadataIndex(BLOG_INDEX_PATH, workers=BLOG_INDEX_WORKERS)
@@ -0,0 +1,187 @@
+"""
+ブログの静的フラグメントの公開
+
+記事本文（タイトル・HTML・タグ）と絞り込みの無い記事一覧を、あらかじめ
+HTMLフラグメントとして描画し BLOG_STATIC_DIR に保存する。
+
+- publish_changes(): Drive の modifiedTime が変わった記事だけ描画し直し、
+  削除された記事のフラグメントを消す。何か変われば記事一覧も言語ごとに描画し直す
+  （APScheduler のジョブがメタデータインデックスの更新の後に呼ぶ）
+- published_post() / published_index(): 公開済みのフラグメント（無い・古いときはその場で公開）
+
+フラグメントは内容のハッシュを強いETagとして持つ。記事ページはフラグメントを
+埋め込むだけで Docs API も HTML 変換も行わず、/blog/fragments/ からは
+フラグメントそのものを Cache-Control 付きで返す。コメント・お気に入りは
+ログイン状態で変わるため、記事ページとは別に /blog/post/<id>/interactions から読み込む。
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+
+from flask import render_template
+
+from google_drive_helper import get_blog_documents
+from blog_cache import get_rendered_post, get_modified_at
+from blog_metadata import metadata_index
+from translations import TRANSLATIONS, get_text
+
+BLOG_STATIC_DIR = os.getenv('BLOG_STATIC_DIR', '.blog_static')
+FRAGMENT_MAX_AGE = int(os.getenv('BLOG_FRAGMENT_MAX_AGE', '300'))
+
+# Google ドキュメントのIDとして受け付ける文字（ファイル名にも使う）
+DOCUMENT_ID_RE = re.compile(r'[A-Za-z0-9_\-]+')
+
+Fragment = namedtuple('Fragment', 'html etag version title')
+
+
+def fragment_etag(html):
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()[:32]
+
+
+class FragmentStore:
+    """公開済みのフラグメントをディスクとメモリに保持"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._fragments = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, name):
+        return os.path.join(self.directory, f'{name}.html'), os.path.join(self.directory, f'{name}.json')
+
+    def get(self, name):
+        with self._lock:
+            fragment = self._fragments.get(name)
+        if fragment is not None or not self.directory:
+            return fragment
+        html_path, meta_path = self._paths(name)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(html_path, 'r', encoding='utf-8') as f:
+                html = f.read()
+        except (OSError, ValueError):
+            return None
+        fragment = Fragment(html, meta['etag'], meta.get('version'), meta.get('title'))
+        with self._lock:
+            self._fragments[name] = fragment
+        return fragment
+
+    def put(self, name, html, version=None, title=None):
+        fragment = Fragment(html, fragment_etag(html), version, title)
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                html_path, meta_path = self._paths(name)
+                # HTMLを先に置き換え、メタデータ（ETag）は最後に書く
+                for path, data in ((html_path, html),
+                                   (meta_path, json.dumps({'etag': fragment.etag, 'version': version,
+                                                           'title': title}, ensure_ascii=False))):
+                    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Blog fragment write error: {e}")
+        with self._lock:
+            self._fragments[name] = fragment
+        return fragment
+
+    def remove(self, name):
+        with self._lock:
+            self._fragments.pop(name, None)
+        if self.directory:
+            for path in self._paths(name):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def names(self, prefix):
+        with self._lock:
+            names = {name for name in self._fragments if name.startswith(prefix)}
+        if self.directory and os.path.isdir(self.directory):
+            names.update(filename[:-len('.json')] for filename in os.listdir(self.directory)
+                         if filename.startswith(prefix) and filename.endswith('.json'))
+        return names
+
+
+store = FragmentStore(BLOG_STATIC_DIR)
+
+
+def _post_name(document_id):
+    return f'post-{document_id}'
+
+
+def publish_post(document_id, modified_at=None):
+    """記事本文のフラグメントを描画して保存（記事が取得できなければNone）
+
+    url_for を使うためリクエストコンテキスト（ジョブでは test_request_context）の中で呼ぶ。
+    """
+    if not DOCUMENT_ID_RE.fullmatch(document_id or ''):
+        return None
+    document = get_rendered_post(document_id, modified_at)
+    if document is None:
+        return None
+    html = render_template('blog/_article.html', title=document['title'], content=document['content'],
+                           tags=document.get('tags', []))
+    return store.put(_post_name(document_id), html, version=modified_at, title=document['title'])
+
+
+def published_post(document_id):
+    """公開済みの記事本文（無い・Drive上で更新されていればその場で公開する）"""
+    if not DOCUMENT_ID_RE.fullmatch(document_id or ''):
+        return None
+    modified_at = get_modified_at(document_id)
+    fragment = store.get(_post_name(document_id))
+    if fragment is not None and (modified_at is None or fragment.version == modified_at):
+        return fragment
+    return publish_post(document_id, modified_at) or fragment
+
+
+def publish_index(posts=None):
+    """絞り込みの無い記事一覧を言語ごとに描画して保存（一覧の内容が変わっていなければ何もしない）"""
+    posts = metadata_index.annotate(get_blog_documents() if posts is None else posts)
+    version = hashlib.sha256(json.dumps(
+        [(post['id'], post.get('modified_at'), post.get('tags'), post.get('excerpt')) for post in posts],
+        ensure_ascii=False).encode('utf-8')).hexdigest()
+    current = store.get('index-en')
+    if current is not None and current.version == version:
+        return version
+    for language in TRANSLATIONS:
+        html = render_template('blog/_post_list.html', blog_posts=posts, search_query='',
+                               _=lambda key, language=language: get_text(key, language))
+        store.put(f'index-{language}', html, version=version)
+    return version
+
+
+def published_index(language):
+    fragment = store.get(f'index-{language}')
+    if fragment is None:
+        publish_index()
+        fragment = store.get(f'index-{language}')
+    return fragment
+
+
+def publish_changes():
+    """Drive上で変わった記事だけ公開し直し、公開し直した記事数を返す"""
+    posts = get_blog_documents()
+    if not posts:
+        # 一覧の取得に失敗したときは公開済みのものを残す
+        return 0
+    published = 0
+    for post in posts:
+        fragment = store.get(_post_name(post['id']))
+        if fragment is None or fragment.version != post.get('modified_at'):
+            if publish_post(post['id'], post.get('modified_at')) is not None:
+                published += 1
+    current = {_post_name(post['id']) for post in posts}
+    removed = [name for name in store.names('post-') if name not in current]
+    for name in removed:
+        store.remove(name)
+    publish_index(posts)
+    return published
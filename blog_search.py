@@ -0,0 +1,187 @@
+"""
+ブログ記事の全文検索インデックス
+
+記事のタイトル・本文（HTMLを除いたテキスト）・タグを SQLite の FTS5 に
+trigram トークナイザーで入れておき、検索はインデックスだけを引く。
+trigram は文字の3-gramで区切るため、分かち書きの無い日本語でも部分一致で探せる。
+
+- refresh(): modifiedTime が変わった記事だけを入れ直し、削除された記事を外す
+  （blog_sync の同期と APScheduler のジョブから、メタデータインデックスの後に呼ぶ）
+- search_ids(): bm25 でタイトル > タグ > 本文の重みで並べる。3文字未満の語は
+  trigram で引けないので LIKE で絞り込む
+- FTS5 の trigram が使えない SQLite では、これまで通りタイトルの部分一致で探す
+
+インデックスは BLOG_SEARCH_PATH の SQLite ファイル（アプリのDBとは別）に保存する。
+"""
+
+import os
+import sqlite3
+import threading
+
+from google_drive_helper import get_blog_documents, search_blog_posts
+from blog_cache import get_rendered_post
+from blog_metadata import plain_text
+
+BLOG_SEARCH_PATH = os.getenv('BLOG_SEARCH_PATH', '.blog_search.sqlite3')
+
+SEARCH_LIMIT = 50
+# bm25 の列ごとの重み（document_id, title, body, tags）
+RANK_WEIGHTS = (0.0, 10.0, 1.0, 5.0)
+TRIGRAM_LENGTH = 3
+
+SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts USING fts5("
+    "document_id UNINDEXED, title, body, tags, tokenize='trigram')",
+    "CREATE TABLE IF NOT EXISTS indexed_posts ("
+    "id INTEGER PRIMARY KEY, document_id TEXT UNIQUE NOT NULL, modified_at TEXT NOT NULL)",
+)
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+class BlogSearchIndex:
+    def __init__(self, path=None):
+        self.path = path or ':memory:'
+        self._conn = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.available = True
+
+    def _connect(self):
+        """接続（初回にテーブルを作る。trigram が使えなければ None）"""
+        if self._conn is None and self.available:
+            try:
+                directory = os.path.dirname(self.path) if self.path != ':memory:' else ''
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                print(f"Blog search index unavailable: {e}")
+                self.available = False
+        return self._conn
+
+    def indexed_versions(self):
+        """{document_id: modified_at}"""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return {}
+            return dict(conn.execute("SELECT document_id, modified_at FROM indexed_posts"))
+
+    def refresh(self, posts=None):
+        """変わった記事だけ入れ直し、更新した件数を返す"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._refresh(get_blog_documents() if posts is None else posts)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, posts):
+        if self._connect() is None:
+            return 0
+        indexed = self.indexed_versions()
+        documents = []
+        for post in posts:
+            if indexed.get(post['id']) != post.get('modified_at', ''):
+                document = get_rendered_post(post['id'], post.get('modified_at'))
+                # 取得に失敗した記事は次回また試す
+                if document:
+                    documents.append((post, document))
+        current_ids = {post['id'] for post in posts}
+        removed = [doc_id for doc_id in indexed if doc_id not in current_ids]
+        if not documents and not removed:
+            return 0
+        with self._lock:
+            conn = self._conn
+            with conn:
+                for doc_id in removed:
+                    self._delete(conn, doc_id)
+                for post, document in documents:
+                    rowid = self._delete(conn, post['id'])
+                    rowid = conn.execute(
+                        "INSERT INTO indexed_posts (id, document_id, modified_at) VALUES (?, ?, ?)",
+                        (rowid, post['id'], post.get('modified_at', ''))).lastrowid
+                    conn.execute(
+                        "INSERT INTO posts (rowid, document_id, title, body, tags) VALUES (?, ?, ?, ?, ?)",
+                        (rowid, post['id'], document.get('title') or post.get('title', ''),
+                         plain_text(document.get('content', '')), ' '.join(document.get('tags', []))))
+        return len(documents)
+
+    @staticmethod
+    def _delete(conn, document_id):
+        row = conn.execute("SELECT id FROM indexed_posts WHERE document_id = ?", (document_id,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("DELETE FROM posts WHERE rowid = ?", (row[0],))
+        conn.execute("DELETE FROM indexed_posts WHERE id = ?", (row[0],))
+        return row[0]
+
+    def search_ids(self, query, limit=SEARCH_LIMIT):
+        """クエリに一致する記事IDを関連度順に返す（インデックスが使えなければNone）"""
+        terms = query.split()
+        if not terms:
+            return []
+        long_terms = [term for term in terms if len(term) >= TRIGRAM_LENGTH]
+        short_terms = [term for term in terms if len(term) < TRIGRAM_LENGTH]
+        conditions, params = [], []
+        if long_terms:
+            conditions.append("posts MATCH ?")
+            params.append(' AND '.join(_phrase(term) for term in long_terms))
+        for term in short_terms:
+            conditions.append("(title LIKE ? ESCAPE '\\' OR body LIKE ? ESCAPE '\\' OR tags LIKE ? ESCAPE '\\')")
+            params.extend([_like_pattern(term)] * 3)
+        if long_terms:
+            order = f"bm25(posts, {', '.join(str(weight) for weight in RANK_WEIGHTS)})"
+        else:
+            # bm25 は MATCH が無いと使えないので、タイトルに含む記事を先にする
+            order = "(title LIKE ? ESCAPE '\\') DESC, rowid DESC"
+            params.append(_like_pattern(short_terms[0]))
+        sql = f"SELECT document_id FROM posts WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                return [row[0] for row in conn.execute(sql, params)]
+            except sqlite3.Error as e:
+                print(f"Blog search error: {e}")
+                return None
+
+    def is_empty(self):
+        with self._lock:
+            conn = self._connect()
+            return conn is None or conn.execute("SELECT 1 FROM indexed_posts LIMIT 1").fetchone() is None
+
+
+search_index = BlogSearchIndex(BLOG_SEARCH_PATH)
+
+
+def search_posts(query):
+    """ブログ一覧の形式で検索結果を返す（関連度順）"""
+    posts = get_blog_documents()
+    if not query:
+        return posts
+    if search_index.is_empty() and posts:
+        # 一度も作っていないときだけ、その場で作る
+        search_index.refresh(posts)
+        if search_index.is_empty():
+            # 他のスレッドが作成中（refresh がすぐ戻った）ならタイトルの部分一致で探す
+            return search_blog_posts(query)
+    document_ids = search_index.search_ids(query)
+    if document_ids is None:
+        return search_blog_posts(query)
+    posts_by_id = {post['id']: post for post in posts}
+    return [posts_by_id[doc_id] for doc_id in document_ids if doc_id in posts_by_id]
@@ -0,0 +1,189 @@
+"""
+Drive の変更フィードによるブログ記事の同期
+
+フォルダ全体を一定間隔で一覧する代わりに、Drive の changes API
+（changes.getStartPageToken / changes.list）で前回からの差分だけを取得し、
+ブログ一覧（google_drive_helper のキャッシュ）・変換済みHTMLのキャッシュ・
+メタデータインデックス・検索インデックスを更新する。API呼び出しの回数と反映までの時間は
+フォルダの記事数ではなく編集の回数に比例する。
+
+- ページトークンと記事一覧は BLOG_SYNC_STATE_PATH に保存し、再起動後も差分から続ける
+- トークンが無い・無効になったときだけ files.list でフォルダ全体を取得し直す
+- APScheduler のジョブが BLOG_SYNC_INTERVAL_SECONDS ごとに sync_blog() を呼ぶ
+"""
+
+import json
+import os
+import threading
+from collections import namedtuple
+
+from google_drive_helper import (BLOG_DOCUMENT_MIME_TYPE, BLOG_DOCUMENTS_QUERY, BLOG_FOLDER_ID,
+                                 format_blog_post, get_drive_service, set_blog_documents)
+from blog_cache import post_cache
+from blog_metadata import metadata_index
+from blog_search import search_index
+
+BLOG_SYNC_STATE_PATH = os.getenv('BLOG_SYNC_STATE_PATH', '.blog_sync.json')
+BLOG_SYNC_INTERVAL_SECONDS = int(os.getenv('BLOG_SYNC_INTERVAL_SECONDS', '60'))
+
+FILE_FIELDS = 'id, name, mimeType, parents, trashed, modifiedTime, createdTime'
+CHANGE_FIELDS = f'nextPageToken, newStartPageToken, changes(changeType, fileId, removed, file({FILE_FIELDS}))'
+
+# ページトークンが無効・期限切れのときの HTTP ステータス（全件を取得し直す）
+INVALID_TOKEN_STATUSES = (400, 404, 410)
+
+SyncResult = namedtuple('SyncResult', 'changed removed full')
+
+
+def _is_blog_document(file):
+    return (not file.get('trashed')
+            and file.get('mimeType') == BLOG_DOCUMENT_MIME_TYPE
+            and BLOG_FOLDER_ID in file.get('parents', []))
+
+
+class DriveChangeSync:
+    def __init__(self, state_path=None):
+        self.state_path = state_path
+        self.page_token = None
+        self._posts = {}  # document_id -> ブログ一覧の1件
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def posts(self):
+        return sorted(self._posts.values(), key=lambda post: post['modified_at'], reverse=True)
+
+    def sync(self):
+        """差分を取得して SyncResult を返す（Drive が使えない・同期中ならNone）"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+            drive_service = get_drive_service()
+            if not drive_service:
+                return None
+            previous_token = self.page_token
+            try:
+                if self.page_token:
+                    result = self._apply_changes(drive_service)
+                else:
+                    result = self._full_sync(drive_service)
+            except Exception as e:
+                status = getattr(getattr(e, 'resp', None), 'status', None)
+                if status in INVALID_TOKEN_STATUSES:
+                    # 次回はフォルダ全体を取得し直す
+                    print(f"Blog sync page token rejected ({status}); resyncing")
+                    self.page_token = None
+                else:
+                    print(f"Blog sync error: {e}")
+                return None
+            set_blog_documents(self.posts())
+            # ブログ以外の変更だけでもトークンは進むので保存する（再起動後に古い差分から読み直さない）
+            if result.changed or result.removed or result.full or self.page_token != previous_token:
+                self._save()
+            return result
+        finally:
+            self._lock.release()
+
+    def _full_sync(self, drive_service):
+        # 一覧の取得中の変更を取りこぼさないよう、先にトークンを取る
+        start_token = drive_service.changes().getStartPageToken().execute()['startPageToken']
+        posts = {}
+        page_token = None
+        while True:
+            response = drive_service.files().list(
+                q=BLOG_DOCUMENTS_QUERY,
+                fields=f'nextPageToken, files({FILE_FIELDS})',
+                pageSize=100,
+                pageToken=page_token
+            ).execute()
+            for file in response.get('files', []):
+                posts[file['id']] = format_blog_post(file)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        changed = [doc_id for doc_id, post in posts.items() if self._posts.get(doc_id) != post]
+        removed = [doc_id for doc_id in self._posts if doc_id not in posts]
+        self._posts = posts
+        self.page_token = start_token
+        return SyncResult(changed, removed, True)
+
+    def _apply_changes(self, drive_service):
+        changed, removed = [], []
+        page_token = self.page_token
+        while page_token:
+            response = drive_service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                includeRemoved=True,
+                pageSize=100,
+                fields=CHANGE_FIELDS
+            ).execute()
+            for change in response.get('changes', []):
+                if change.get('changeType', 'file') != 'file':
+                    continue
+                doc_id = change.get('fileId')
+                file = change.get('file') or {}
+                if change.get('removed') or not _is_blog_document(file):
+                    # 削除・ゴミ箱・フォルダ外への移動
+                    if self._posts.pop(doc_id, None) is not None:
+                        removed.append(doc_id)
+                    continue
+                post = format_blog_post(file)
+                if self._posts.get(doc_id) != post:
+                    self._posts[doc_id] = post
+                    changed.append(doc_id)
+            if 'newStartPageToken' in response:
+                self.page_token = response['newStartPageToken']
+                break
+            page_token = response.get('nextPageToken')
+        # 同じ差分の中で消えて戻った・変わって消えた記事
+        changed = [doc_id for doc_id in changed if doc_id in self._posts]
+        removed = [doc_id for doc_id in removed if doc_id not in self._posts]
+        return SyncResult(changed, removed, False)
+
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self._posts = {post['id']: post for post in state.get('posts', [])}
+            self.page_token = state.get('page_token')
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Blog sync state load error: {e}")
+            return
+        if self._posts:
+            set_blog_documents(self.posts())
+
+    def _save(self):
+        if not self.state_path:
+            return
+        try:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f'{self.state_path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'page_token': self.page_token, 'posts': self.posts()}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"Blog sync state save error: {e}")
+
+
+drive_sync = DriveChangeSync(BLOG_SYNC_STATE_PATH)
+
+
+def sync_blog():
+    """Drive の差分をキャッシュ・メタデータインデックス・検索インデックスに反映し、SyncResult を返す"""
+    result = drive_sync.sync()
+    if result is None or not (result.changed or result.removed):
+        return result
+    # 変わった記事は新しい modifiedTime で上書きされる。消えた記事はディスクに残さない
+    for document_id in result.removed:
+        post_cache.invalidate(document_id)
+    # 変わった記事だけ取得し直される（取得した記事はHTMLキャッシュにも入る）
+    metadata_index.refresh(drive_sync.posts())
+    search_index.refresh(drive_sync.posts())
+    return result
@@ -1,14 +1,68 @@
 # Claude API 共通ヘルパーモジュール
 import os
 import json
+import threading
+import time
 import anthropic
 from dotenv import load_dotenv
+from flask import g, has_request_context, request
+
+from utils.tracing import trace_span
+from utils.llm_usage import usage_store
+from utils.retry import RetryPolicy, RetryBlockedError, call_with_retry
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.concurrency_limit import AIMDLimiter, ConcurrencyLimitExceeded
+from utils import rate_limit
+from utils.rate_limit import RateLimitExceeded
 
 load_dotenv()
 
 CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-sonnet-5")
 
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# 1回の呼び出しを待つ上限（SDKの既定は10分）
+CLAUDE_TIMEOUT_SECONDS = float(os.getenv("CLAUDE_TIMEOUT_SECONDS", "60"))
+
+# SDKの自動リトライはリクエストスレッド内でsleepするため無効にし、retry_policy で制御する
+client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), max_retries=0,
+                             timeout=CLAUDE_TIMEOUT_SECONDS)
+
+# プロセス全体で共有するリトライ予算とRetry-Afterゲート
+retry_policy = RetryPolicy("claude")
+
+# 待たずに1回だけ再試行してよい一時的なエラー
+RETRYABLE_ERRORS = (anthropic.APIConnectionError, anthropic.InternalServerError,
+                    anthropic.ServiceUnavailableError)
+# 再試行せずRetry-Afterの間呼び出しを止めるエラー
+THROTTLED_ERRORS = (anthropic.RateLimitError, anthropic.OverloadedError)
+# サーキットブレーカーの失敗として数えるエラー（モデル側の障害）
+BREAKER_FAILURES = RETRYABLE_ERRORS + (anthropic.OverloadedError,)
+# 同時実行数の上限を下げるエラー（API側の混雑）
+CONGESTION_ERRORS = THROTTLED_ERRORS + (anthropic.APITimeoutError,)
+
+# APIを呼ばずにすぐ失敗したときのエラー。呼び出し側はキャッシュ済みの結果などで代替する
+LLM_UNAVAILABLE_ERRORS = (RetryBlockedError, CircuitOpenError, ConcurrencyLimitExceeded, RateLimitExceeded)
+
+# モデルごとのサーキットブレーカー
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# 処理中のLLM呼び出しの数の上限（全モデル共通）
+concurrency_limiter = AIMDLimiter(
+    "claude",
+    initial_limit=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    max_limit=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    latency_target=float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "30")))
+
+
+def circuit_breaker(model):
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = _breakers[model] = CircuitBreaker(
+                model,
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")))
+        return breaker
 
 
 def _extract_text(response):
@@ -16,9 +70,78 @@ def _extract_text(response):
     return "".join(block.text for block in response.content if block.type == "text")
 
 
-def ask_claude(prompt, max_tokens=1024):
-    """Claudeにプロンプトを送り、テキスト応答を返す"""
-    response = client.messages.create(
+def _usage_context(feature):
+    """機能タグ（未指定ならBlueprint名）・呼び出し元ルート・このリクエストで最初の呼び出しか"""
+    if not has_request_context():
+        return feature or "background", "<background>", False
+    new_request = not g.get("llm_request_counted", False)
+    g.llm_request_counted = True
+    return feature or request.blueprint or "other", request.endpoint or "<unmatched>", new_request
+
+
+def _call_api(kwargs):
+    """サーキットブレーカーと同時実行数の上限の内側で messages.create を呼ぶ"""
+    breaker = circuit_breaker(kwargs["model"])
+    token = breaker.allow()
+    try:
+        concurrency_limiter.acquire()
+    except ConcurrencyLimitExceeded:
+        breaker.release(token)
+        raise
+    started = time.perf_counter()
+    try:
+        response = call_with_retry(retry_policy, lambda: client.messages.create(**kwargs),
+                                   retryable=RETRYABLE_ERRORS, throttled=THROTTLED_ERRORS)
+    except Exception as e:
+        if isinstance(e, BREAKER_FAILURES):
+            breaker.record_failure(token)
+        else:
+            breaker.release(token)
+        concurrency_limiter.release(dropped=isinstance(e, CONGESTION_ERRORS))
+        raise
+    breaker.record_success(token)
+    concurrency_limiter.release(time.perf_counter() - started)
+    return response
+
+
+def _create_message(feature=None, **kwargs):
+    """messages.create を呼び、スパンとトークン使用量を記録
+
+    APIに送らずに断った呼び出し（LLM_UNAVAILABLE_ERRORS）は呼び出し・エラー・レイテンシに含めず、
+    拒否として別に数える。
+    """
+    feature, route, new_request = _usage_context(feature)
+    prompt_size = sum(len(message["content"]) for message in kwargs["messages"])
+    started = time.perf_counter()
+    response = None
+    rejected = False
+    try:
+        # ユーザー・IPごとの機能別の予算（超えていれば呼び出さずに RateLimitExceeded）
+        rate_limit.check(feature)
+        with trace_span("claude", "messages.create", **{"llm.model": kwargs["model"], "llm.feature": feature,
+                                                        "request.size": prompt_size}) as span:
+            response = _call_api(kwargs)
+            span.set_attribute("response.size", len(_extract_text(response)))
+            span.set_attribute("llm.stop_reason", response.stop_reason)
+            span.set_attribute("llm.input_tokens", response.usage.input_tokens)
+            span.set_attribute("llm.output_tokens", response.usage.output_tokens)
+            return response
+    except LLM_UNAVAILABLE_ERRORS:
+        rejected = True
+        raise
+    finally:
+        if rejected:
+            usage_store.record_rejection(feature)
+        else:
+            usage_store.record(feature, route, time.perf_counter() - started,
+                               usage=response.usage if response is not None else None,
+                               new_request=new_request, error=response is None)
+
+
+def ask_claude(prompt, max_tokens=1024, feature=None):
+    """Claudeにプロンプトを送り、テキスト応答を返す（featureは使用量集計用の機能タグ）"""
+    response = _create_message(
+        feature=feature,
         model=CLAUDE_MODEL,
         max_tokens=max_tokens,
         messages=[{"role": "user", "content": str(prompt)}],
@@ -26,9 +149,10 @@ def ask_claude(prompt, max_tokens=1024):
     return _extract_text(response).strip()
 
 
-def ask_claude_json(prompt, schema, max_tokens=1024):
+def ask_claude_json(prompt, schema, max_tokens=1024, feature=None):
     """構造化出力（JSONスキーマ）でClaudeを呼び、dictを返す"""
-    response = client.messages.create(
+    response = _create_message(
+        feature=feature,
         model=CLAUDE_MODEL,
         max_tokens=max_tokens,
         messages=[{"role": "user", "content": str(prompt)}],
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import pytest
+from flask import Flask
+
+
+@pytest.fixture
+def make_test_app(tmp_path):
+    """tmp_path の SQLite に db を初期化したテスト用アプリを作る関数
+
+    templates=True でリポジトリの templates を使い、login=True で LoginManager を設定する。
+    create_tables=False ならテーブルを作らない（マイグレーションのテスト用）。
+    """
+    def make(db_name='app.db', templates=False, login=False, create_tables=True):
+        from models import db, User
+        if templates:
+            test_app = Flask(__name__, template_folder=os.path.abspath('templates'))
+        else:
+            test_app = Flask(__name__)
+        test_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / db_name}"
+        test_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        test_app.secret_key = 'test'
+        db.init_app(test_app)
+        if login:
+            from flask_login import LoginManager
+            LoginManager(test_app).user_loader(lambda user_id: db.session.get(User, int(user_id)))
+        if create_tables:
+            with test_app.app_context():
+                db.create_all()
+        return test_app
+    return make
+
+
+@pytest.fixture
+def test_app(make_test_app):
+    """テーブル作成済みのテスト用アプリ"""
+    return make_test_app()
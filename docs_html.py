@@ -0,0 +1,370 @@
+"""
+Google ドキュメント（Docs API の body.content）の HTML 変換
+
+ドキュメントを先頭から1回だけ走査して HTML を組み立てる。
+
+- 段落の要素は1回だけ見て、HTML と「空の段落か」を同時に求める
+- 箇条書きは ListBuilder が <ul>/<ol> の入れ子にまとめる。番号付きかどうかと
+  番号の種類は documents.get の lists（listProperties.nestingLevels）から決め、
+  番号はリストID・レベルごとに数えるので、途中に段落を挟んでも続きから振る
+- 同じ textStyle / paragraphStyle から作るタグ・CSS はドキュメント内でメモ化する
+
+目安の処理速度は bench_docs_html.py を参照（1スレッドで 20MB/秒 以上の Docs JSON）。
+"""
+
+import re
+
+HEADING_TAGS = {
+    'HEADING_1': 'h1',
+    'HEADING_2': 'h2',
+    'HEADING_3': 'h3',
+    'HEADING_4': 'h4',
+}
+
+ALIGNMENT_CSS = {
+    'CENTER': 'text-align: center',
+    'END': 'text-align: right',
+    'JUSTIFY': 'text-align: justify',
+}
+
+# 番号付きリストの glyphType と <ol type>
+ORDERED_GLYPH_TYPES = {
+    'DECIMAL': '1',
+    'ZERO_DECIMAL': '1',
+    'ALPHA': 'a',
+    'UPPER_ALPHA': 'A',
+    'ROMAN': 'i',
+    'UPPER_ROMAN': 'I',
+}
+
+SANS_SERIF_FONTS = {'Arial', 'Times New Roman', 'Courier New', 'Helvetica', 'Georgia', 'Verdana', 'Roboto', 'Open Sans'}
+
+EMPTY_PARAGRAPH_HTML = '<div style="height: 1em;"></div>'  # 段落間スペース
+SECTION_BREAK_HTML = '<hr style="margin: 20px 0; border: none; border-top: 1px solid #eee;">'
+TABLE_OPEN_HTML = '<table style="border-collapse: collapse; width: 100%; margin: 16px 0;">'
+CELL_BASE_STYLES = ['border: 1px solid #ddd', 'padding: 8px', 'vertical-align: top']
+
+IMAGE_PLACEHOLDER_HTML = '''<div style="margin: 16px 0; padding: 20px; border: 2px dashed #ccc; text-align: center; background-color: #f9f9f9; border-radius: 8px;">
+                    <p style="margin: 0; color: #666; font-size: 14px;">
+                        📷 画像が挿入されています<br>
+                        <small style="color: #999;">(ID: {object_id})</small>
+                    </p>
+                </div>'''
+
+_NEWLINE_TABLE = str.maketrans({'\n': '<br>', '\u000b': '<br>', '\r': '<br>'})
+_REPEATED_BR_RE = re.compile(r'(<br>\s*){2,}')
+_HEADING_RE = re.compile(r'<h[1-6]>(.*?)</h[1-6]>')
+
+
+def _rgb_css(color):
+    rgb = color.get('color', {}).get('rgbColor')
+    if rgb is None:
+        return None
+    r = int(rgb.get('red', 0) * 255)
+    g = int(rgb.get('green', 0) * 255)
+    b = int(rgb.get('blue', 0) * 255)
+    return f'rgb({r}, {g}, {b})'
+
+
+def _font_family_css(font_family):
+    if font_family in SANS_SERIF_FONTS:
+        return f'font-family: "{font_family}", sans-serif'
+    if font_family in ('Times', 'serif'):
+        return f'font-family: "{font_family}", serif'
+    if 'Noto' in font_family or 'Gothic' in font_family or 'Mincho' in font_family or 'Hiragino' in font_family:
+        return f'font-family: "{font_family}", "Hiragino Sans", "Meiryo", sans-serif'
+    lowered = font_family.lower()
+    if 'monospace' in lowered or 'courier' in lowered or 'mono' in lowered:
+        return f'font-family: "{font_family}", "Courier New", monospace'
+    return f'font-family: "{font_family}", sans-serif'
+
+
+def text_style_wrappers(text_style):
+    """textStyle からテキストの前後に付けるタグ（開始, 終了）"""
+    opening, closing = [], []
+    span_styles = []
+    background = text_style.get('backgroundColor')
+    if background is not None:
+        css = _rgb_css(background)
+        if css:
+            span_styles.append(f'background-color: {css}')
+    foreground = text_style.get('foregroundColor')
+    if foreground is not None:
+        css = _rgb_css(foreground)
+        if css:
+            span_styles.append(f'color: {css}')
+    if 'fontSize' in text_style:
+        span_styles.append(f"font-size: {text_style['fontSize'].get('magnitude', 10)}px")
+    if 'weightedFontFamily' in text_style:
+        font_family = text_style['weightedFontFamily'].get('fontFamily', '')
+    else:
+        font_family = text_style.get('fontFamily')
+    if font_family:
+        span_styles.append(_font_family_css(font_family))
+
+    # 内側から strong → em → u → span → a の順に囲む
+    url = text_style.get('link', {}).get('url', '') if 'link' in text_style else ''
+    if url:
+        opening.append(f'<a href="{url}" target="_blank">')
+        closing.append('</a>')
+    if span_styles:
+        opening.append(f'<span style="{"; ".join(span_styles)}">')
+        closing.append('</span>')
+    if text_style.get('underline'):
+        opening.append('<u>')
+        closing.append('</u>')
+    if text_style.get('italic'):
+        opening.append('<em>')
+        closing.append('</em>')
+    if text_style.get('bold'):
+        opening.append('<strong>')
+        closing.append('</strong>')
+    return ''.join(opening), ''.join(reversed(closing))
+
+
+def paragraph_style_css(paragraph_style):
+    """paragraphStyle の行間・前後スペース・揃えのCSS（無ければ空文字）"""
+    styles = []
+    line_spacing = paragraph_style.get('lineSpacing')
+    if isinstance(line_spacing, dict) and 'magnitude' in line_spacing:
+        styles.append(f"line-height: {line_spacing['magnitude']}")
+    if 'spaceAbove' in paragraph_style:
+        space_above = paragraph_style['spaceAbove'].get('magnitude', 0)
+        if space_above > 0:
+            styles.append(f'margin-top: {space_above}px')
+    if 'spaceBelow' in paragraph_style:
+        space_below = paragraph_style['spaceBelow'].get('magnitude', 0)
+        if space_below > 0:
+            styles.append(f'margin-bottom: {space_below}px')
+    alignment = ALIGNMENT_CSS.get(paragraph_style.get('alignment', ''))
+    if alignment:
+        styles.append(alignment)
+    return '; '.join(styles)
+
+
+def _style_key(style):
+    # Docs API の JSON はキーの順序が一定なので、repr をそのままキーにする
+    return repr(style)
+
+
+class ListBuilder:
+    """箇条書きの段落を <ul>/<ol> の入れ子にまとめる"""
+
+    def __init__(self, converter, output):
+        self.converter = converter
+        self.output = output
+        self._parts = []
+        self._stack = []  # [タグ, <li> が開いているか]
+        self._list_id = None
+
+    def add(self, list_id, level, content, style):
+        if self._stack and list_id != self._list_id:
+            self.close()
+        self._list_id = list_id
+        stack = self._stack
+        while len(stack) > level + 1:
+            self._close_level()
+        if len(stack) == level + 1 and stack[-1][1]:
+            self._parts.append('</li>')
+        while len(stack) < level + 1:
+            # 親の<li>の中に入れ子のリストを開く
+            tag, attributes = self.converter.list_tag(list_id, len(stack))
+            self._parts.append(f'<{tag}{attributes}>')
+            stack.append([tag, False])
+        self.converter.count_item(list_id, level)
+        self._parts.append(f'<li style="{style}">{content}' if style else f'<li>{content}')
+        stack[-1][1] = True
+
+    def _close_level(self):
+        tag, item_open = self._stack.pop()
+        self._parts.append(f'</li></{tag}>' if item_open else f'</{tag}>')
+
+    def close(self):
+        if not self._stack:
+            return
+        while self._stack:
+            self._close_level()
+        self.output.append(''.join(self._parts))
+        self._parts = []
+        self._list_id = None
+
+
+class DocsHtmlConverter:
+    def __init__(self, lists=None):
+        self.lists = lists or {}
+        self._text_styles = {}
+        self._paragraph_styles = {}
+        self._counters = {}  # listId -> レベルごとに振った番号の数
+
+    # 番号付きリスト
+
+    def _nesting_level(self, list_id, level):
+        levels = self.lists.get(list_id, {}).get('listProperties', {}).get('nestingLevels', [])
+        return levels[level] if level < len(levels) else {}
+
+    def list_tag(self, list_id, level):
+        """リストのタグと属性（番号付きなら続きの番号から始める）"""
+        nesting = self._nesting_level(list_id, level)
+        ol_type = ORDERED_GLYPH_TYPES.get(nesting.get('glyphType'))
+        if ol_type is None:
+            return 'ul', ''
+        counts = self._counters.get(list_id, ())
+        start = nesting.get('startNumber', 1) + (counts[level] if level < len(counts) else 0)
+        attributes = f' type="{ol_type}"' if ol_type != '1' else ''
+        if start != 1:
+            attributes += f' start="{start}"'
+        return 'ol', attributes
+
+    def count_item(self, list_id, level):
+        counts = self._counters.setdefault(list_id, [])
+        if len(counts) <= level:
+            counts.extend([0] * (level + 1 - len(counts)))
+        counts[level] += 1
+        # 上のレベルの項目が来たら下のレベルの番号は振り直す
+        del counts[level + 1:]
+
+    # 段落
+
+    def _wrappers(self, text_style):
+        key = _style_key(text_style)
+        wrappers = self._text_styles.get(key)
+        if wrappers is None:
+            wrappers = self._text_styles[key] = text_style_wrappers(text_style)
+        return wrappers
+
+    def _paragraph_format(self, paragraph_style):
+        """(タグ, CSS)"""
+        if not paragraph_style:
+            return 'p', ''
+        key = _style_key(paragraph_style)
+        paragraph_format = self._paragraph_styles.get(key)
+        if paragraph_format is None:
+            paragraph_format = self._paragraph_styles[key] = (
+                HEADING_TAGS.get(paragraph_style.get('namedStyleType', ''), 'p'),
+                paragraph_style_css(paragraph_style))
+        return paragraph_format
+
+    def paragraph_content(self, paragraph):
+        """段落の中身のHTMLと、テキストが空白だけの段落か"""
+        parts = []
+        text_length = 0
+        has_visible_text = False
+        for element in paragraph.get('elements', ()):
+            text_run = element.get('textRun')
+            if text_run is not None:
+                text = text_run.get('content', '')
+                if text:
+                    text_length += len(text)
+                    if not has_visible_text and text.strip():
+                        has_visible_text = True
+                    if '\n' in text or '\u000b' in text or '\r' in text:
+                        text = text.translate(_NEWLINE_TABLE)
+                        if text.count('<br>') > 1:
+                            text = _REPEATED_BR_RE.sub('<br><br>', text)
+                text_style = text_run.get('textStyle')
+                if text_style:
+                    opening, closing = self._wrappers(text_style)
+                    text = f'{opening}{text}{closing}'
+                parts.append(text)
+            elif 'inlineObjectElement' in element:
+                object_id = element['inlineObjectElement'].get('inlineObjectId', '')
+                if object_id:
+                    parts.append(IMAGE_PLACEHOLDER_HTML.format(object_id=object_id))
+        is_empty = not parts or not has_visible_text
+        return ''.join(parts).strip(), is_empty
+
+    def paragraph_html(self, paragraph):
+        """段落1つ（箇条書き以外）のHTML（中身が無ければ空文字）"""
+        content, _ = self.paragraph_content(paragraph)
+        if not content:
+            return ''
+        tag, style = self._paragraph_format(paragraph.get('paragraphStyle'))
+        if style:
+            return f'<{tag} style="{style}">{content}</{tag}>'
+        return f'<{tag}>{content}</{tag}>'
+
+    # ドキュメント・表
+
+    def convert(self, content):
+        output = []
+        self._convert_elements(content, output, in_cell=False)
+        return '\n'.join(output)
+
+    def _convert_elements(self, content, output, in_cell):
+        builder = ListBuilder(self, output)
+        for element in content:
+            paragraph = element.get('paragraph')
+            if paragraph is not None:
+                bullet = paragraph.get('bullet')
+                if bullet is not None:
+                    item, _ = self.paragraph_content(paragraph)
+                    if item:
+                        while item.endswith('<br>'):
+                            item = item[:-len('<br>')]
+                        _, style = self._paragraph_format(paragraph.get('paragraphStyle'))
+                        builder.add(bullet.get('listId', ''), bullet.get('nestingLevel', 0), item, style)
+                    continue
+                builder.close()
+                if in_cell:
+                    output.append(self._cell_paragraph_html(paragraph))
+                    continue
+                content_html, is_empty = self.paragraph_content(paragraph)
+                if content_html:
+                    tag, style = self._paragraph_format(paragraph.get('paragraphStyle'))
+                    output.append(f'<{tag} style="{style}">{content_html}</{tag}>' if style
+                                  else f'<{tag}>{content_html}</{tag}>')
+                elif is_empty:
+                    # 空の段落は改行として追加
+                    output.append(EMPTY_PARAGRAPH_HTML)
+                continue
+            builder.close()
+            if 'table' in element:
+                table_html = self.table_html(element['table'])
+                if table_html:
+                    output.append(table_html)
+            elif 'sectionBreak' in element and not in_cell:
+                # セクション区切りは改ページとして扱う
+                output.append(SECTION_BREAK_HTML)
+        builder.close()
+
+    def _cell_paragraph_html(self, paragraph):
+        # 表の中では<p>タグを除去し、見出しは<strong>にしてシンプルにする
+        html = self.paragraph_html(paragraph)
+        if html.startswith('<p>') and html.endswith('</p>'):
+            return html[3:-4]
+        if html.startswith('<h'):
+            return _HEADING_RE.sub(r'<strong>\1</strong>', html)
+        return html
+
+    def table_html(self, table):
+        """表をHTMLテーブルに変換（最初の行をヘッダーとして扱う）"""
+        rows = table.get('tableRows')
+        if not rows:
+            return ''
+        html = [TABLE_OPEN_HTML]
+        for i, row in enumerate(rows):
+            html.append('<tr>')
+            for cell in row.get('tableCells', []):
+                cell_styles = []
+                background = cell.get('tableCellStyle', {}).get('backgroundColor')
+                if background is not None:
+                    css = _rgb_css(background)
+                    if css:
+                        cell_styles.append(f'background-color: {css}')
+                cell_styles.extend(CELL_BASE_STYLES)
+                tag = 'td'
+                if i == 0:
+                    tag = 'th'
+                    cell_styles.append('font-weight: bold')
+                cell_content = []
+                self._convert_elements(cell.get('content', []), cell_content, in_cell=True)
+                cell_text = '<br>'.join(cell_content) if cell_content else '&nbsp;'
+                html.append(f'<{tag} style="{"; ".join(cell_styles)}">{cell_text}</{tag}>')
+            html.append('</tr>')
+        html.append('</table>')
+        return '\n'.join(html)
+
+
+def convert_to_html(content, lists=None):
+    """GoogleドキュメントのコンテンツをHTMLに変換（lists は documents.get の lists）"""
+    return DocsHtmlConverter(lists).convert(content)
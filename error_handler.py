@@ -1,44 +1,51 @@
 # エラーハンドリング用のユーティリティモジュール
-import time
+import os
+from datetime import datetime
 from functools import wraps
-from flask import session, request
+from flask import request
 from flask_login import current_user
 from translations import get_text, get_user_language
 from sqlalchemy.exc import OperationalError
 import anthropic
+from models import SystemErrorLog
+from utils.error_sink import ErrorLogSink
+from utils.retry import RetryBlockedError
+from utils.circuit_breaker import CircuitOpenError
+from utils.concurrency_limit import ConcurrencyLimitExceeded
+from utils.rate_limit import RateLimitExceeded
+
+# エラーログはリクエストのセッションを使わず、バックグラウンドでまとめて書き込む
+error_log_sink = ErrorLogSink(
+    SystemErrorLog,
+    dedup_window=float(os.getenv('ERROR_LOG_DEDUP_SECONDS', '60')),
+    max_buffer=1000,
+    spill_path=os.getenv('ERROR_LOG_SPILL_PATH'))
 
 
 def log_system_error(error_type, error_message, feature=None):
-    """システムエラーをデータベースに記録"""
+    """システムエラーを記録（DBへの書き込みは error_log_sink がバックグラウンドで行う）"""
     try:
-        # 循環インポートを避けるため、ここでインポート
-        from models import db, SystemErrorLog
-        
-        user_id = current_user.id if current_user.is_authenticated else None
+        user_id = current_user.id if request and current_user.is_authenticated else None
         user_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr) if request else None
         user_agent = request.headers.get('User-Agent', '')[:255] if request else None
         request_path = request.path if request else None
-        
-        error_log = SystemErrorLog(
-            error_type=error_type,
-            error_message=error_message[:1000] if error_message else None,  # メッセージを制限
-            feature=feature,
-            user_id=user_id,
-            user_ip=user_ip,
-            user_agent=user_agent,
-            request_path=request_path
-        )
-        
-        db.session.add(error_log)
-        db.session.commit()
-        
+
+        error_log_sink.add({
+            'error_type': error_type,
+            'error_message': error_message[:1000] if error_message else None,  # メッセージを制限
+            'feature': feature,
+            'user_id': user_id,
+            'user_ip': user_ip,
+            'user_agent': user_agent,
+            'request_path': request_path,
+            'created_at': datetime.utcnow(),
+            'resolved': False,
+            'occurrences': 1,
+        })
+
     except Exception as e:
         # ログ記録自体が失敗しても、メイン機能は継続
         print(f"Failed to log system error: {e}")
-        try:
-            db.session.rollback()
-        except:
-            pass
 
 def get_localized_error_message(error_type, language=None):
     """言語設定に応じたエラーメッセージを取得"""
@@ -53,9 +60,17 @@ def handle_claude_errors(func):
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except anthropic.RateLimitError as e:
+        except RateLimitExceeded:
+            # 利用者ごとの予算超過はシステムエラーではないので記録しない
+            return {"error": get_localized_error_message("api_rate_limit_error"), "type": "rate_limit"}
+        except (anthropic.RateLimitError, anthropic.OverloadedError, RetryBlockedError) as e:
+            # Retry-After の間は claude_helper が呼び出しを止めているので、待たずにすぐ返す
             log_system_error("rate_limit", str(e), kwargs.get('feature'))
             return {"error": get_localized_error_message("api_rate_limit_error"), "type": "rate_limit"}
+        except (CircuitOpenError, ConcurrencyLimitExceeded) as e:
+            # API障害・混雑中はタイムアウトまで待たずにすぐ返す
+            log_system_error("unavailable", str(e), kwargs.get('feature'))
+            return {"error": get_localized_error_message("feature_temporarily_disabled"), "type": "unavailable"}
         except anthropic.APIConnectionError as e:
             log_system_error("connection", str(e), kwargs.get('feature'))
             return {"error": get_localized_error_message("api_connection_error"), "type": "connection"}
@@ -89,52 +104,6 @@ def handle_database_errors(func):
     return wrapper
 
 
-def retry_with_backoff(max_retries=3, base_delay=1):
-    """指数バックオフでリトライするデコレータ"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except (anthropic.RateLimitError, anthropic.OverloadedError) as e:
-                    if attempt == max_retries - 1:
-                        log_system_error("rate_limit", str(e), func.__name__)
-                        return {"error": get_localized_error_message("api_rate_limit_error"), "type": "rate_limit"}
-                    delay = base_delay * (2 ** attempt)
-                    time.sleep(delay)
-                except (anthropic.APIConnectionError, anthropic.APIError) as e:
-                    if attempt == max_retries - 1:
-                        if "credit" in str(e).lower() or "billing" in str(e).lower():
-                            log_system_error("quota", str(e), func.__name__)
-                            return {"error": get_localized_error_message("openai_quota_exceeded"), "type": "quota"}
-                        log_system_error("api_connection", str(e), func.__name__)
-                        return {"error": get_localized_error_message("api_connection_error"), "type": "connection"}
-                    delay = base_delay * (2 ** attempt)
-                    print(f"API error, waiting {delay}s before retry {attempt + 1}/{max_retries}: {e}")
-                    time.sleep(delay)
-            log_system_error("max_retries", "Maximum retry attempts exceeded", func.__name__)
-            return {"error": get_localized_error_message("general_system_error"), "type": "max_retries_exceeded"}
-        return wrapper
-    return decorator
-
-
-def check_system_load():
-    """システム負荷をチェックし、必要に応じてサービス制限を適用"""
-    # 簡単な負荷チェック（将来的にはより高度な監視を実装）
-    current_time = time.time()
-    
-    # セッションベースの簡易レート制限
-    if 'last_api_request' in session:
-        time_since_last = current_time - session['last_api_request']
-        if time_since_last < 2:  # 2秒以内の連続リクエストを制限
-            log_system_error("rate_limit", "Session-based rate limiting triggered", "system")
-            return {"error": get_localized_error_message("api_rate_limit_error"), "limited": True}
-    
-    session['last_api_request'] = current_time
-    return {"limited": False}
-
-
 def format_error_response(error_info, additional_info=None):
     """エラー情報を統一フォーマットで返す"""
     response = {
@@ -150,16 +119,13 @@ def format_error_response(error_info, additional_info=None):
 
 
 def safe_claude_request(api_function):
-    """Claude APIリクエストを安全に実行する統合関数"""
-    @retry_with_backoff(max_retries=3, base_delay=1)
+    """Claude APIリクエストを安全に実行する統合関数
+
+    リトライは claude_helper の retry_policy が待たずに行う（レート制限時はすぐにエラーを返す）
+    """
     @handle_claude_errors
     def make_request():
-        # システム負荷チェック
-        load_check = check_system_load()
-        if load_check.get("limited", False):
-            return load_check
-        
-        # API実行
+        # 利用者ごとのレート制限は claude_helper が呼び出しのたびに行う
         return api_function()
     
     return make_request()
\ No newline at end of file
@@ -2,6 +2,21 @@ import gspread
 import pandas as pd
 import os
 import json
+from gspread.http_client import HTTPClient
+
+from utils.tracing import trace_span
+
+
+class _TimedHTTPClient(HTTPClient):
+    """Google Sheets APIへの各リクエストをスパンとして記録"""
+
+    def request(self, method, endpoint, *args, **kwargs):
+        path = endpoint.split('?', 1)[0].split('googleapis.com', 1)[-1]
+        with trace_span('google', f'{method.upper()} {path}', **{'http.url': endpoint.split('?', 1)[0]}) as span:
+            response = super().request(method, endpoint, *args, **kwargs)
+            span.set_attribute('http.status_code', response.status_code)
+            span.set_attribute('response.size', len(response.content))
+            return response
 
 def get_google_sheets_client():
     """Google Sheets APIクライアントを取得"""
@@ -14,7 +29,7 @@ def get_google_sheets_client():
             try:
                 credentials_dict = json.loads(service_account_json)
                 # gspreadで辞書から認証
-                gc = gspread.service_account_from_dict(credentials_dict)
+                gc = gspread.service_account_from_dict(credentials_dict, http_client=_TimedHTTPClient)
                 return gc
             except json.JSONDecodeError as e:
                 print(f"環境変数のJSONパースエラー: {e}")
@@ -25,7 +40,7 @@ def get_google_sheets_client():
         credentials_path = os.getenv('GOOGLE_SHEETS_CREDENTIALS_PATH', 'japaneseapp-466108-327bc89dfc8e.json')
         
         if os.path.exists(credentials_path):
-            gc = gspread.service_account(filename=credentials_path)
+            gc = gspread.service_account(filename=credentials_path, http_client=_TimedHTTPClient)
             return gc
         else:
             print(f"認証ファイルが見つかりません: {credentials_path}")
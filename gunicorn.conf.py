@@ -0,0 +1,7 @@
+"""gunicorn の設定（Procfile の `gunicorn app:app` が自動で読み込む）"""
+
+
+def post_worker_init(worker):
+    # スケジューラと起動時のキャッシュ作成は、リクエストを受けるワーカーでだけ開始する
+    from app import start_background_jobs
+    start_background_jobs()
@@ -0,0 +1,224 @@
+"""
+ログテーブルの期間パーティションと保持期間管理
+
+- PostgreSQL: GrammarQuizLog / FlashcardLog / SystemErrorLog を created_at の月単位で
+  ネイティブパーティション化し、先の月のパーティションを事前に作成する。
+- 保持期間（LOG_RETENTION_DAYS、デフォルト90日）を過ぎた行は日次集計
+  （LogDailyAggregate）にまとめてから削除する。PostgreSQLでは空になった古い
+  パーティションをDROPする。SQLiteでは削除のみ行い、created_atのインデックスで
+  テーブルを保持期間分の大きさに保つ。
+
+ジョブは app.py の APScheduler から毎日実行する。
+"""
+
+import json
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, text
+
+from models import db, GrammarQuizLog, FlashcardLog, SystemErrorLog, LogDailyAggregate
+
+LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', '90'))
+
+# 何か月先までパーティションを用意しておくか
+PARTITION_MONTHS_AHEAD = 2
+
+# テーブルごとの集計キーと合計する値の列
+LOG_TABLES = {
+    GrammarQuizLog: {'dimensions': ('jlpt_level', 'direction'), 'value': 'score'},
+    FlashcardLog: {'dimensions': ('jlpt_level', 'result'), 'value': None},
+    SystemErrorLog: {'dimensions': ('error_type', 'feature'), 'value': 'occurrences'},
+}
+
+
+def _is_postgresql():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _partition_name(table_name, month):
+    return f'{table_name}_p{month.year:04d}{month.month:02d}'
+
+
+# --- PostgreSQL パーティション ---
+
+def is_partitioned(table_name):
+    """PostgreSQLでテーブルがパーティション化済みかチェック"""
+    if not _is_postgresql():
+        return False
+    with db.engine.connect() as conn:
+        relkind = conn.execute(
+            text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+            {'name': table_name}).scalar()
+    return relkind == 'p'
+
+
+def _create_month_partition(conn, table_name, month):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_partition_name(table_name, month)} PARTITION OF {table_name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"))
+
+
+def convert_to_partitioned(model):
+    """既存のログテーブルを created_at の月単位パーティションテーブルに置き換える
+
+    旧テーブルの行は新テーブルへコピーし、IDのシーケンスは引き継ぐ。
+    """
+    table_name = model.__tablename__
+    if not _is_postgresql() or is_partitioned(table_name):
+        return False
+
+    legacy_name = f'{table_name}_unpartitioned'
+    with db.engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {table_name} RENAME TO {legacy_name}'))
+        conn.execute(text(f'UPDATE {legacy_name} SET created_at = now() WHERE created_at IS NULL'))
+        conn.execute(text(
+            f'CREATE TABLE {table_name} (LIKE {legacy_name} INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE (created_at)'))
+        # パーティションテーブルの主キーにはパーティションキーを含める必要がある
+        conn.execute(text(
+            f'ALTER TABLE {table_name} ADD CONSTRAINT {table_name}_partitioned_pkey '
+            f'PRIMARY KEY (id, created_at)'))
+        for fk in model.__table__.foreign_keys:
+            conn.execute(text(
+                f'ALTER TABLE {table_name} ADD FOREIGN KEY ({fk.parent.name}) '
+                f'REFERENCES {fk.column.table.name} ({fk.column.name})'))
+
+        sequence = conn.execute(
+            text("SELECT pg_get_serial_sequence(:table, 'id')"), {'table': legacy_name}).scalar()
+        if sequence:
+            conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {table_name}.id'))
+
+        oldest = conn.execute(text(f'SELECT min(created_at) FROM {legacy_name}')).scalar()
+        month = _month_start((oldest or datetime.utcnow()).date())
+        last_month = _month_start(datetime.utcnow().date())
+        for _ in range(PARTITION_MONTHS_AHEAD):
+            last_month = _next_month(last_month)
+        while month <= last_month:
+            _create_month_partition(conn, table_name, month)
+            month = _next_month(month)
+        conn.execute(text(f'CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT'))
+
+        conn.execute(text(f'INSERT INTO {table_name} SELECT * FROM {legacy_name}'))
+        conn.execute(text(f'DROP TABLE {legacy_name}'))
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_{table_name}_created_at ON {table_name} (created_at)'))
+    print(f"Converted {table_name} to a partitioned table")
+    return True
+
+
+def ensure_partitions(months_ahead=PARTITION_MONTHS_AHEAD):
+    """今月から months_ahead か月先までのパーティションを作成"""
+    if not _is_postgresql():
+        return
+    for model in LOG_TABLES:
+        table_name = model.__tablename__
+        if not is_partitioned(table_name):
+            continue
+        month = _month_start(datetime.utcnow().date())
+        with db.engine.begin() as conn:
+            for _ in range(months_ahead + 1):
+                _create_month_partition(conn, table_name, month)
+                month = _next_month(month)
+
+
+def drop_expired_partitions(cutoff):
+    """期間が cutoff より前に終わる空のパーティションをDROP"""
+    if not _is_postgresql():
+        return []
+    dropped = []
+    for model in LOG_TABLES:
+        table_name = model.__tablename__
+        if not is_partitioned(table_name):
+            continue
+        with db.engine.begin() as conn:
+            partitions = conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :name"), {'name': table_name}).scalars().all()
+            for partition in partitions:
+                suffix = partition[len(table_name) + 2:]
+                if not partition.startswith(f'{table_name}_p') or len(suffix) != 6 or not suffix.isdigit():
+                    continue
+                month = date(int(suffix[:4]), int(suffix[4:]), 1)
+                if _next_month(month) > cutoff.date():
+                    continue
+                if conn.execute(text(f'SELECT 1 FROM {partition} LIMIT 1')).first() is None:
+                    conn.execute(text(f'DROP TABLE {partition}'))
+                    dropped.append(partition)
+    return dropped
+
+
+# --- 保持期間と日次集計 ---
+
+def _as_date(value):
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def compact_table(model, cutoff):
+    """cutoff より古い行を日次集計に加算してから削除し、削除件数を返す"""
+    config = LOG_TABLES[model]
+    dimension_columns = [getattr(model, name) for name in config['dimensions']]
+    value_column = getattr(model, config['value']) if config['value'] else None
+    day = func.date(model.created_at)
+
+    columns = [day, *dimension_columns, func.count(model.id)]
+    if value_column is not None:
+        columns.append(func.sum(value_column))
+    groups = db.session.query(*columns).filter(
+        model.created_at < cutoff
+    ).group_by(day, *dimension_columns).all()
+
+    for group in groups:
+        group_day = _as_date(group[0])
+        dimensions = json.dumps(
+            dict(zip(config['dimensions'], group[1:1 + len(dimension_columns)])),
+            ensure_ascii=False, sort_keys=True)
+        count = group[1 + len(dimension_columns)]
+        value_sum = group[2 + len(dimension_columns)] if value_column is not None else None
+
+        aggregate = LogDailyAggregate.query.filter_by(
+            source=model.__tablename__, day=group_day, dimensions=dimensions).first()
+        if aggregate is None:
+            aggregate = LogDailyAggregate(
+                source=model.__tablename__, day=group_day, dimensions=dimensions, count=0)
+            db.session.add(aggregate)
+        aggregate.count += count
+        if value_sum is not None:
+            aggregate.value_sum = (aggregate.value_sum or 0) + value_sum
+
+    deleted = model.query.filter(model.created_at < cutoff).delete(synchronize_session=False)
+    # 集計の加算と削除は同じトランザクションでコミットする
+    db.session.commit()
+    return deleted
+
+
+def compact_log_tables(retention_days=None):
+    """全ログテーブルの保持期間切れの行を日次集計にまとめる（スケジューラから毎日実行）"""
+    retention_days = LOG_RETENTION_DAYS if retention_days is None else retention_days
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = today - timedelta(days=retention_days)
+
+    ensure_partitions()
+    results = {}
+    for model in LOG_TABLES:
+        try:
+            results[model.__tablename__] = compact_table(model, cutoff)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Log compaction error ({model.__tablename__}): {e}")
+    drop_expired_partitions(cutoff)
+    print(f"Compacted log tables older than {cutoff.date()}: {results}")
+    return results
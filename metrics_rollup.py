@@ -0,0 +1,138 @@
+"""
+管理画面用メトリクスの定期集計
+
+APScheduler のジョブ（app.py）が METRICS_ROLLUP_MINUTES ごとに run_metrics_rollup() を
+実行し、集計結果を SystemMetrics に書き込む。管理者ダッシュボードと
+/admin/system-metrics はこの集計済みの行だけを読むため、ログやユーザーが
+増えても表示のコストは変わらない。
+
+metric_type の命名:
+- total_users / total_feedback / unread_feedback / new_users_7d / active_users_24h: 集計時点の値
+- quiz_volume:<機能> / error_count / error_count:<機能> / error_rate: 集計期間内の値
+- api_latency_p50:<サービス> など: 集計期間内の外部API呼び出しのレイテンシ（秒）
+- requests:<エンドポイント> / request_latency_p95:<エンドポイント> / db_queries_per_request:<エンドポイント> など:
+  集計期間内のリクエスト計測（utils.instrumentation）
+- llm_input_tokens:<機能> / llm_cost_usd:<機能> / llm_route_tokens:<エンドポイント> など:
+  集計期間内のLLM使用量（utils.llm_usage）
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, union
+
+from models import db, User, Feedback, GrammarQuizLog, FlashcardLog, QuizPlayCount, SystemErrorLog, SystemMetrics
+from utils.latency import drain_samples, percentile
+from utils.instrumentation import drain_interval, interval_metrics
+from utils.llm_usage import usage_store, usage_metrics
+
+METRICS_ROLLUP_MINUTES = int(os.getenv('METRICS_ROLLUP_MINUTES', '60'))
+METRICS_RETENTION_DAYS = int(os.getenv('METRICS_RETENTION_DAYS', '30'))
+
+# 機能ごとの学習イベント（テーブルと時刻の列）
+QUIZ_SOURCES = {
+    'grammar': (GrammarQuizLog, GrammarQuizLog.created_at),
+    'flashcard': (FlashcardLog, FlashcardLog.created_at),
+    'youtube_listening': (QuizPlayCount, QuizPlayCount.last_played),
+}
+
+LATENCY_PERCENTILES = (50, 95, 99)
+
+# SystemMetrics.metric_type の長さ（エンドポイント名を含むため）
+METRIC_TYPE_LENGTH = 120
+
+# ダッシュボードで表示する集計時点の値
+DASHBOARD_METRICS = ('total_users', 'total_feedback', 'unread_feedback', 'new_users_7d', 'active_users_24h')
+
+
+def _count(query):
+    return query.scalar() or 0
+
+
+def compute_snapshot_metrics(now):
+    """集計時点の累計値"""
+    day_ago = now - timedelta(days=1)
+    active_user_ids = union(
+        db.select(User.id).where(User.last_login >= day_ago),
+        db.select(GrammarQuizLog.user_id).where(GrammarQuizLog.created_at >= day_ago),
+        db.select(FlashcardLog.user_id).where(FlashcardLog.created_at >= day_ago),
+    ).subquery()
+    return {
+        'total_users': _count(db.session.query(func.count(User.id))),
+        'total_feedback': _count(db.session.query(func.count(Feedback.id))),
+        'unread_feedback': _count(db.session.query(func.count(Feedback.id)).filter(Feedback.status == 'unread')),
+        'new_users_7d': _count(db.session.query(func.count(User.id)).filter(
+            User.created_at >= now - timedelta(days=7))),
+        'active_users_24h': _count(db.session.query(func.count()).select_from(active_user_ids)),
+    }
+
+
+def compute_period_metrics(period_start, period_end):
+    """集計期間内の学習イベント数・エラー数"""
+    metrics = {}
+    total_events = 0
+    for feature, (model, column) in QUIZ_SOURCES.items():
+        count = _count(db.session.query(func.count(model.id)).filter(
+            column >= period_start, column < period_end))
+        metrics[f'quiz_volume:{feature}'] = count
+        total_events += count
+
+    errors = db.session.query(SystemErrorLog.feature,
+                              func.sum(func.coalesce(SystemErrorLog.occurrences, 1))).filter(
+        SystemErrorLog.created_at >= period_start, SystemErrorLog.created_at < period_end
+    ).group_by(SystemErrorLog.feature).all()
+    error_count = 0
+    for feature, count in errors:
+        metrics[f'error_count:{feature or "other"}'] = count
+        error_count += count
+    metrics['error_count'] = error_count
+    # 学習イベントとエラーを合わせた操作のうち、エラーになった割合
+    metrics['error_rate'] = error_count / (error_count + total_events) if error_count else 0.0
+    return metrics
+
+
+def compute_latency_metrics(samples):
+    """サービスごとのレイテンシのパーセンタイル"""
+    metrics = {}
+    for service, values in samples.items():
+        for pct in LATENCY_PERCENTILES:
+            value = percentile(values, pct)
+            if value is not None:
+                metrics[f'api_latency_p{pct}:{service}'] = value
+        metrics[f'api_calls:{service}'] = len(values)
+    return metrics
+
+
+def run_metrics_rollup(now=None):
+    """前回からの期間を集計して SystemMetrics に書き込み、書き込んだ件数を返す"""
+    now = now or datetime.utcnow()
+    period_start = now - timedelta(minutes=METRICS_ROLLUP_MINUTES)
+
+    metrics = {}
+    metrics.update(compute_snapshot_metrics(now))
+    metrics.update(compute_period_metrics(period_start, now))
+    metrics.update(compute_latency_metrics(drain_samples()))
+    metrics.update(interval_metrics(drain_interval()))
+    metrics.update(usage_metrics(usage_store.drain()))
+
+    for metric_type, value in metrics.items():
+        if value is None:
+            continue
+        db.session.add(SystemMetrics(metric_type=metric_type[:METRIC_TYPE_LENGTH], metric_value=float(value),
+                                     period_start=period_start, period_end=now, created_at=now))
+    SystemMetrics.query.filter(
+        SystemMetrics.created_at < now - timedelta(days=METRICS_RETENTION_DAYS)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return len(metrics)
+
+
+def latest_metrics(metric_types):
+    """metric_type ごとの最新の集計行を返す（無いものは含まない）"""
+    latest = {}
+    for metric_type in metric_types:
+        row = SystemMetrics.query.filter_by(metric_type=metric_type).order_by(
+            SystemMetrics.created_at.desc()).first()
+        if row is not None:
+            latest[metric_type] = row
+    return latest
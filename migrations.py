@@ -0,0 +1,253 @@
+"""
+Versioned schema migrations
+
+デプロイ時に一度だけ `python migrations.py`（または `flask --app app db-upgrade`）で適用する。
+ワーカー起動時は schema_version を1回読むだけで、バージョンが一致していれば
+スキーマのイントロスペクションは行わない。
+
+新しいマイグレーションは MIGRATIONS の末尾に (番号, 名前, 関数) を追加する。
+既存DBがバージョン管理導入前の状態でも動くよう、各マイグレーションは冪等に書くこと。
+"""
+
+import os
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from models import db, SchemaVersion
+
+
+def _has_column(table_name, column_name):
+    """テーブルに列が存在するかチェック"""
+    inspector = inspect(db.engine)
+    if not inspector.has_table(table_name):
+        return False
+    return column_name in [col['name'] for col in inspector.get_columns(table_name)]
+
+
+def _add_column(table_name, column_name, ddl):
+    """列が無い場合のみ ALTER TABLE で追加（PostgreSQL/SQLite両対応）"""
+    if not inspect(db.engine).has_table(table_name) or _has_column(table_name, column_name):
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}'))
+
+
+def _create_index(index_name, table_name, columns, unique=False):
+    """インデックスが無い場合のみ作成"""
+    if not inspect(db.engine).has_table(table_name):
+        return
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    with db.engine.begin() as conn:
+        conn.execute(text(f'CREATE {kind} IF NOT EXISTS {index_name} ON {table_name} ({", ".join(columns)})'))
+
+
+def _create_tables(*models):
+    """モデルのテーブルが無い場合のみ作成"""
+    for model in models:
+        model.__table__.create(bind=db.engine, checkfirst=True)
+
+
+# --- マイグレーション定義 ---
+
+def _0001_grammar_quiz_log_model_answer():
+    """GrammarQuizLogにmodel_answer列を追加"""
+    _add_column('grammar_quiz_log', 'model_answer', 'TEXT')
+
+
+def _0002_flashcard_selection_indexes():
+    """フラッシュカード出題クエリ用のインデックスを追加"""
+    _create_index('ix_flashcard_progress_user_word', 'flashcard_progress', ['user_id', 'word_id'])
+    _create_index('ix_vocab_master_jlpt_level', 'vocab_master', ['jlpt_level'])
+
+
+def _0003_flashcard_scheduler_state():
+    """FlashcardProgressにスケジューラの状態列を追加し、既存の進捗を変換"""
+    _add_column('flashcard_progress', 'stability', 'FLOAT')
+    _add_column('flashcard_progress', 'difficulty', 'FLOAT')
+    _add_column('flashcard_progress', 'last_interval', 'FLOAT')
+    _add_column('flashcard_progress', 'last_review', 'TIMESTAMP')
+    _add_column('flashcard_progress', 'lapses', 'INTEGER DEFAULT 0')
+
+    from utils.spaced_repetition import reschedule_legacy_progress
+    converted = reschedule_legacy_progress()
+    print(f"Initialized scheduler state for {converted} flashcard progress rows")
+
+
+def _0004_log_partitioning_and_retention():
+    """ログテーブルのパーティション化（PostgreSQL）と日次集計テーブル・created_atインデックスを追加"""
+    from models import LogDailyAggregate
+    from log_retention import LOG_TABLES, convert_to_partitioned
+
+    _create_tables(LogDailyAggregate)
+    for model in LOG_TABLES:
+        convert_to_partitioned(model)
+        _create_index(f'ix_{model.__tablename__}_created_at', model.__tablename__, ['created_at'])
+
+
+def _0005_keyset_pagination_indexes():
+    """一覧画面のキーセットページネーション用に (created_at, id) のインデックスを追加"""
+    _create_index('ix_users_created_at_id', 'users', ['created_at', 'id'])
+    _create_index('ix_feedback_created_at_id', 'feedback', ['created_at', 'id'])
+    _create_index('ix_grammar_quiz_log_user_created_at', 'grammar_quiz_log', ['user_id', 'created_at', 'id'])
+
+
+def _0006_system_metrics_index():
+    """SystemMetricsの集計行を metric_type と作成日時で引くためのインデックスを追加"""
+    _create_index('ix_system_metrics_type_created_at', 'system_metrics', ['metric_type', 'created_at'])
+
+
+def _0007_widen_system_metrics_type():
+    """エンドポイント名入りの metric_type を保存できるよう列を広げる（SQLiteは長さを検査しない）"""
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE system_metrics ALTER COLUMN metric_type TYPE VARCHAR(120)'))
+
+
+def _0008_system_error_occurrences():
+    """同一エラーの集約件数を保存する occurrences 列を追加"""
+    _add_column('system_error_logs', 'occurrences', 'INTEGER DEFAULT 1')
+
+
+def _0009_rate_limit_counters():
+    """ワーカー間で共有するレート制限のカウンターテーブルを追加"""
+    from models import RateLimitCounter
+    _create_tables(RateLimitCounter)
+
+
+def _0010_blog_interactions():
+    """コメントを記事ごとに引くインデックスと、お気に入り数の集計テーブルを追加"""
+    from models import BlogPostStats
+    _create_index('ix_blog_comments_document_created_at', 'blog_comments', ['document_id', 'created_at'])
+    _create_index('ix_blog_favorites_document', 'blog_favorites', ['document_id'])
+    _create_tables(BlogPostStats)
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'INSERT INTO blog_post_stats (document_id, favorite_count) '
+            'SELECT document_id, COUNT(*) FROM blog_favorites '
+            'WHERE document_id NOT IN (SELECT document_id FROM blog_post_stats) '
+            'GROUP BY document_id'))
+
+
+def _0011_flashcard_progress_unique():
+    """flashcard_progress の (user_id, word_id) を一意にする
+
+    同時に作られた重複行は、新しく作られた方（idが大きい方）を残して削除する。
+    """
+    if not inspect(db.engine).has_table('flashcard_progress'):
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'DELETE FROM flashcard_progress WHERE id NOT IN '
+            '(SELECT MAX(id) FROM flashcard_progress GROUP BY user_id, word_id)'))
+        # 0002 の非ユニークなインデックスを同名のユニークインデックスに置き換える
+        conn.execute(text('DROP INDEX IF EXISTS ix_flashcard_progress_user_word'))
+    _create_index('ix_flashcard_progress_user_word', 'flashcard_progress', ['user_id', 'word_id'], unique=True)
+
+
+MIGRATIONS = [
+    (1, 'grammar_quiz_log.model_answer', _0001_grammar_quiz_log_model_answer),
+    (2, 'flashcard selection indexes', _0002_flashcard_selection_indexes),
+    (3, 'flashcard scheduler state', _0003_flashcard_scheduler_state),
+    (4, 'log partitioning and retention', _0004_log_partitioning_and_retention),
+    (5, 'keyset pagination indexes', _0005_keyset_pagination_indexes),
+    (6, 'system metrics index', _0006_system_metrics_index),
+    (7, 'widen system_metrics.metric_type', _0007_widen_system_metrics_type),
+    (8, 'system_error_logs.occurrences', _0008_system_error_occurrences),
+    (9, 'rate limit counters', _0009_rate_limit_counters),
+    (10, 'blog comment index and favorite counts', _0010_blog_interactions),
+    (11, 'unique flashcard progress per user and word', _0011_flashcard_progress_unique),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_current_version():
+    """記録済みのスキーマバージョンを返す（未記録ならNone）"""
+    try:
+        row = SchemaVersion.query.order_by(SchemaVersion.id.desc()).first()
+        return row.version if row else None
+    except (OperationalError, ProgrammingError):
+        # schema_versionテーブルがまだ存在しない
+        db.session.rollback()
+        return None
+
+
+def _stamp(version):
+    """スキーマバージョンを記録"""
+    row = SchemaVersion.query.order_by(SchemaVersion.id.desc()).first()
+    if row is None:
+        row = SchemaVersion(version=version)
+        db.session.add(row)
+    else:
+        row.version = version
+        row.applied_at = datetime.utcnow()
+    db.session.commit()
+
+
+def upgrade():
+    """未適用のマイグレーションを順番に適用し、適用後のバージョンを返す"""
+    current = get_current_version()
+
+    if current is None:
+        # 新規DB・バージョン管理導入前の既存DBとも、現行モデルでテーブルを作成してから
+        # 全マイグレーションを冪等に適用する（パーティション化など create_all で表せない変更のため）
+        db.create_all()
+        current = 0
+
+    for version, name, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"Applying migration {version:04d}: {name}")
+        migrate()
+        _stamp(version)
+        current = version
+
+    return current
+
+
+def ensure_schema():
+    """起動時チェック：バージョンが一致していれば何もしない
+
+    デプロイ時のマイグレーションが実行されていない環境（ローカル開発等）のみ
+    ここで upgrade() を行う。
+    """
+    if get_current_version() == LATEST_VERSION:
+        return False
+    upgrade()
+    return True
+
+
+def database_uri():
+    """DATABASE_URL（Railway の PostgreSQL）が無ければ data/app.db の SQLite を使う"""
+    database_url = os.getenv('DATABASE_URL')
+    if database_url:
+        return database_url
+    db_dir = os.path.join(os.getcwd(), 'data')
+    os.makedirs(db_dir, exist_ok=True)
+    return f'sqlite:///{db_dir}/app.db'
+
+
+def create_migration_app():
+    """DB接続だけを設定したアプリ
+
+    app.py を import するとスキーマチェックやスケジューラ・バックグラウンドの
+    書き込みスレッドまで動くため、デプロイ時のマイグレーションではこちらを使う。
+    """
+    from flask import Flask
+    migration_app = Flask(__name__)
+    migration_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    migration_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(migration_app)
+    return migration_app
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    app = create_migration_app()
+
+    with app.app_context():
+        version = upgrade()
+        print(f"Schema is at version {version}")
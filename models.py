@@ -27,6 +27,9 @@ class User(UserMixin, db.Model):
     language = db.Column(db.String(10), default='en')
     font_family = db.Column(db.String(20), default='dotgothic')  # 'dotgothic' or 'klee'
     
+    # 管理画面のキーセットページネーション用
+    __table_args__ = (db.Index('ix_users_created_at_id', 'created_at', 'id'),)
+    
     def set_password(self, password):
         if password:
             self.password_hash = generate_password_hash(password)
@@ -51,7 +54,7 @@ class VocabMaster(db.Model):
     word = db.Column(db.String(100), nullable=False)
     meaning = db.Column(db.String(200), nullable=False)
     type = db.Column(db.String(50), nullable=False)
-    jlpt_level = db.Column(db.String(10), nullable=False)  # N5, N4, N3, N2, N1
+    jlpt_level = db.Column(db.String(10), nullable=False, index=True)  # N5, N4, N3, N2, N1
     
     def __repr__(self):
         return f'<VocabMaster {self.kanji} ({self.jlpt_level})>'
@@ -68,10 +71,20 @@ class FlashcardProgress(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     next_review = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # 間隔反復スケジューラの状態（utils/spaced_repetition.py）
+    stability = db.Column(db.Float, nullable=True)      # 記憶の安定度（日）
+    difficulty = db.Column(db.Float, nullable=True)     # 難易度（SM-2ではease factor）
+    last_interval = db.Column(db.Float, nullable=True)  # 前回設定した間隔（日）
+    last_review = db.Column(db.DateTime, nullable=True)
+    lapses = db.Column(db.Integer, default=0)           # 「覚えていない」の回数
+    
     # リレーションシップ
     user = db.relationship('User', backref='flashcard_progress')
     vocab = db.relationship('VocabMaster', backref='flashcard_progress')
     
+    # 学習セッション開始時のLEFT JOIN用。回答の一括反映で行を重複させないよう一意にする
+    __table_args__ = (db.Index('ix_flashcard_progress_user_word', 'user_id', 'word_id', unique=True),)
+    
     def __repr__(self):
         return f'<FlashcardProgress {self.user_id}:{self.word_id} ({self.status})>'
 
@@ -91,6 +104,9 @@ class Feedback(db.Model):
     # リレーションシップ
     user = db.relationship('User', backref='feedback')
     
+    # 管理画面のキーセットページネーション用
+    __table_args__ = (db.Index('ix_feedback_created_at_id', 'created_at', 'id'),)
+    
     def __repr__(self):
         return f'<Feedback {self.name}: {self.message[:50]}...>'
 
@@ -124,11 +140,14 @@ class GrammarQuizLog(db.Model):
     score = db.Column(db.Float, nullable=True)              # 採点結果（0-100）
     feedback = db.Column(db.Text, nullable=True)            # AIからのフィードバック
     model_answer = db.Column(db.Text, nullable=True)        # GPT生成のModel answer (JSON string)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # リレーションシップ
     user = db.relationship('User', backref='grammar_quiz_logs')
     
+    # ユーザーごとのログ一覧（キーセットページネーション）用
+    __table_args__ = (db.Index('ix_grammar_quiz_log_user_created_at', 'user_id', 'created_at', 'id'),)
+    
     def __repr__(self):
         return f'<GrammarQuizLog {self.user_id}:{self.jlpt_level} ({self.score})>'
 
@@ -140,7 +159,7 @@ class FlashcardLog(db.Model):
     word_id = db.Column(db.Integer, db.ForeignKey('vocab_master.id'), nullable=False)
     jlpt_level = db.Column(db.String(10), nullable=False)
     result = db.Column(db.String(20), nullable=False)       # 'learned' or 'not_learned'
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # リレーションシップ
     user = db.relationship('User', backref='flashcard_logs')
@@ -221,8 +240,9 @@ class SystemErrorLog(db.Model):
     user_ip = db.Column(db.String(45), nullable=True)  # IPv6 support
     user_agent = db.Column(db.String(255), nullable=True)
     request_path = db.Column(db.String(255), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     resolved = db.Column(db.Boolean, default=False)
+    occurrences = db.Column(db.Integer, default=1)  # 集約された同一エラーの件数
     
     # リレーション
     user = db.relationship('User', backref='error_logs', lazy=True)
@@ -234,11 +254,59 @@ class SystemMetrics(db.Model):
     __tablename__ = 'system_metrics'
     
     id = db.Column(db.Integer, primary_key=True)
-    metric_type = db.Column(db.String(50), nullable=False)  # 'api_requests', 'active_users', 'error_rate'
+    metric_type = db.Column(db.String(120), nullable=False)  # 'active_users_24h', 'error_rate', 'request_latency_p95:<endpoint>' など
     metric_value = db.Column(db.Float, nullable=False)
     period_start = db.Column(db.DateTime, nullable=False)
     period_end = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # metric_typeごとの最新値・期間指定の読み出し用
+    __table_args__ = (db.Index('ix_system_metrics_type_created_at', 'metric_type', 'created_at'),)
+    
+    def __repr__(self):
+        return f'<SystemMetrics {self.metric_type}:{self.metric_value} ({self.created_at})>'
+
+class LogDailyAggregate(db.Model):
+    __tablename__ = 'log_daily_aggregates'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(50), nullable=False)       # 集計元のログテーブル名
+    day = db.Column(db.Date, nullable=False)
+    dimensions = db.Column(db.String(255), nullable=False)  # 集計キー（JSON文字列）
+    count = db.Column(db.Integer, nullable=False, default=0)
+    value_sum = db.Column(db.Float, nullable=True)          # スコア等の合計（平均の算出用）
+    
+    __table_args__ = (db.UniqueConstraint('source', 'day', 'dimensions', name='log_daily_aggregate_unique'),)
+    
+    def __repr__(self):
+        return f'<LogDailyAggregate {self.source}:{self.day} ({self.count})>'
+
+class BlogPostStats(db.Model):
+    __tablename__ = 'blog_post_stats'
+    
+    document_id = db.Column(db.String(100), primary_key=True)  # Google Docs document ID
+    favorite_count = db.Column(db.Integer, nullable=False, default=0)  # お気に入りの切り替え時に更新する
+    
+    def __repr__(self):
+        return f'<BlogPostStats {self.document_id}: {self.favorite_count}>'
+
+class RateLimitCounter(db.Model):
+    __tablename__ = 'rate_limit_counters'
+    
+    bucket = db.Column(db.String(255), primary_key=True)       # '<機能>:user:<id>' / '<機能>:ip:<IP>'
+    window_index = db.Column(db.BigInteger, primary_key=True)  # UNIX秒 // 周期
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    expires_at = db.Column(db.Float, nullable=False)           # このUNIX秒を過ぎたら削除してよい
+    
+    def __repr__(self):
+        return f'<RateLimitCounter {self.bucket}@{self.window_index}: {self.hits}>'
+
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)  # 適用済みマイグレーションの最新番号
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
     def __repr__(self):
-        return f'<SystemMetrics {self.metric_type}:{self.metric_value} ({self.created_at})>'
\ No newline at end of file
+        return f'<SchemaVersion {self.version}>'
@@ -5,7 +5,11 @@ from flask_login import login_required, current_user
 from functools import wraps
 from models import db, SystemErrorLog, SystemMetrics, User, Feedback, GrammarQuizLog, FlashcardLog
 from datetime import datetime, timedelta
-from sqlalchemy import desc
+from sqlalchemy import desc, func
+from utils.pagination import keyset_paginate
+from metrics_rollup import DASHBOARD_METRICS, latest_metrics, run_metrics_rollup
+from utils.tracing import recent_traces
+from utils.llm_usage import PROMPT_SIZE_BUCKETS
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
 
@@ -23,31 +27,31 @@ def admin_required(f):
 @admin_bp.route("/")
 @admin_required
 def dashboard():
-    """管理者ダッシュボード"""
-    total_users = User.query.count()
-    total_feedback = Feedback.query.count()
-    unread_feedback = Feedback.query.filter_by(status='unread').count()
+    """管理者ダッシュボード（定期集計済みのSystemMetricsを表示）"""
+    metrics = latest_metrics(DASHBOARD_METRICS)
+    if not metrics:
+        # デプロイ直後でまだ集計ジョブが動いていない場合のみ、その場で集計する
+        run_metrics_rollup()
+        metrics = latest_metrics(DASHBOARD_METRICS)
+    values = {metric_type: int(row.metric_value) for metric_type, row in metrics.items()}
     recent_feedback = Feedback.query.order_by(Feedback.created_at.desc()).limit(10).all()
 
-    # ユーザー登録数の推移（最近7日間）
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_users = User.query.filter(User.created_at >= seven_days_ago).count()
-
     return render_template('admin_dashboard.html',
-                         total_users=total_users,
-                         total_feedback=total_feedback,
-                         unread_feedback=unread_feedback,
+                         total_users=values.get('total_users', 0),
+                         total_feedback=values.get('total_feedback', 0),
+                         unread_feedback=values.get('unread_feedback', 0),
                          recent_feedback=recent_feedback,
-                         recent_users=recent_users)
+                         recent_users=values.get('new_users_7d', 0),
+                         active_users=values.get('active_users_24h', 0),
+                         metrics_updated_at=max((row.created_at for row in metrics.values()), default=None))
 
 @admin_bp.route("/users")
 @admin_required
 def users():
     """ユーザー管理"""
-    page = request.args.get('page', 1, type=int)
-    users_list = User.query.order_by(User.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    users_list = keyset_paginate(User.query, User, per_page=20,
+                                 after=request.args.get('after'), before=request.args.get('before'),
+                                 with_total=True)
     return render_template('admin_users.html', users_list=users_list)
 
 @admin_bp.route('/user/<int:user_id>')
@@ -68,10 +72,8 @@ def user_detail(user_id):
 @admin_required
 def feedback():
     """フィードバック管理"""
-    page = request.args.get('page', 1, type=int)
-    feedback_list = Feedback.query.order_by(Feedback.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    feedback_list = keyset_paginate(Feedback.query, Feedback, per_page=20,
+                                    after=request.args.get('after'), before=request.args.get('before'))
     return render_template('admin_feedback.html', feedback_list=feedback_list)
 
 @admin_bp.route("/feedback/<int:feedback_id>/mark_read", methods=["POST"])
@@ -87,8 +89,6 @@ def mark_feedback_read(feedback_id):
 @admin_required
 def error_logs():
     """エラーログ一覧"""
-    page = request.args.get('page', 1, type=int)
-
     # フィルタ
     error_type = request.args.get('error_type', '')
     feature = request.args.get('feature', '')
@@ -104,9 +104,9 @@ def error_logs():
     elif resolved == 'false':
         query = query.filter(SystemErrorLog.resolved == False)
 
-    logs = query.order_by(desc(SystemErrorLog.created_at)).paginate(
-        page=page, per_page=50, error_out=False
-    )
+    logs = keyset_paginate(query, SystemErrorLog, per_page=50,
+                           after=request.args.get('after'), before=request.args.get('before'),
+                           with_total=not (error_type or feature or resolved))
 
     # フィルタオプション用のデータ
     error_types = [et[0] for et in db.session.query(SystemErrorLog.error_type).distinct().all() if et[0]]
@@ -157,12 +157,82 @@ def system_metrics():
     return render_template('admin/system_metrics.html',
                          metrics_by_type=metrics_by_type)
 
+@admin_bp.route("/llm-usage")
+@admin_required
+def llm_usage():
+    """LLMのトークン使用量とコスト（定期集計済みのSystemMetricsを表示）"""
+    days = request.args.get('days', 7, type=int)
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.query(SystemMetrics.metric_type, func.sum(SystemMetrics.metric_value)).filter(
+        SystemMetrics.metric_type.like('llm\\_%', escape='\\'),
+        SystemMetrics.created_at >= since
+    ).group_by(SystemMetrics.metric_type).all()
+
+    # 'llm_input_tokens:grammar' -> totals['input_tokens']['grammar']
+    totals = {}
+    for metric_type, value in rows:
+        name, _, key = metric_type[len('llm_'):].partition(':')
+        totals.setdefault(name, {})[key] = value or 0
+
+    features = []
+    # 拒否だけの機能（ブレーカーが開いたままなど）も表示する
+    calls_by_feature = dict.fromkeys(totals.get('rejected', {}), 0)
+    calls_by_feature.update(totals.get('calls', {}))
+    for feature, calls in sorted(calls_by_feature.items(), key=lambda item: -item[1]):
+        input_tokens = totals.get('input_tokens', {}).get(feature, 0)
+        output_tokens = totals.get('output_tokens', {}).get(feature, 0)
+        features.append({
+            'feature': feature,
+            'calls': int(calls),
+            'errors': int(totals.get('errors', {}).get(feature, 0)),
+            'rejected': int(totals.get('rejected', {}).get(feature, 0)),
+            'input_tokens': int(input_tokens),
+            'output_tokens': int(output_tokens),
+            'tokens_per_call': (input_tokens + output_tokens) / calls if calls else 0,
+            'cost': totals.get('cost_usd', {}).get(feature, 0),
+            'avg_seconds': totals.get('seconds', {}).get(feature, 0) / calls if calls else 0,
+        })
+
+    routes = []
+    for route, tokens in sorted(totals.get('route_tokens', {}).items(), key=lambda item: -item[1]):
+        requests_count = totals.get('requests', {}).get(route, 0)
+        routes.append({
+            'route': route,
+            'requests': int(requests_count),
+            'tokens': int(tokens),
+            'tokens_per_request': tokens / requests_count if requests_count else None,
+        })
+
+    prompt_sizes = []
+    for label in [f'<{bound}' for bound in PROMPT_SIZE_BUCKETS] + [f'{PROMPT_SIZE_BUCKETS[-1]}+']:
+        calls = totals.get('prompt_calls', {}).get(label, 0)
+        if calls:
+            prompt_sizes.append({'label': label, 'calls': int(calls),
+                                 'avg_seconds': totals.get('prompt_seconds', {}).get(label, 0) / calls})
+
+    return render_template('admin/llm_usage.html',
+                         days=days,
+                         features=features,
+                         routes=routes,
+                         prompt_sizes=prompt_sizes,
+                         total_cost=sum(feature['cost'] for feature in features))
+
+@admin_bp.route("/traces")
+@admin_required
+def traces():
+    """直近のリクエストと外部API呼び出しのトレース"""
+    only_outbound = request.args.get('outbound', 'true') == 'true'
+    recent = recent_traces(limit=200)
+    if only_outbound:
+        recent = [trace for trace in recent if trace.children]
+    return render_template('admin/traces.html',
+                         traces=recent[:50],
+                         only_outbound=only_outbound)
+
 @admin_bp.route("/grammar-logs")
 @admin_required
 def grammar_logs():
     """Grammar Quiz ログ管理"""
-    page = request.args.get('page', 1, type=int)
-
     # フィルタ
     user_id = request.args.get('user_id', '', type=str)
     jlpt_level = request.args.get('jlpt_level', '')
@@ -176,9 +246,9 @@ def grammar_logs():
     if direction:
         query = query.filter(GrammarQuizLog.direction == direction)
 
-    logs = query.order_by(desc(GrammarQuizLog.created_at)).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    logs = keyset_paginate(query, GrammarQuizLog, per_page=20,
+                           after=request.args.get('after'), before=request.args.get('before'),
+                           with_total=not (user_id.isdigit() or jlpt_level or direction))
 
     # ログのmodel_answerをJSONからリストに変換
     for log in logs.items:
@@ -3,7 +3,8 @@ import pandas as pd
 from flask import Blueprint, render_template, request, session, redirect, url_for
 import re
 from dotenv import load_dotenv
-from claude_helper import ask_claude
+from claude_helper import ask_claude, LLM_UNAVAILABLE_ERRORS
+from error_handler import get_localized_error_message
 
 load_dotenv()
 
@@ -372,6 +373,18 @@ def akinator_game():
         history = []
         session['akinator_history'] = history
 
+    try:
+        return play_turn(role, level, history)
+    except LLM_UNAVAILABLE_ERRORS as e:
+        # API障害・混雑中は待たずに一時停止のメッセージを表示
+        print(f"Akinator reply skipped: {e}")
+        history.append({'role': 'gpt', 'text': get_localized_error_message("feature_temporarily_disabled")})
+        session['akinator_history'] = history
+        return render_game(history, show_word=role != 'gpt')
+
+
+def play_turn(role, level, history):
+    """1回分の入力を処理してゲーム画面を返す（Claudeが使えなければ LLM_UNAVAILABLE_ERRORS を送出）"""
     # ChatGPTがアキネーターモード
     if role == 'gpt':
         if request.method == 'GET' and not history:
@@ -1,7 +1,14 @@
-from flask import Blueprint, render_template, request, abort, jsonify, redirect, url_for, flash
+import hashlib
+
+from flask import Blueprint, Response, render_template, request, abort, jsonify, redirect, url_for, flash, make_response, session
 from flask_login import current_user, login_required
-from google_drive_helper import get_blog_documents, get_document_content, search_blog_posts
+from google_drive_helper import get_blog_documents
+from blog_search import search_posts
 from models import db, BlogComment, BlogFavorite
+from blog_interactions import interactions_cache, add_favorite_count
+from blog_metadata import metadata_index
+from blog_publish import published_post, published_index, FRAGMENT_MAX_AGE
+from translations import TRANSLATIONS, get_user_language, get_user_font
 
 blog_bp = Blueprint('blog', __name__, url_prefix='/blog')
 
@@ -46,17 +53,13 @@ def blog_index():
     tag_filter = request.args.get('tag', '')
     
     if search_query:
-        blog_posts = search_blog_posts(search_query)
+        # 全文検索インデックスから関連度順に（Docs APIは呼ばない）
+        blog_posts = search_posts(search_query)
     else:
         blog_posts = get_blog_documents()
     
-    # 各記事にタグ情報を追加
-    for post in blog_posts:
-        doc_content = get_document_content(post['id'])
-        if doc_content:
-            post['tags'] = doc_content.get('tags', [])
-        else:
-            post['tags'] = []
+    # 各記事にタグ情報を追加（メタデータインデックスから。Docs APIは呼ばない）
+    blog_posts = metadata_index.annotate(blog_posts)
     
     # タグでフィルタリング
     if tag_filter:
@@ -68,26 +71,55 @@ def blog_index():
         all_tags.update(post.get('tags', []))
     all_tags = sorted(list(all_tags))
     
+    # 絞り込みの無い一覧は公開済みのフラグメントを使う
+    post_list_html = None
+    if not search_query and not tag_filter and blog_posts:
+        fragment = published_index(get_user_language())
+        post_list_html = fragment.html if fragment else None
+    
     return render_template('blog_index.html', 
                          blog_posts=blog_posts, 
                          search_query=search_query,
                          tag_filter=tag_filter,
-                         all_tags=all_tags)
+                         all_tags=all_tags,
+                         post_list_html=post_list_html)
+
+def page_etag(fragment):
+    """記事ページのETag（本文・ログインユーザー・言語・フォントが同じなら同じ値）"""
+    if current_user.is_authenticated:
+        viewer = f'{current_user.id}:{current_user.username}:{current_user.is_admin}:{current_user.auth_type}'
+    else:
+        viewer = 'anonymous'
+    key = f'{fragment.etag}|{viewer}|{get_user_language()}|{get_user_font()}'
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
 
 @blog_bp.route('/post/<document_id>')
 def blog_post(document_id):
-    """個別ブログ記事ページ"""
-    document_content = get_document_content(document_id)
+    """個別ブログ記事ページ（公開済みの本文を埋め込むだけで、Docs APIは呼ばない）"""
+    fragment = published_post(document_id)
     
-    if not document_content:
+    if not fragment:
         abort(404)
     
-    # コメントを取得（返信の階層構造も含む）
-    comments = BlogComment.query.filter_by(
-        document_id=document_id, 
-        parent_comment_id=None,
-        is_deleted=False
-    ).order_by(BlogComment.created_at.desc()).all()
+    # 本文と表示条件が前回と同じならテンプレートを描画せずに304を返す
+    # （フラッシュメッセージがあるときはページに表示するので描画する）
+    etag = page_etag(fragment)
+    if '_flashes' not in session and request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template('blog_post.html',
+                                                 document_id=document_id,
+                                                 title=fragment.title,
+                                                 article_html=fragment.html))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@blog_bp.route('/post/<document_id>/interactions')
+def post_interactions(document_id):
+    """記事のコメント・お気に入り（ログイン状態で変わる部分だけを返す）"""
+    # コメントツリーとお気に入り総数（記事ごとにキャッシュ済み）
+    interactions = interactions_cache.get(document_id)
     
     # お気に入り状態を確認
     is_favorited = False
@@ -98,17 +130,34 @@ def blog_post(document_id):
         ).first()
         is_favorited = bool(favorite)
     
-    # お気に入り総数
-    favorite_count = BlogFavorite.query.filter_by(document_id=document_id).count()
-    
-    return render_template('blog_post.html', 
-                         document_id=document_id,
-                         title=document_content['title'],
-                         content=document_content['content'],
-                         tags=document_content.get('tags', []),
-                         comments=comments,
-                         is_favorited=is_favorited,
-                         favorite_count=favorite_count)
+    response = make_response(render_template('blog/_interactions.html',
+                                             document_id=document_id,
+                                             comments=interactions.comments,
+                                             is_favorited=is_favorited,
+                                             favorite_count=interactions.favorite_count))
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+def _fragment_response(fragment):
+    """公開済みフラグメントを強いETagとCache-Control付きで返す"""
+    if not fragment:
+        abort(404)
+    response = Response(fragment.html, mimetype='text/html')
+    response.set_etag(fragment.etag)
+    response.headers['Cache-Control'] = f'public, max-age={FRAGMENT_MAX_AGE}'
+    return response.make_conditional(request)
+
+@blog_bp.route('/fragments/post/<document_id>.html')
+def post_fragment(document_id):
+    """記事本文のフラグメント"""
+    return _fragment_response(published_post(document_id))
+
+@blog_bp.route('/fragments/index/<language>.html')
+def index_fragment(language):
+    """記事一覧（絞り込み無し）のフラグメント"""
+    if language not in TRANSLATIONS:
+        abort(404)
+    return _fragment_response(published_index(language))
 
 @blog_bp.route('/post/<document_id>/comment', methods=['POST'])
 @login_required
@@ -134,6 +183,7 @@ def add_comment(document_id):
     
     db.session.add(comment)
     db.session.commit()
+    interactions_cache.invalidate(document_id)
     
     flash('コメントを投稿しました', 'success')
     return redirect(url_for('blog.blog_post', document_id=document_id))
@@ -150,6 +200,7 @@ def toggle_favorite(document_id):
     if favorite:
         # お気に入り削除
         db.session.delete(favorite)
+        add_favorite_count(document_id, -1)
         is_favorited = False
         message = 'お気に入りを解除しました'
     else:
@@ -159,13 +210,15 @@ def toggle_favorite(document_id):
             document_id=document_id
         )
         db.session.add(favorite)
+        add_favorite_count(document_id, 1)
         is_favorited = True
         message = 'お気に入りに追加しました'
     
     db.session.commit()
+    interactions_cache.invalidate(document_id)
     
     # お気に入り総数を取得
-    favorite_count = BlogFavorite.query.filter_by(document_id=document_id).count()
+    favorite_count = interactions_cache.get(document_id).favorite_count
     
     if request.is_json:
         return jsonify({
@@ -1,13 +1,25 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
 from flask_login import current_user
 from models import db, VocabMaster, FlashcardProgress, FlashcardLog
+from sqlalchemy import and_, or_, case, func
+from utils.spaced_repetition import get_scheduler, WELL_LEARNED_INTERVAL_DAYS
+from utils.buffered_writer import BufferedInsertWriter
 import pandas as pd
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 
 flashcard_bp = Blueprint('flashcard', __name__, url_prefix='/flashcard')
 
+# FlashcardLogの書き込みはバッファ経由（app.pyでinit_appする）
+flashcard_log_writer = BufferedInsertWriter(
+    FlashcardLog, spill_path=os.getenv('FLASHCARD_LOG_SPILL_PATH'))
+
+def is_google_user():
+    """ログイン中のユーザーがGoogle OAuthユーザーかどうか"""
+    return (hasattr(current_user, 'auth_type') and current_user.auth_type == 'google') or \
+        bool(hasattr(current_user, 'google_id') and current_user.google_id)
+
 def google_login_required(f):
     """Googleログインが必要な機能用デコレーター"""
     @wraps(f)
@@ -16,17 +28,27 @@ def google_login_required(f):
             flash('フラッシュカード機能を利用するにはGoogleログインが必要です。', 'warning')
             return redirect(url_for('login'))
         
-        # Google OAuthユーザーかチェック
-        is_google_user = (hasattr(current_user, 'auth_type') and current_user.auth_type == 'google') or \
-                        (hasattr(current_user, 'google_id') and current_user.google_id)
-        
-        if not is_google_user:
+        if not is_google_user():
             flash('フラッシュカード機能はGoogleログイン限定です。', 'warning')
             return redirect(url_for('login'))
         
         return f(*args, **kwargs)
     return decorated_function
 
+def google_login_required_api(f):
+    """fetchから呼ばれるAPI用：リダイレクトせず、未ログインは401・Google以外は403のJSONを返す
+
+    リダイレクト先のログイン画面はfetchでは200になり、送信成功と区別できないため。
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({'success': False, 'error': 'login required'}), 401
+        if not is_google_user():
+            return jsonify({'success': False, 'error': 'google login required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
 def load_vocab_data():
     """Excelファイルから語彙データを読み込んでデータベースに保存"""
     excel_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'JLPT vocabulary.xlsx')
@@ -74,18 +96,158 @@ def load_vocab_data():
         print(f"Error loading vocab data: {e}")
         return False
 
-def get_next_review_date(study_count):
-    """忘却曲線に基づいて次回復習日を計算"""
-    if study_count == 0:
-        return datetime.utcnow() + timedelta(days=1)
-    elif study_count == 1:
-        return datetime.utcnow() + timedelta(days=3)
-    elif study_count == 2:
-        return datetime.utcnow() + timedelta(days=7)
-    elif study_count == 3:
-        return datetime.utcnow() + timedelta(days=14)
-    else:
-        return datetime.utcnow() + timedelta(days=30)
+# 一括回答APIで1リクエストに受け付ける最大件数
+MAX_ANSWER_BATCH = 200
+
+def apply_flashcard_answers(user_id, answers):
+    """回答イベント（word_id, result, answered_at）をまとめて1トランザクションで反映
+
+    無い進捗行は INSERT ... ON CONFLICT DO NOTHING でまとめて作り、(user_id, word_id) の
+    一意インデックスで別タブや重なったバッチとの重複を防ぐ。その後、行ロックを取って読み直す。
+    answered_at が進捗の updated_at 以前の回答は反映済み（応答が届かずに再送されたバッチ等）
+    として無視する。FlashcardLogはコミット後にflashcard_log_writerへ渡す。反映した件数を返す。
+    """
+    if not answers:
+        return 0
+    
+    answers = sorted(answers, key=lambda a: a['answered_at'])
+    word_ids = {a['word_id'] for a in answers}
+    
+    levels = dict(db.session.query(VocabMaster.id, VocabMaster.jlpt_level)
+                  .filter(VocabMaster.id.in_(word_ids)).all())
+    if not levels:
+        return 0
+    
+    existing = {word_id for (word_id,) in db.session.query(FlashcardProgress.word_id).filter(
+        FlashcardProgress.user_id == user_id,
+        FlashcardProgress.word_id.in_(levels)
+    ).all()}
+    missing = [word_id for word_id in levels if word_id not in existing]
+    if missing:
+        table = FlashcardProgress.__table__
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        # updated_at / next_review は空で作り、最初の回答で設定する
+        db.session.execute(insert(table).values([
+            {'user_id': user_id, 'word_id': word_id, 'jlpt_level': levels[word_id], 'status': 'pending',
+             'study_count': 0, 'lapses': 0, 'updated_at': None, 'next_review': None}
+            for word_id in missing
+        ]).on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.word_id]))
+    
+    # 同じ単語を更新する他のリクエストとは行ロックで直列化する（SQLiteでは無視される）
+    progress_by_word = {p.word_id: p for p in FlashcardProgress.query.filter(
+        FlashcardProgress.user_id == user_id,
+        FlashcardProgress.word_id.in_(levels)
+    ).with_for_update().populate_existing().all()}
+    
+    scheduler = get_scheduler()
+    log_rows = []
+    for answer in answers:
+        word_id = answer['word_id']
+        if word_id not in levels:
+            continue
+        answered_at = answer['answered_at']
+        result = answer['result']
+        
+        progress = progress_by_word[word_id]
+        if progress.updated_at is not None and answered_at <= progress.updated_at:
+            continue
+        
+        # 復習日が来ている場合のみスケジュールを更新
+        is_review_day = progress.next_review is None or progress.next_review.date() <= answered_at.date()
+        
+        progress.study_count = (progress.study_count or 0) + 1
+        progress.status = 'learned' if result == 'learned' else 'pending'
+        if is_review_day:
+            scheduler.review(progress, result, answered_at)
+        progress.updated_at = answered_at
+        
+        log_rows.append({
+            'user_id': user_id,
+            'word_id': word_id,
+            'jlpt_level': levels[word_id],
+            'result': result,
+            'created_at': answered_at
+        })
+    
+    db.session.commit()
+    # 分析用ログは回答のトランザクションから外し、バッファ経由でまとめて書き込む
+    flashcard_log_writer.add_many(log_rows)
+    return len(log_rows)
+
+def parse_answer_events(payload):
+    """一括回答APIのJSONを検証し、回答イベントのリストを返す（不正ならValueError）"""
+    events = payload.get('answers') if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        raise ValueError('answers must be a list')
+    if len(events) > MAX_ANSWER_BATCH:
+        raise ValueError(f'too many answers (max {MAX_ANSWER_BATCH})')
+    
+    now = datetime.utcnow()
+    answers = []
+    for event in events:
+        try:
+            word_id = int(event['word_id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('word_id is required')
+        result = event.get('result')
+        if result not in ('learned', 'not_learned'):
+            raise ValueError('result must be learned or not_learned')
+        
+        answered_at = now
+        if event.get('answered_at'):
+            try:
+                answered_at = datetime.fromisoformat(str(event['answered_at']).replace('Z', '+00:00'))
+            except ValueError:
+                raise ValueError('answered_at must be an ISO 8601 timestamp')
+            if answered_at.tzinfo is not None:
+                answered_at = answered_at.astimezone(timezone.utc).replace(tzinfo=None)
+            # クライアントの時計ずれで未来の時刻にならないようにする
+            answered_at = min(answered_at, now)
+        
+        answers.append({'word_id': word_id, 'result': result, 'answered_at': answered_at})
+    return answers
+
+def select_study_words(user_id, jlpt_level, card_count, order='random'):
+    """復習対象（期限切れ）を優先し、不足分を未学習の単語で埋めて返す
+
+    ユーザーの進捗をLEFT JOINし、進捗が無い（progress.id IS NULL）単語と
+    まだ「覚えた」になっていない単語を新規カードとして扱う。
+    orderは新規カードの並び順：'random' または 'list'（単語リスト順）。
+    """
+    now = datetime.utcnow()
+    is_due = and_(FlashcardProgress.id.isnot(None), FlashcardProgress.next_review <= now)
+    is_new = or_(FlashcardProgress.id.is_(None), FlashcardProgress.status != 'learned')
+    
+    new_card_order = VocabMaster.id if order == 'list' else func.random()
+    
+    return VocabMaster.query.outerjoin(
+        FlashcardProgress,
+        and_(FlashcardProgress.word_id == VocabMaster.id,
+             FlashcardProgress.user_id == user_id)
+    ).filter(
+        VocabMaster.jlpt_level == jlpt_level,
+        or_(is_due, is_new)
+    ).order_by(
+        case((is_due, 0), else_=1),
+        new_card_order
+    ).limit(card_count).all()
+
+def build_deck(words):
+    """学習セッションのカード一式をページ埋め込み用のdictリストにする"""
+    return [
+        {'id': w.id, 'kanji': w.kanji, 'word': w.word, 'meaning': w.meaning, 'type': w.type}
+        for w in words
+    ]
+
+def count_well_learned(user_id):
+    """前回「覚えた」と答えて復習間隔が十分に延びた単語数（回答回数ではなく記憶の定着度で数える）"""
+    return FlashcardProgress.query.filter(
+        FlashcardProgress.user_id == user_id,
+        FlashcardProgress.last_interval >= WELL_LEARNED_INTERVAL_DAYS
+    ).count()
 
 @flashcard_bp.route('/')
 @google_login_required
@@ -110,8 +272,8 @@ def flashcard_index():
         level_learned = user_progress.join(VocabMaster).filter(VocabMaster.jlpt_level == level).count()
         level_stats[level] = level_learned
     
-    # 習熟度別統計（study_count >= 3を「覚えた」とする）
-    well_learned = user_progress.filter(FlashcardProgress.study_count >= 3).count()
+    # 習熟度別統計（スケジューラの間隔が WELL_LEARNED_INTERVAL_DAYS 以上を「覚えた」とする）
+    well_learned = count_well_learned(current_user.id)
     
     return render_template("flashcard_setup.html", 
                          review_count=review_count,
@@ -128,37 +290,10 @@ def study():
         jlpt_level = request.args.get('level', 'N5')
         card_count = int(request.args.get('count', 10))
         front_mode = request.args.get('front_mode', 'kanji')  # 'kanji' or 'meaning'
+        order = request.args.get('order', 'random')  # 'random' or 'list'
         
-        # 復習対象の単語を優先的に取得
-        review_progress = FlashcardProgress.query.filter(
-            FlashcardProgress.user_id == current_user.id,
-            FlashcardProgress.next_review <= datetime.utcnow(),
-            FlashcardProgress.jlpt_level == jlpt_level
-        ).limit(card_count).all()
-        
-        # 復習対象の単語IDを取得
-        review_word_ids = [p.word_id for p in review_progress]
-        review_words = VocabMaster.query.filter(VocabMaster.id.in_(review_word_ids)).all() if review_word_ids else []
-        
-        # 復習対象が不足する場合は未学習単語を追加
-        remaining_count = card_count - len(review_words)
-        if remaining_count > 0:
-            # 既に学習済みの単語IDを取得
-            learned_word_ids = [p.word_id for p in FlashcardProgress.query.filter(
-                FlashcardProgress.user_id == current_user.id,
-                FlashcardProgress.status == 'learned'
-            ).all()]
-            
-            # 未学習の単語を取得（学習済みでない単語）
-            new_words = VocabMaster.query.filter(
-                VocabMaster.jlpt_level == jlpt_level,
-                ~VocabMaster.id.in_(learned_word_ids)
-            ).limit(remaining_count).all()
-            
-            # 復習対象と新規単語を組み合わせ
-            all_words = review_words + new_words
-        else:
-            all_words = review_words
+        # 復習対象と未学習の単語を1クエリで取得
+        all_words = select_study_words(current_user.id, jlpt_level, card_count, order)
         
         # セッションに学習情報を保存
         session['study_info'] = {
@@ -170,8 +305,10 @@ def study():
         }
         session.modified = True  # セッションの変更を明示的に保存
         
+        # カード一式をページに埋め込み、カード送りはクライアント側で行う
         return render_template("flashcard_study.html", 
                              word=all_words[0] if all_words else None,
+                             deck=build_deck(all_words),
                              front_mode=front_mode,
                              current_index=0,
                              total_count=len(all_words))
@@ -181,57 +318,12 @@ def study():
         word_id = request.form.get('word_id')
         action = request.form.get('action')  # 'learned' or 'not_learned'
         
-        # 進捗を更新または作成
-        progress = FlashcardProgress.query.filter_by(
-            user_id=current_user.id,
-            word_id=word_id
-        ).first()
-        
-        if not progress:
-            vocab = db.session.get(VocabMaster, word_id)
-            progress = FlashcardProgress(
-                user_id=current_user.id,
-                word_id=word_id,
-                jlpt_level=vocab.jlpt_level,
-                status='pending'
-            )
-            db.session.add(progress)
-        
-        # 復習日チェック：復習日が来ている場合のみnext_reviewを更新
-        today = datetime.utcnow().date()
-        is_review_day = progress.next_review is None or progress.next_review.date() <= today
-        
-        if action == 'learned':
-            progress.study_count = (progress.study_count or 0) + 1
-            progress.status = 'learned'
-            # 復習日が来ている場合のみnext_reviewを更新
-            if is_review_day:
-                progress.next_review = get_next_review_date(progress.study_count)
-        else:
-            progress.study_count = (progress.study_count or 0) + 1
-            progress.status = 'pending'
-            # 復習日が来ている場合のみnext_reviewを更新
-            if is_review_day:
-                progress.next_review = get_next_review_date(progress.study_count)
-        
-        progress.updated_at = datetime.utcnow()
-        
-        # フラッシュカードログを保存
-        try:
-            vocab = db.session.get(VocabMaster, word_id)
-            if vocab:
-                log = FlashcardLog(
-                    user_id=current_user.id,
-                    word_id=word_id,
-                    jlpt_level=vocab.jlpt_level,
-                    result='learned' if action == 'learned' else 'not_learned'
-                )
-                db.session.add(log)
-        except Exception as e:
-            # ログ保存エラーは無視（メイン機能に影響させない）
-            print(f"Flashcard log save error: {e}")
-        
-        db.session.commit()
+        if word_id and str(word_id).isdigit():
+            apply_flashcard_answers(current_user.id, [{
+                'word_id': int(word_id),
+                'result': 'learned' if action == 'learned' else 'not_learned',
+                'answered_at': datetime.utcnow()
+            }])
         
         # 次のカードに進む
         study_info = session.get('study_info', {})
@@ -376,4 +468,16 @@ def generate_forgetting_curve_data(user_id, jlpt_level):
 @google_login_required
 def flip_card():
     """カードをめくるAPI"""
-    return jsonify({'success': True}) 
\ No newline at end of file
+    return jsonify({'success': True})
+
+@flashcard_bp.route('/api/answers', methods=['POST'])
+@google_login_required_api
+def submit_answers():
+    """回答をまとめて受け付けるAPI"""
+    try:
+        answers = parse_answer_events(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    applied = apply_flashcard_answers(current_user.id, answers)
+    return jsonify({'success': True, 'applied': applied})
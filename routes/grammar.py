@@ -12,10 +12,15 @@ from models import db, GrammarQuizLog
 from error_handler import safe_claude_request, get_localized_error_message, handle_database_errors
 from claude_helper import ask_claude, ask_claude_json
 from utils.furigana import text_to_ruby_html
+from utils.pagination import keyset_paginate
+from utils.fallback_pool import FallbackPool
 
 grammar_bp = Blueprint('grammar', __name__, url_prefix="/grammar")
 load_dotenv()
 
+# Claudeが使えない間に出すための、(レベル, 方向) ごとの直近に生成した例文
+sentence_pool = FallbackPool()
+
 # 採点結果のJSONスキーマ（構造化出力用）
 SCORE_SCHEMA = {
     "type": "object",
@@ -202,8 +207,14 @@ Create one short English sentence that could naturally be translated into Japane
     result = safe_claude_request(make_api_call)
     
     if isinstance(result, dict) and "error" in result:
+        if result.get("type") in ("rate_limit", "unavailable"):
+            # API障害・混雑中は過去に生成した例文で代替
+            fallback = sentence_pool.pick((level, direction))
+            if fallback:
+                return fallback
         return result["error"]  # エラーメッセージを返す
     
+    sentence_pool.add((level, direction), result)
     return result
 
 def score_translation(original, student_translation, direction, level):
@@ -307,12 +318,9 @@ Respond only with JSON.
 @google_login_required
 def grammar_logs():
     """ユーザーの文法クイズログを表示"""
-    page = request.args.get('page', 1, type=int)
-
     # 現在のユーザーのログのみを取得
-    logs = GrammarQuizLog.query.filter_by(user_id=current_user.id)\
-                               .order_by(GrammarQuizLog.created_at.desc())\
-                               .paginate(page=page, per_page=20, error_out=False)
+    logs = keyset_paginate(GrammarQuizLog.query.filter_by(user_id=current_user.id), GrammarQuizLog,
+                           per_page=20, after=request.args.get('after'), before=request.args.get('before'))
 
     # ログのmodel_answerをJSONからリストに変換
     for log in logs.items:
@@ -6,10 +6,14 @@ import json
 from flask import Blueprint, render_template, request, session
 import re
 from google_sheets_helper import load_vocab_data_from_sheets
-from claude_helper import ask_claude
+from claude_helper import ask_claude, LLM_UNAVAILABLE_ERRORS
+from utils.fallback_pool import FallbackPool
 
 vocab_bp = Blueprint("vocab", __name__, url_prefix="/vocab")
 
+# Claudeが使えない間に出すための、レベルごとの直近に生成したクイズ
+quiz_pool = FallbackPool()
+
 def get_main_reading(word):
     if isinstance(word, str):
         return word.split('・')[0]
@@ -72,8 +76,16 @@ def generate_vocab_quiz(level):
 """
     # 5. 生成文のバリデーション: 答えやその一部が空欄以外に現れていないか、記号が含まれていないか
     max_attempts = 5
+    quiz_sentence = None
     for _ in range(max_attempts):
-        quiz_sentence = ask_claude(prompt).replace("\n", "")
+        try:
+            quiz_sentence = ask_claude(prompt).replace("\n", "")
+        except LLM_UNAVAILABLE_ERRORS as e:
+            if quiz_sentence is None:
+                # API障害・混雑中は待たずに過去に生成したクイズを出す
+                print(f"Vocab quiz served from fallback pool: {e}")
+                return quiz_pool.pick(level)
+            break
         # 空欄部分以外に正解語やその一部が含まれていないかチェック
         blank_pattern = r'＿＿'
         # 正解語の分割（例：「運転する」→["運転", "する"]）
@@ -91,7 +103,7 @@ def generate_vocab_quiz(level):
         pass
     # 正解も辞書形のまま表示
     answer_display = f"{word}（{kanji}）" if pd.notna(kanji) and str(kanji).strip() else word
-    return {
+    quiz = {
         "question": f"Q: {meaning}\n{quiz_sentence}",
         "options": options_display,
         "answer": answer_display,
@@ -100,6 +112,8 @@ def generate_vocab_quiz(level):
         "meaning": meaning,
         "sentence": quiz_sentence
     }
+    quiz_pool.add(level, quiz)
+    return quiz
 
 def safe_strip(val):
     return val.strip() if isinstance(val, str) else ""
@@ -130,7 +144,12 @@ Options:
 - {options[3]}: <English meaning>
 """
     )
-    content = ask_claude(prompt)
+    try:
+        content = ask_claude(prompt)
+    except LLM_UNAVAILABLE_ERRORS as e:
+        # 解説は省略して正誤だけ表示する
+        print(f"Vocab feedback skipped: {e}")
+        return "", []
     lines = safe_strip(content).split('\n')
     translation = ""
     option_translations = []
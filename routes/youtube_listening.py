@@ -5,6 +5,7 @@ from flask_login import current_user
 from google_sheets_helper import load_youtube_listening_data_from_sheets
 from translations import get_user_language
 from models import db, QuizPlayCount
+from utils.tracing import trace_span
 from datetime import datetime
 
 youtube_listening_bp = Blueprint('youtube_listening', __name__, url_prefix='/listening')
@@ -27,8 +28,11 @@ def get_channel_info_from_api(channel_id):
             'key': api_key
         }
         
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
+        with trace_span('google', 'youtube.channels.list', **{'http.url': url}) as span:
+            response = requests.get(url, params=params, timeout=10)
+            span.set_attribute('http.status_code', response.status_code)
+            span.set_attribute('response.size', len(response.content))
+            response.raise_for_status()
         
         data = response.json()
         
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import blog_cache
+from blog_cache import RenderedPostCache
+
+
+def _document(title):
+    return {'title': title, 'content': f'<p>{title}</p>', 'tags': ['n5'], 'raw_content': [{'paragraph': {}}]}
+
+
+def test_cache_is_validated_against_modified_time(tmp_path, monkeypatch):
+    fetched = []
+    monkeypatch.setattr(blog_cache, 'post_cache', RenderedPostCache(str(tmp_path), max_entries=1))
+    monkeypatch.setattr(blog_cache, 'get_blog_documents',
+                        lambda: [{'id': 'a', 'modified_at': '2024-01-01'}, {'id': 'b', 'modified_at': '2024-01-01'}])
+    monkeypatch.setattr(blog_cache, 'get_document_content',
+                        lambda document_id: fetched.append(document_id) or _document(f'記事 {document_id}'))
+
+    first = blog_cache.get_rendered_post('a')
+    assert first == {'title': '記事 a', 'content': '<p>記事 a</p>', 'tags': ['n5']}
+    assert blog_cache.get_rendered_post('a') == first
+    assert fetched == ['a']
+
+    # LRUから追い出されてもディスクから読める
+    blog_cache.get_rendered_post('b')
+    assert blog_cache.get_rendered_post('a') == first
+    assert fetched == ['a', 'b']
+
+    # 別プロセス（新しいキャッシュ）でもディスクのキャッシュを使う
+    monkeypatch.setattr(blog_cache, 'post_cache', RenderedPostCache(str(tmp_path)))
+    assert blog_cache.get_rendered_post('a') == first
+    assert fetched == ['a', 'b']
+
+    # 編集されたら取得し直す
+    assert blog_cache.get_rendered_post('a', modified_at='2024-02-01')['title'] == '記事 a'
+    assert fetched == ['a', 'b', 'a']
+
+
+def test_documents_outside_the_blog_list_are_not_cached(tmp_path, monkeypatch):
+    fetched = []
+    monkeypatch.setattr(blog_cache, 'post_cache', RenderedPostCache(str(tmp_path)))
+    monkeypatch.setattr(blog_cache, 'get_blog_documents', lambda: [])
+    monkeypatch.setattr(blog_cache, 'get_document_content',
+                        lambda document_id: fetched.append(document_id) or _document('x'))
+    blog_cache.get_rendered_post('z')
+    blog_cache.get_rendered_post('z')
+    assert fetched == ['z', 'z']
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+from datetime import datetime, timedelta
+
+import pytest
+from flask_login import login_user
+from sqlalchemy import event
+
+
+@pytest.fixture
+def test_app(make_test_app):
+    """ブログの Blueprint を登録したアプリ"""
+    from routes.blog import blog_bp
+    test_app = make_test_app(templates=True, login=True)
+    test_app.register_blueprint(blog_bp, url_prefix='/blog')
+    return test_app
+
+
+def _count_queries(engine):
+    statements = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_comment_tree_is_loaded_in_one_query(test_app):
+    from models import db, User, BlogComment
+    from blog_interactions import load_comment_tree
+    with test_app.app_context():
+        users = [User(email=f'user{i}@example.com', username=f'user{i}') for i in range(5)]
+        db.session.add_all(users)
+        db.session.flush()
+        start = datetime(2024, 1, 1)
+        parents = []
+        for i in range(30):
+            comment = BlogComment(document_id='doc', user_id=users[i % 5].id, content=f'comment {i}',
+                                  created_at=start + timedelta(minutes=i))
+            db.session.add(comment)
+            parents.append(comment)
+        db.session.add(BlogComment(document_id='doc', user_id=users[0].id, content='deleted', is_deleted=True,
+                                   created_at=start + timedelta(hours=2)))
+        db.session.add(BlogComment(document_id='other', user_id=users[0].id, content='other post'))
+        db.session.flush()
+        for i in range(2):
+            db.session.add(BlogComment(document_id='doc', user_id=users[1].id, content=f'reply {i}',
+                                       parent_comment_id=parents[0].id, is_admin_reply=True,
+                                       created_at=start + timedelta(hours=1, minutes=i)))
+        db.session.commit()
+        db.session.expunge_all()
+
+        statements = _count_queries(db.engine)
+        tree = load_comment_tree('doc')
+        assert len(statements) == 1
+
+    assert [comment.content for comment in tree[:2]] == ['comment 29', 'comment 28']
+    assert len(tree) == 30
+    assert tree[-1].author == 'us***'
+    assert [reply.content for reply in tree[-1].replies] == ['reply 0', 'reply 1']
+    assert tree[-1].replies[0].is_admin_reply
+
+
+def test_favorite_count_is_denormalized_and_cached(test_app):
+    from models import db, User, BlogFavorite, BlogPostStats
+    from routes import blog
+    from blog_interactions import interactions_cache
+    with test_app.app_context():
+        db.session.add_all([User(email=f'user{i}@example.com') for i in range(3)])
+        db.session.flush()
+        # 集計テーブルができる前のお気に入り
+        db.session.add(BlogFavorite(user_id=3, document_id='doc'))
+        db.session.commit()
+    interactions_cache.invalidate('doc')
+
+    def toggle(user_id):
+        with test_app.test_request_context('/blog/post/doc/favorite', method='POST', json={}):
+            login_user(db.session.get(User, user_id))
+            return blog.toggle_favorite('doc').get_json()
+
+    assert toggle(1)['favorite_count'] == 2
+    assert toggle(2)['favorite_count'] == 3
+    assert toggle(1) == {'success': True, 'is_favorited': False, 'favorite_count': 2,
+                         'message': 'お気に入りを解除しました'}
+
+    with test_app.app_context():
+        assert db.session.get(BlogPostStats, 'doc').favorite_count == 2
+        # キャッシュ済みなら集計も読まない
+        statements = _count_queries(db.engine)
+        assert interactions_cache.get('doc').favorite_count == 2
+        assert statements == []
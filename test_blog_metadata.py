@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import threading
+
+import blog_metadata
+from blog_metadata import BlogMetadataIndex
+
+
+def _post(doc_id, modified_at):
+    return {'id': doc_id, 'title': f'title {doc_id}', 'modified_at': modified_at}
+
+
+def test_only_changed_documents_are_fetched(tmp_path, monkeypatch):
+    posts = [_post('a', '2024-01-01'), _post('b', '2024-01-01')]
+    fetched = []
+    lock = threading.Lock()
+
+    def fake_content(document_id, modified_at=None):
+        with lock:
+            fetched.append(document_id)
+        return {'title': f'タイトル {document_id}',
+                'content': '<p>日本語の本文です。Hello world</p>\n<p>##grammar ##n5</p>',
+                'tags': ['n5', 'grammar']}
+
+    monkeypatch.setattr(blog_metadata, 'get_blog_documents', lambda: posts)
+    monkeypatch.setattr(blog_metadata, 'get_rendered_post', fake_content)
+    path = tmp_path / 'blog_index.json'
+    index = BlogMetadataIndex(str(path), workers=2)
+
+    assert index.refresh() == 2
+    assert sorted(fetched) == ['a', 'b']
+    entry = index.get('a')
+    assert entry['tags'] == ['grammar', 'n5']
+    assert entry['excerpt'] == '日本語の本文です。Hello world'
+    assert entry['word_count'] == 10  # かな・漢字8文字 + 英単語2つ
+
+    # 変わっていなければ取得しない。変わった記事・消えた記事だけ反映
+    fetched.clear()
+    assert index.refresh() == 0
+    assert fetched == []
+    posts[:] = [_post('a', '2024-02-01')]
+    assert index.refresh() == 1
+    assert fetched == ['a']
+    assert index.get('b') is None
+
+    # ファイルから読み戻せる
+    assert BlogMetadataIndex(str(path)).get('a')['modified_at'] == '2024-02-01'
+
+
+def test_blog_index_view_makes_no_docs_calls_once_indexed(test_app, monkeypatch):
+    from routes import blog
+    posts = [_post('a', '2024-01-01')]
+    index = BlogMetadataIndex()
+    monkeypatch.setattr(blog_metadata, 'get_blog_documents', lambda: posts)
+    monkeypatch.setattr(blog_metadata, 'get_rendered_post',
+                        lambda document_id, modified_at=None: {'title': 't', 'content': '<p>本文</p>', 'tags': ['n5']})
+    index.refresh()
+    monkeypatch.setattr(blog, 'metadata_index', index)
+    monkeypatch.setattr(blog, 'get_blog_documents', lambda: posts)
+    monkeypatch.setattr(blog_metadata, 'get_rendered_post',
+                        lambda document_id, modified_at=None: (_ for _ in ()).throw(AssertionError('Docs API called')))
+    captured = {}
+    monkeypatch.setattr(blog, 'render_template', lambda name, **context: captured.update(context) or 'ok')
+
+    with test_app.test_request_context('/blog/?tag=n5'):
+        assert blog.blog_index() == 'ok'
+    assert [post['tags'] for post in captured['blog_posts']] == [['n5']]
+    assert captured['all_tags'] == ['n5']
+    assert 'tags' not in posts[0]
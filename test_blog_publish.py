@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+from types import SimpleNamespace
+
+import pytest
+
+import blog_publish
+from blog_publish import FragmentStore
+
+
+def _post(doc_id, modified_at):
+    return {'id': doc_id, 'title': f'title {doc_id}', 'modified_at': modified_at,
+            'created_date': '2024年01月01日', 'modified_date': '2024年01月01日'}
+
+
+@pytest.fixture
+def test_app(make_test_app):
+    """ブログの Blueprint を登録したアプリ（翻訳はキーをそのまま返す）"""
+    from routes.blog import blog_bp
+    test_app = make_test_app(templates=True)
+    test_app.register_blueprint(blog_bp, url_prefix='/blog')
+    test_app.jinja_env.globals['_'] = lambda key: key
+    return test_app
+
+
+def _patch(monkeypatch, tmp_path, posts, rendered):
+    def fake_rendered_post(document_id, modified_at=None):
+        rendered.append(document_id)
+        return {'title': f'タイトル {document_id}', 'content': f'<p>{document_id} {modified_at}</p>', 'tags': ['n5']}
+
+    monkeypatch.setattr(blog_publish, 'store', FragmentStore(str(tmp_path)))
+    monkeypatch.setattr(blog_publish, 'get_blog_documents', lambda: posts)
+    monkeypatch.setattr(blog_publish, 'get_rendered_post', fake_rendered_post)
+    monkeypatch.setattr(blog_publish, 'get_modified_at',
+                        lambda document_id: next((p['modified_at'] for p in posts if p['id'] == document_id), None))
+    monkeypatch.setattr(blog_publish, 'metadata_index', SimpleNamespace(annotate=lambda posts: posts))
+
+
+def test_only_changed_posts_are_republished(test_app, tmp_path, monkeypatch):
+    posts = [_post('a', '2024-01-01'), _post('b', '2024-01-01')]
+    rendered = []
+    _patch(monkeypatch, tmp_path, posts, rendered)
+
+    with test_app.test_request_context('/'):
+        assert blog_publish.publish_changes() == 2
+        assert sorted(rendered) == ['a', 'b']
+        first = blog_publish.published_post('a')
+        assert 'タイトル a' in first.html
+        assert '/blog/?tag=n5' in first.html
+        assert 'title b' in blog_publish.published_index('ja').html
+
+        # 変わっていなければ描画しない。編集された記事・削除された記事だけ反映
+        rendered.clear()
+        assert blog_publish.publish_changes() == 0
+        assert rendered == []
+        posts[:] = [_post('a', '2024-02-01')]
+        assert blog_publish.publish_changes() == 1
+        assert rendered == ['a']
+        assert blog_publish.published_post('a').etag != first.etag
+        assert blog_publish.store.get('post-b') is None
+        assert 'title b' not in blog_publish.published_index('ja').html
+
+    # 別プロセス（新しいストア）でもディスクのフラグメントを使う
+    monkeypatch.setattr(blog_publish, 'store', FragmentStore(str(tmp_path)))
+    assert blog_publish.store.get('post-a').version == '2024-02-01'
+    assert blog_publish.store.names('post-') == {'post-a'}
+
+
+def test_fragment_endpoints_are_cacheable(test_app, tmp_path, monkeypatch):
+    posts = [_post('a', '2024-01-01')]
+    rendered = []
+    _patch(monkeypatch, tmp_path, posts, rendered)
+    client = test_app.test_client()
+
+    response = client.get('/blog/fragments/post/a.html')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == f'public, max-age={blog_publish.FRAGMENT_MAX_AGE}'
+    etag = response.headers['ETag']
+    assert client.get('/blog/fragments/post/a.html', headers={'If-None-Match': etag}).status_code == 304
+    assert rendered == ['a']
+
+    assert client.get('/blog/fragments/index/ja.html').status_code == 200
+    assert client.get('/blog/fragments/index/xx.html').status_code == 404
+    assert client.get('/blog/fragments/post/a.b.html').status_code == 404
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import blog_search
+from blog_search import BlogSearchIndex
+
+
+def _post(doc_id, title, modified_at='2024-01-01'):
+    return {'id': doc_id, 'title': title, 'modified_at': modified_at}
+
+
+DOCUMENTS = {
+    'a': {'title': '「〜ている」の使い方', 'content': '<p>進行形と結果の状態を表す文法です。</p>', 'tags': ['grammar', 'n5']},
+    'b': {'title': '漢字の覚え方', 'content': '<p>部首から覚えると文法より楽です。ている形も出ます。</p>', 'tags': ['kanji']},
+    'c': {'title': 'JLPT Listening Tips', 'content': '<p>Shadowing helps a lot.</p>', 'tags': ['listening']},
+}
+
+
+def _setup(monkeypatch, posts):
+    fetched = []
+
+    def fake_rendered_post(document_id, modified_at=None):
+        fetched.append(document_id)
+        return DOCUMENTS[document_id]
+
+    index = BlogSearchIndex()
+    monkeypatch.setattr(blog_search, 'get_rendered_post', fake_rendered_post)
+    monkeypatch.setattr(blog_search, 'get_blog_documents', lambda: posts)
+    monkeypatch.setattr(blog_search, 'search_index', index)
+    return index, fetched
+
+
+def test_search_covers_body_and_ranks_title_matches_first(monkeypatch):
+    posts = [_post('a', '「〜ている」の使い方'), _post('b', '漢字の覚え方'), _post('c', 'JLPT Listening Tips')]
+    index, fetched = _setup(monkeypatch, posts)
+    if not index.available or index._connect() is None:
+        return  # trigram の無い SQLite では従来のタイトル検索になる
+
+    # 初回の検索でインデックスを作る
+    assert [post['id'] for post in blog_search.search_posts('ている')] == ['a', 'b']
+    assert sorted(fetched) == ['a', 'b', 'c']
+    assert [post['id'] for post in blog_search.search_posts('shadowing')] == ['c']
+    assert [post['id'] for post in blog_search.search_posts('kanji')] == ['b']
+    # 3文字未満の語（LIKE）と組み合わせ
+    assert sorted(post['id'] for post in blog_search.search_posts('文法')) == ['a', 'b']
+    assert [post['id'] for post in blog_search.search_posts('漢字')] == ['b']
+    assert [post['id'] for post in blog_search.search_posts('文法 部首から')] == ['b']
+    assert blog_search.search_posts('"; DROP TABLE posts; --') == []
+    assert blog_search.search_posts('100%') == []
+
+
+def test_index_is_updated_incrementally(monkeypatch):
+    posts = [_post('a', '「〜ている」の使い方'), _post('b', '漢字の覚え方')]
+    index, fetched = _setup(monkeypatch, posts)
+    if index._connect() is None:
+        return
+    assert index.refresh() == 2
+    fetched.clear()
+    assert index.refresh() == 0
+    assert fetched == []
+
+    DOCUMENTS['a'] = dict(DOCUMENTS['a'], content='<p>書き直した本文です。</p>')
+    posts[:] = [_post('a', '「〜ている」の使い方', '2024-02-01')]
+    try:
+        assert index.refresh() == 1
+        assert fetched == ['a']
+        assert index.search_ids('書き直し') == ['a']
+        assert index.search_ids('進行形') == []
+        assert index.search_ids('漢字の覚え') == []
+        assert index.indexed_versions() == {'a': '2024-02-01'}
+    finally:
+        DOCUMENTS['a'] = dict(DOCUMENTS['a'], content='<p>進行形と結果の状態を表す文法です。</p>')
+
+
+def test_title_search_is_used_while_another_thread_builds_the_index(monkeypatch):
+    posts = [_post('a', '「〜ている」の使い方'), _post('b', '漢字の覚え方')]
+    index, fetched = _setup(monkeypatch, posts)
+    monkeypatch.setattr(blog_search, 'search_blog_posts', lambda query: [posts[1]])
+    # 他のスレッドが refresh 中
+    index._refresh_lock.acquire()
+    try:
+        assert blog_search.search_posts('漢字') == [posts[1]]
+        assert fetched == []
+    finally:
+        index._refresh_lock.release()
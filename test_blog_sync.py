@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+from types import SimpleNamespace
+
+import google_drive_helper
+import blog_sync
+from blog_sync import DriveChangeSync
+from google_drive_helper import BLOG_FOLDER_ID, BLOG_DOCUMENT_MIME_TYPE
+
+
+class _Request:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeDrive:
+    """Drive API の files.list / changes の最小限のスタブ"""
+
+    def __init__(self):
+        self.files_by_id = {}
+        self.log = []  # 変更された fileId の履歴（トークンは履歴の位置）
+        self.calls = []
+        self.error = None
+
+    def put(self, doc_id, modified_at, **fields):
+        self.files_by_id[doc_id] = dict({'id': doc_id, 'name': f'記事 {doc_id}', 'mimeType': BLOG_DOCUMENT_MIME_TYPE,
+                                         'parents': [BLOG_FOLDER_ID], 'trashed': False,
+                                         'createdTime': '2024-01-01T00:00:00Z', 'modifiedTime': modified_at}, **fields)
+        self.log.append(doc_id)
+
+    def files(self):
+        return self
+
+    def changes(self):
+        return self
+
+    def getStartPageToken(self):
+        self.calls.append('changes.getStartPageToken')
+        return _Request({'startPageToken': str(len(self.log))})
+
+    def list(self, pageToken=None, pageSize=100, q=None, **kwargs):
+        if q is not None:
+            self.calls.append('files.list')
+            files = [f for f in self.files_by_id.values() if blog_sync._is_blog_document(f)]
+            start = int(pageToken or 0)
+            response = {'files': files[start:start + pageSize]}
+            if start + pageSize < len(files):
+                response['nextPageToken'] = str(start + pageSize)
+            return _Request(response)
+        self.calls.append('changes.list')
+        if self.error:
+            return _Request(self.error)
+        start = int(pageToken)
+        changes = [{'changeType': 'file', 'fileId': doc_id, 'removed': doc_id not in self.files_by_id,
+                    'file': self.files_by_id.get(doc_id)} for doc_id in self.log[start:start + pageSize]]
+        response = {'changes': changes}
+        if start + pageSize < len(self.log):
+            response['nextPageToken'] = str(start + pageSize)
+        else:
+            response['newStartPageToken'] = str(len(self.log))
+        return _Request(response)
+
+
+def _setup(monkeypatch):
+    drive = FakeDrive()
+    refreshed, invalidated = [], []
+    monkeypatch.setattr(google_drive_helper, '_blog_cache', {'data': None, 'fetched_at': 0.0})
+    monkeypatch.setattr(blog_sync, 'get_drive_service', lambda: drive)
+    monkeypatch.setattr(blog_sync, 'metadata_index',
+                        SimpleNamespace(refresh=lambda posts: refreshed.append([p['id'] for p in posts])))
+    monkeypatch.setattr(blog_sync, 'post_cache', SimpleNamespace(invalidate=invalidated.append))
+    return drive, refreshed, invalidated
+
+
+def test_only_deltas_are_fetched_after_the_first_sync(tmp_path, monkeypatch):
+    drive, refreshed, invalidated = _setup(monkeypatch)
+    drive.put('a', '2024-01-01T00:00:00Z')
+    drive.put('b', '2024-01-02T00:00:00Z')
+    path = str(tmp_path / 'sync.json')
+    monkeypatch.setattr(blog_sync, 'drive_sync', DriveChangeSync(path))
+
+    result = blog_sync.sync_blog()
+    assert result.full and sorted(result.changed) == ['a', 'b']
+    assert drive.calls == ['changes.getStartPageToken', 'files.list']
+    # ブログ一覧のキャッシュは同期結果（新しい順）になり、フォルダの一覧は取得しない
+    assert [post['id'] for post in google_drive_helper.get_blog_documents()] == ['b', 'a']
+
+    # 変更が無ければ changes.list の1回だけ
+    drive.calls.clear()
+    refreshed.clear()
+    assert blog_sync.sync_blog() == ([], [], False)
+    assert drive.calls == ['changes.list']
+    assert refreshed == []
+
+    # 編集・ゴミ箱・フォルダ外への移動・他のファイルの変更
+    drive.put('a', '2024-03-01T00:00:00Z')
+    drive.put('b', '2024-03-01T00:00:00Z', trashed=True)
+    drive.put('c', '2024-03-01T00:00:00Z', parents=['other-folder'])
+    assert blog_sync.sync_blog() == (['a'], ['b'], False)
+    assert refreshed == [['a']]
+    assert invalidated == ['b']
+    assert [post['modified_at'] for post in google_drive_helper.get_blog_documents()] == ['2024-03-01T00:00:00Z']
+
+    # 再起動後は保存したトークンから続ける
+    drive.calls.clear()
+    monkeypatch.setattr(google_drive_helper, '_blog_cache', {'data': None, 'fetched_at': 0.0})
+    restarted = DriveChangeSync(path)
+    assert restarted.sync() == ([], [], False)
+    assert drive.calls == ['changes.list']
+    assert [post['id'] for post in google_drive_helper.get_blog_documents()] == ['a']
+
+
+def test_change_pages_are_followed(tmp_path, monkeypatch):
+    drive, refreshed, invalidated = _setup(monkeypatch)
+    sync = DriveChangeSync(str(tmp_path / 'sync.json'))
+    sync.sync()
+    for i in range(150):
+        drive.put(f'doc{i % 120}', f'2024-01-01T00:{i // 60:02d}:{i % 60:02d}Z')
+    result = sync.sync()
+    assert len(result.changed) == 120
+    assert drive.calls.count('changes.list') == 2
+    assert sync.page_token == '150'
+
+
+def test_rejected_page_token_triggers_full_resync(tmp_path, monkeypatch):
+    drive, refreshed, invalidated = _setup(monkeypatch)
+    drive.put('a', '2024-01-01T00:00:00Z')
+    sync = DriveChangeSync(str(tmp_path / 'sync.json'))
+    sync.sync()
+
+    drive.error = Exception('token expired')
+    drive.error.resp = SimpleNamespace(status=410)
+    assert sync.sync() is None
+    assert sync.page_token is None
+
+    drive.error = None
+    drive.calls.clear()
+    drive.put('b', '2024-01-02T00:00:00Z')
+    result = sync.sync()
+    assert result.full and result.changed == ['b']
+    assert drive.calls == ['changes.getStartPageToken', 'files.list']
+
+
+def test_page_token_is_saved_after_non_blog_changes(tmp_path, monkeypatch):
+    drive, refreshed, invalidated = _setup(monkeypatch)
+    drive.put('a', '2024-01-01T00:00:00Z')
+    path = str(tmp_path / 'sync.json')
+    DriveChangeSync(path).sync()
+
+    sync = DriveChangeSync(path)
+    for i in range(3):
+        drive.put(f'other{i}', '2024-01-02T00:00:00Z', parents=['other-folder'])
+    assert sync.sync() == ([], [], False)
+    assert sync.page_token == '4'
+    # 再起動後は進んだトークンから読む
+    restarted = DriveChangeSync(path)
+    restarted._load()
+    assert restarted.page_token == '4'
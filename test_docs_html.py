@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import bench_docs_html
+from docs_html import DocsHtmlConverter, convert_to_html
+
+
+def _paragraph(text, bullet=None, style=None, text_style=None):
+    paragraph = {'elements': [{'textRun': {'content': f'{text}\n', 'textStyle': text_style or {}}}],
+                 'paragraphStyle': style or {'namedStyleType': 'NORMAL_TEXT'}}
+    if bullet:
+        paragraph['bullet'] = bullet
+    return {'paragraph': paragraph}
+
+
+def _item(text, list_id, level=0):
+    return _paragraph(text, bullet={'listId': list_id, 'nestingLevel': level})
+
+
+LISTS = {
+    'num': {'listProperties': {'nestingLevels': [{'glyphType': 'DECIMAL', 'startNumber': 1},
+                                                 {'glyphType': 'ALPHA', 'startNumber': 1}]}},
+    'dot': {'listProperties': {'nestingLevels': [{'glyphSymbol': '●'}]}},
+}
+
+
+def test_lists_are_nested_and_numbering_continues():
+    html = convert_to_html([
+        _item('一', 'num'),
+        _item('a', 'num', 1),
+        _item('b', 'num', 1),
+        _item('二', 'num'),
+        _item('a', 'num', 1),
+        _paragraph('途中の段落'),
+        _item('三', 'num'),
+        _item('点', 'dot'),
+    ], LISTS)
+    assert html.split('\n') == [
+        '<ol><li>一<ol type="a"><li>a</li><li>b</li></ol></li>'
+        '<li>二<ol type="a"><li>a</li></ol></li></ol>',
+        '<p>途中の段落<br></p>',
+        '<ol start="3"><li>三</li></ol>',
+        '<ul><li>点</li></ul>',
+    ]
+
+
+def test_paragraphs_styles_and_tables():
+    bold_link = {'bold': True, 'link': {'url': 'https://example.com'}}
+    html = convert_to_html([
+        {'sectionBreak': {}},
+        _paragraph('見出し', style={'namedStyleType': 'HEADING_2', 'alignment': 'CENTER'}),
+        _paragraph('リンク', text_style=bold_link),
+        {'paragraph': {'elements': [{'textRun': {'content': ' '}}]}},
+        {'table': {'tableRows': [{'tableCells': [{'content': [_paragraph('見出し', style={'namedStyleType': 'HEADING_3'})]}]},
+                                 {'tableCells': [{'content': [_item('項目', 'dot')]}]}]}},
+    ], LISTS)
+    lines = html.split('\n')
+    assert lines[:4] == [
+        '<hr style="margin: 20px 0; border: none; border-top: 1px solid #eee;">',
+        '<h2 style="text-align: center">見出し<br></h2>',
+        '<p><a href="https://example.com" target="_blank"><strong>リンク<br></strong></a></p>',
+        '<div style="height: 1em;"></div>',
+    ]
+    assert '<th style="border: 1px solid #ddd; padding: 8px; vertical-align: top; font-weight: bold">' \
+           '<strong>見出し<br></strong></th>' in lines
+    assert '<td style="border: 1px solid #ddd; padding: 8px; vertical-align: top"><ul><li>項目</li></ul></td>' in lines
+
+
+def test_text_styles_are_memoized():
+    converter = DocsHtmlConverter()
+    document = [_paragraph(str(i), text_style={'italic': True}) for i in range(50)]
+    converter.convert(document)
+    assert len(converter._text_styles) == 1
+
+
+def test_benchmark_sample_converts():
+    size, seconds, html_length = bench_docs_html.run(paragraphs=300, repeat=1)
+    assert size > 0 and seconds > 0 and html_length > 0
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+
+def test_log_system_error_is_buffered_and_collapsed(make_test_app, monkeypatch):
+    import error_handler
+    from models import SystemErrorLog
+    from utils.error_sink import ErrorLogSink
+    test_app = make_test_app(login=True)
+    sink = ErrorLogSink(SystemErrorLog, dedup_window=60)
+    monkeypatch.setattr(error_handler, 'error_log_sink', sink)
+
+    with test_app.app_context():
+        with test_app.test_request_context('/grammar/quiz'):
+            for _ in range(5):
+                error_handler.log_system_error('rate_limit', 'Too many requests', 'grammar')
+            error_handler.log_system_error('api_error', 'Bad gateway', 'grammar')
+
+        # リクエスト中はDBに書き込まない
+        assert SystemErrorLog.query.count() == 0
+        assert sink.flush() == 2
+        logs = {log.error_type: log for log in SystemErrorLog.query.all()}
+        assert logs['rate_limit'].occurrences == 1
+        assert logs['rate_limit'].request_path == '/grammar/quiz'
+
+        # ウィンドウの終わりに繰り返し分が1行にまとまる
+        sink.close()
+        collapsed = SystemErrorLog.query.filter_by(error_type='rate_limit').order_by(SystemErrorLog.id).all()
+        assert [log.occurrences for log in collapsed] == [1, 4]
+
+
+def test_expired_window_is_written_before_it_is_replaced(test_app):
+    import time
+    from datetime import datetime
+    from models import SystemErrorLog
+    from utils.error_sink import ErrorLogSink
+    sink = ErrorLogSink(SystemErrorLog, dedup_window=0.05)
+
+    def error():
+        return {'error_type': 'api_error', 'error_message': 'Bad gateway', 'feature': 'grammar',
+                'request_path': '/grammar/quiz', 'created_at': datetime.utcnow(), 'occurrences': 1}
+
+    with test_app.app_context():
+        for _ in range(3):
+            sink.add(error())
+        # ウィンドウが終わった後、書き出しより先に同じエラーが来ても繰り返し分は失われない
+        time.sleep(0.1)
+        sink.add(error())
+        assert sink.flush() == 3
+        logs = SystemErrorLog.query.order_by(SystemErrorLog.id).all()
+        assert [log.occurrences for log in logs] == [1, 2, 1]
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def test_app(make_test_app):
+    return make_test_app(login=True)
+
+
+@pytest.fixture
+def flashcard_db(test_app):
+    from models import db, User, VocabMaster
+    with test_app.app_context():
+        user = User(email='learner@example.com', auth_type='google')
+        db.session.add(user)
+        for i in range(20):
+            db.session.add(VocabMaster(kanji=f'漢{i}', word=f'かん{i}', meaning=f'meaning {i}',
+                                       type='noun', jlpt_level='N5'))
+        db.session.add(VocabMaster(kanji='難', word='なん', meaning='hard', type='noun', jlpt_level='N1'))
+        db.session.commit()
+        yield db, user
+
+
+def test_select_study_words_prefers_due_cards(flashcard_db):
+    from models import FlashcardProgress, VocabMaster
+    from routes.flashcard import select_study_words
+    db, user = flashcard_db
+    words = VocabMaster.query.filter_by(jlpt_level='N5').order_by(VocabMaster.id).all()
+    now = datetime.utcnow()
+    # 0-4: 覚えた・復習期限前 / 5-6: 覚えた・復習期限切れ
+    for i, word in enumerate(words[:7]):
+        db.session.add(FlashcardProgress(
+            user_id=user.id, word_id=word.id, jlpt_level='N5', status='learned', study_count=1,
+            next_review=now - timedelta(days=1) if i >= 5 else now + timedelta(days=3)))
+    db.session.commit()
+
+    selected = select_study_words(user.id, 'N5', 10)
+    selected_ids = [w.id for w in selected]
+    assert len(selected) == 10
+    assert set(selected_ids[:2]) == {words[5].id, words[6].id}
+    assert not set(selected_ids) & {w.id for w in words[:5]}
+    assert all(w.jlpt_level == 'N5' for w in selected)
+
+
+def test_select_study_words_list_order(flashcard_db):
+    from models import VocabMaster
+    from routes.flashcard import select_study_words
+    db, user = flashcard_db
+    words = VocabMaster.query.filter_by(jlpt_level='N5').order_by(VocabMaster.id).all()
+    selected = select_study_words(user.id, 'N5', 5, order='list')
+    assert [w.id for w in selected] == [w.id for w in words[:5]]
+
+
+class _Card:
+    """スケジューラテスト用のFlashcardProgress代替"""
+    stability = None
+    difficulty = None
+    last_interval = None
+    last_review = None
+    next_review = None
+    lapses = 0
+
+
+def test_fsrs_intervals_grow_and_reset_on_lapse():
+    from utils.spaced_repetition import FSRSScheduler, RELEARN_DELAY
+    scheduler = FSRSScheduler()
+    card = _Card()
+    now = datetime(2026, 1, 1)
+    intervals = []
+    for _ in range(4):
+        next_review = scheduler.review(card, 'learned', now)
+        intervals.append(card.last_interval)
+        now = next_review
+    assert intervals == sorted(intervals) and intervals[-1] > intervals[0]
+
+    stability_before = card.stability
+    next_review = scheduler.review(card, 'not_learned', now)
+    assert next_review == now + RELEARN_DELAY
+    assert card.stability < stability_before
+    assert card.lapses == 1
+
+
+def test_sm2_intervals():
+    from utils.spaced_repetition import SM2Scheduler
+    scheduler = SM2Scheduler()
+    card = _Card()
+    now = datetime(2026, 1, 1)
+    for expected in (1.0, 6.0, 15.0):
+        scheduler.review(card, 'learned', now)
+        assert card.last_interval == expected
+    scheduler.review(card, 'not_learned', now)
+    assert card.last_interval == 0.0
+    assert card.difficulty < SM2Scheduler.INITIAL_EASE
+
+
+def test_reschedule_legacy_progress(flashcard_db):
+    from models import FlashcardProgress, VocabMaster
+    from utils.spaced_repetition import reschedule_legacy_progress, FSRSScheduler
+    db, user = flashcard_db
+    words = VocabMaster.query.filter_by(jlpt_level='N5').order_by(VocabMaster.id).all()
+    for i, word in enumerate(words[:5]):
+        db.session.add(FlashcardProgress(user_id=user.id, word_id=word.id, jlpt_level='N5',
+                                         status='learned' if i % 2 == 0 else 'pending', study_count=i))
+    db.session.commit()
+
+    assert reschedule_legacy_progress(batch_size=2, scheduler=FSRSScheduler()) == 5
+    rows = FlashcardProgress.query.order_by(FlashcardProgress.id).all()
+    assert [row.last_interval for row in rows] == [1.0, 3.0, 7.0, 14.0, 30.0]
+    assert all(row.stability and row.difficulty for row in rows)
+    assert rows[1].difficulty > rows[0].difficulty
+    assert reschedule_legacy_progress() == 0
+
+
+def test_apply_flashcard_answers_in_one_batch(flashcard_db, monkeypatch):
+    import routes.flashcard
+    from models import FlashcardLog, FlashcardProgress, VocabMaster
+    from routes.flashcard import apply_flashcard_answers, parse_answer_events
+    from utils.buffered_writer import BufferedInsertWriter
+    db, user = flashcard_db
+    writer = BufferedInsertWriter(FlashcardLog)
+    monkeypatch.setattr(routes.flashcard, 'flashcard_log_writer', writer)
+    words = VocabMaster.query.filter_by(jlpt_level='N5').order_by(VocabMaster.id).all()
+    answers = parse_answer_events({'answers': [
+        {'word_id': words[0].id, 'result': 'learned', 'answered_at': '2026-01-01T10:00:00Z'},
+        {'word_id': words[1].id, 'result': 'not_learned', 'answered_at': '2026-01-01T10:00:05Z'},
+        {'word_id': words[1].id, 'result': 'learned', 'answered_at': '2026-01-01T10:00:30Z'},
+        {'word_id': 99999, 'result': 'learned'},
+    ]})
+
+    assert apply_flashcard_answers(user.id, answers) == 3
+    progress = {p.word_id: p for p in FlashcardProgress.query.filter_by(user_id=user.id).all()}
+    assert progress[words[0].id].status == 'learned'
+    assert progress[words[1].id].study_count == 2
+    assert progress[words[1].id].lapses == 1
+    # ログはバッファに溜まり、flushで一括INSERTされる
+    assert FlashcardLog.query.filter_by(user_id=user.id).count() == 0
+    assert writer.flush() == 3
+    assert FlashcardLog.query.filter_by(user_id=user.id).count() == 3
+
+
+def test_resent_batch_is_applied_once(flashcard_db, monkeypatch):
+    import routes.flashcard
+    from models import FlashcardLog, FlashcardProgress, VocabMaster
+    from routes.flashcard import apply_flashcard_answers, parse_answer_events
+    from utils.buffered_writer import BufferedInsertWriter
+    db, user = flashcard_db
+    monkeypatch.setattr(routes.flashcard, 'flashcard_log_writer', BufferedInsertWriter(FlashcardLog))
+    words = VocabMaster.query.filter_by(jlpt_level='N5').order_by(VocabMaster.id).all()
+    batch = [
+        {'word_id': words[0].id, 'result': 'learned', 'answered_at': '2026-01-01T10:00:00.123Z'},
+        {'word_id': words[1].id, 'result': 'not_learned', 'answered_at': '2026-01-01T10:00:05.456Z'},
+    ]
+    assert apply_flashcard_answers(user.id, parse_answer_events({'answers': batch})) == 2
+    before = {p.word_id: (p.study_count, p.stability, p.next_review)
+              for p in FlashcardProgress.query.filter_by(user_id=user.id).all()}
+
+    # 応答が届かなかったバッチが、新しい回答と一緒に再送されても二重に反映しない
+    resent = batch + [{'word_id': words[1].id, 'result': 'learned', 'answered_at': '2026-01-01T10:01:00Z'}]
+    assert apply_flashcard_answers(user.id, parse_answer_events({'answers': resent})) == 1
+    progress = {p.word_id: p for p in FlashcardProgress.query.filter_by(user_id=user.id).all()}
+    assert len(progress) == 2
+    assert (progress[words[0].id].study_count, progress[words[0].id].stability,
+            progress[words[0].id].next_review) == before[words[0].id]
+    assert progress[words[1].id].study_count == 2
+    assert progress[words[1].id].status == 'learned'
+
+
+def test_flashcard_progress_is_unique_per_word(flashcard_db):
+    from sqlalchemy.exc import IntegrityError
+    from models import FlashcardProgress, VocabMaster
+    db, user = flashcard_db
+    word = VocabMaster.query.first()
+    for _ in range(2):
+        db.session.add(FlashcardProgress(user_id=user.id, word_id=word.id, jlpt_level='N5'))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_submit_answers_returns_json_when_not_logged_in(test_app, monkeypatch):
+    import routes.flashcard
+    from models import db, FlashcardLog, User, VocabMaster
+    from routes.flashcard import flashcard_bp
+    from utils.buffered_writer import BufferedInsertWriter
+    monkeypatch.setattr(routes.flashcard, 'flashcard_log_writer', BufferedInsertWriter(FlashcardLog))
+    test_app.register_blueprint(flashcard_bp)
+    with test_app.app_context():
+        learner = User(email='learner@example.com', auth_type='google')
+        guest = User(email='guest@example.com', auth_type='guest')
+        word = VocabMaster(kanji='漢', word='かん', meaning='meaning', type='noun', jlpt_level='N5')
+        db.session.add_all([learner, guest, word])
+        db.session.commit()
+        learner_id, guest_id, word_id = learner.id, guest.id, word.id
+    client = test_app.test_client()
+    payload = {'answers': [{'word_id': word_id, 'result': 'learned'}]}
+
+    # ログイン切れでもリダイレクト（fetchでは200のHTML）ではなくJSONのエラーを返す
+    response = client.post('/flashcard/api/answers', json=payload)
+    assert response.status_code == 401
+    assert response.get_json()['success'] is False
+
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(guest_id)
+    response = client.post('/flashcard/api/answers', json=payload)
+    assert response.status_code == 403
+    assert response.get_json()['success'] is False
+
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(learner_id)
+    response = client.post('/flashcard/api/answers', json=payload)
+    assert response.status_code == 200
+    assert response.get_json() == {'success': True, 'applied': 1}
+
+
+def test_well_learned_counts_scheduler_state_not_answers(flashcard_db, monkeypatch):
+    import routes.flashcard
+    from models import FlashcardLog, FlashcardProgress, VocabMaster
+    from routes.flashcard import apply_flashcard_answers, parse_answer_events, count_well_learned
+    from utils.buffered_writer import BufferedInsertWriter
+    db, user = flashcard_db
+    monkeypatch.setattr(routes.flashcard, 'flashcard_log_writer', BufferedInsertWriter(FlashcardLog))
+    words = VocabMaster.query.filter_by(jlpt_level='N5').order_by(VocabMaster.id).all()
+    # 「覚えていない」を何回答えても覚えた数には入らない
+    apply_flashcard_answers(user.id, parse_answer_events({'answers': [
+        {'word_id': words[0].id, 'result': 'not_learned', 'answered_at': f'2026-01-0{day}T10:00:00Z'}
+        for day in range(1, 5)
+    ]}))
+    assert FlashcardProgress.query.filter_by(word_id=words[0].id).one().study_count == 4
+    assert count_well_learned(user.id) == 0
+
+    # 「覚えた」が続いて間隔が延びたカードは入る
+    apply_flashcard_answers(user.id, parse_answer_events({'answers': [
+        {'word_id': words[1].id, 'result': 'learned', 'answered_at': answered_at}
+        for answered_at in ('2026-01-01T10:00:00Z', '2026-01-10T10:00:00Z', '2026-02-01T10:00:00Z')
+    ]}))
+    assert count_well_learned(user.id) == 1
+
+
+def test_buffered_writer_spills_and_replays(flashcard_db, tmp_path):
+    from models import FlashcardLog, VocabMaster
+    from utils.buffered_writer import BufferedInsertWriter
+    db, user = flashcard_db
+    word = VocabMaster.query.first()
+    spill_path = tmp_path / 'spill' / 'flashcard_log.jsonl'
+    writer = BufferedInsertWriter(FlashcardLog, max_buffer=2, spill_path=str(spill_path))
+    rows = [{'user_id': user.id, 'word_id': word.id, 'jlpt_level': 'N5', 'result': 'learned',
+             'created_at': datetime(2026, 1, 1, 12, i)} for i in range(5)]
+
+    # バッファ上限を超えた分はファイルに退避される
+    writer.add_many(rows)
+    assert writer.pending_count() == 2
+    assert len(spill_path.read_text().splitlines()) == 3
+
+    assert writer.flush() == 2
+    assert not spill_path.exists()
+    logs = FlashcardLog.query.order_by(FlashcardLog.created_at).all()
+    assert [log.created_at for log in logs] == [row['created_at'] for row in rows]
+
+
+def test_buffered_writer_flushes_in_background_after_start(flashcard_db, test_app):
+    from models import FlashcardLog, VocabMaster
+    from utils.buffered_writer import BufferedInsertWriter
+    db, user = flashcard_db
+    word = VocabMaster.query.first()
+    writer = BufferedInsertWriter(FlashcardLog, flush_size=2, flush_interval=60)
+    writer.init_app(test_app)
+    assert writer._thread is None
+
+    writer.start()
+    writer.add_many([{'user_id': user.id, 'word_id': word.id, 'jlpt_level': 'N5', 'result': 'learned',
+                      'created_at': datetime(2026, 1, 1, 12, minute)} for minute in range(2)])
+    for _ in range(100):
+        if writer.pending_count() == 0:
+            break
+        time.sleep(0.02)
+    writer.close()
+    assert not writer._thread.is_alive()
+    assert FlashcardLog.query.count() == 2
+
+
+def test_buffered_writer_drops_poison_rows(flashcard_db):
+    from models import FlashcardLog, VocabMaster
+    from utils.buffered_writer import BufferedInsertWriter
+    db, user = flashcard_db
+    word = VocabMaster.query.first()
+    writer = BufferedInsertWriter(FlashcardLog, max_attempts=2)
+
+    def row(minute, result='learned'):
+        return {'user_id': user.id, 'word_id': word.id, 'jlpt_level': 'N5', 'result': result,
+                'created_at': datetime(2026, 1, 1, 12, minute)}
+
+    # NOT NULL 違反の行があっても、同じバッチの他の行は書き込まれる
+    writer.add_many([row(0), row(1, result=None), row(2)])
+    assert writer.flush() == 2
+    assert writer.pending_count() == 1
+
+    # 不正な行は次回また試し、max_attempts 回失敗したら捨てる。後続の行は止まらない
+    writer.add(row(3))
+    assert writer.flush() == 1
+    assert writer.pending_count() == 0
+    assert FlashcardLog.query.count() == 3
+
+
+def test_parse_answer_events_rejects_invalid_payloads():
+    from routes.flashcard import parse_answer_events, MAX_ANSWER_BATCH
+    for payload in (None, {'answers': 'x'}, {'answers': [{'result': 'learned'}]},
+                    {'answers': [{'word_id': 1, 'result': 'maybe'}]},
+                    {'answers': [{'word_id': 1, 'result': 'learned', 'answered_at': 'yesterday'}]},
+                    {'answers': [{'word_id': 1, 'result': 'learned'}] * (MAX_ANSWER_BATCH + 1)}):
+        with pytest.raises(ValueError):
+            parse_answer_events(payload)
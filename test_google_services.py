@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import threading
+
+import pytest
+
+import google_drive_helper
+
+
+@pytest.fixture
+def services(monkeypatch):
+    if not google_drive_helper.GOOGLE_APIS_AVAILABLE:
+        pytest.skip('Google API libraries not installed')
+    from google.auth.credentials import AnonymousCredentials
+    loads = []
+    monkeypatch.setattr(google_drive_helper, '_load_credentials',
+                        lambda scopes: loads.append(scopes) or AnonymousCredentials())
+    monkeypatch.setattr(google_drive_helper, '_thread_local', threading.local())
+    monkeypatch.setattr(google_drive_helper, '_shared', {'credentials': None, 'discovery': {}})
+    return loads
+
+
+def test_services_are_reused_per_thread(services):
+    drive = google_drive_helper.get_drive_service()
+    docs = google_drive_helper.get_docs_service()
+    assert drive is not None and docs is not None
+    assert google_drive_helper.get_drive_service() is drive
+    assert google_drive_helper.get_docs_service() is docs
+    # 同じスレッドでは Drive と Docs が1つの HTTP クライアントを共有する
+    assert drive._http is docs._http
+
+    other = {}
+    thread = threading.Thread(target=lambda: other.update(drive=google_drive_helper.get_drive_service()))
+    thread.start()
+    thread.join()
+    assert other['drive'] is not drive
+    assert other['drive']._http is not drive._http
+
+    # 認証情報とディスカバリー文書はプロセスで1回だけ読む
+    assert len(services) == 1
+    assert set(google_drive_helper._shared['discovery']) == {('drive', 'v3'), ('docs', 'v1')}
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+
+def test_requests_db_queries_and_outbound_calls_are_recorded(test_app):
+    from models import User
+    from utils import instrumentation
+    from utils.latency import record_latency
+    instrumentation.init_app(test_app)
+
+    @test_app.route('/users')
+    def list_users():
+        User.query.all()
+        record_latency('claude', 0.3)
+        return 'ok'
+
+    instrumentation.drain_interval()
+
+    client = test_app.test_client()
+    for _ in range(3):
+        assert client.get('/users').status_code == 200
+
+    interval = instrumentation.drain_interval()
+    assert interval.requests[('list_users', 'GET')].count == 3
+    assert interval.statuses[('list_users', 'GET', 200)] == 3
+    assert interval.db_queries['list_users'] == 3
+    assert interval.outbound['claude'].count == 3
+    assert abs(interval.outbound_seconds[('list_users', 'claude')] - 0.9) < 1e-9
+
+    metrics = instrumentation.interval_metrics(interval)
+    assert metrics['requests:list_users'] == 3
+    assert metrics['db_queries_per_request:list_users'] == 1
+    assert abs(metrics['claude_seconds_per_request:list_users'] - 0.3) < 1e-9
+    assert metrics['http_5xx_rate'] == 0
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{endpoint="list_users",method="GET"} 3' in body
+    assert 'outbound_request_duration_seconds_bucket{service="claude",le="+Inf"} 3' in body
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.5'}).status_code == 404
+
+
+def test_histogram_percentile_uses_bucket_upper_bound():
+    from utils.instrumentation import Histogram
+    histogram = Histogram()
+    for seconds in (0.010, 0.011, 0.012, 2.0):
+        histogram.observe(seconds)
+    assert histogram.percentile(50) == 0.012
+    assert histogram.percentile(99) == 2.0
+
+
+def test_collect_does_not_lose_concurrent_records():
+    import threading
+    from utils import instrumentation
+    instrumentation.drain_interval()
+    stop = threading.Event()
+
+    def record():
+        for _ in range(20000):
+            instrumentation.record_outbound('test-service', 0.001)
+
+    def collect():
+        while not stop.is_set():
+            instrumentation.collect()
+
+    collector = threading.Thread(target=collect)
+    collector.start()
+    workers = [threading.Thread(target=record) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    stop.set()
+    collector.join()
+
+    assert instrumentation.drain_interval().outbound['test-service'].count == 80000
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+from types import SimpleNamespace
+
+import pytest
+
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from utils.concurrency_limit import AIMDLimiter, ConcurrencyLimitExceeded
+from utils.fallback_pool import FallbackPool
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    breaker = CircuitBreaker('model', failure_threshold=2, reset_timeout=0.0)
+    breaker.reset_timeout = 60.0
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    # 時間が経つと half_open になり、試しの1件だけ通す
+    breaker.reset_timeout = 0.0
+    assert breaker.state == HALF_OPEN
+    probe = breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success(probe)
+    assert breaker.state == CLOSED
+    breaker.allow()
+
+
+def test_only_the_probe_frees_the_half_open_slot():
+    breaker = CircuitBreaker('model', failure_threshold=1, reset_timeout=60.0)
+    # open になる前に通った呼び出し
+    earlier = breaker.allow()
+    assert earlier is None
+    breaker.record_failure()
+    breaker.reset_timeout = 0.0
+    probe = breaker.allow()
+    assert probe is not None
+
+    # 試しの1件以外の呼び出しが終わっても、2件目は通さない
+    breaker.release(earlier)
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.release(probe)
+    assert breaker.allow() is not None
+
+
+def test_half_open_failure_reopens():
+    breaker = CircuitBreaker('model', failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    probe = breaker.allow()
+    breaker.reset_timeout = 60.0
+    breaker.record_failure(probe)
+    assert breaker.state == OPEN
+
+
+def test_aimd_limiter_fails_fast_and_adapts():
+    limiter = AIMDLimiter('test', initial_limit=2, max_limit=4, latency_target=10.0)
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(ConcurrencyLimitExceeded):
+        limiter.acquire()
+
+    # 混雑を示す失敗で半分に
+    limiter.release(dropped=True)
+    assert limiter.limit == 1
+    limiter.release(dropped=True)
+    assert limiter.limit == 1  # min_limit より下がらない
+
+    # 上限いっぱいで成功し続けると少しずつ戻る
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(seconds=1.0)
+    assert limiter.limit >= 2
+
+
+def test_fallback_pool_keeps_recent_items():
+    pool = FallbackPool(maxlen=2)
+    assert pool.pick('N5') is None
+    for item in ('a', 'b', 'c'):
+        pool.add('N5', item)
+    assert {pool.pick('N5') for _ in range(50)} <= {'b', 'c'}
+
+
+def test_claude_breaker_short_circuits_failing_model(monkeypatch):
+    import anthropic
+    import claude_helper
+    from utils.retry import RetryPolicy
+
+    monkeypatch.setattr(claude_helper, 'retry_policy', RetryPolicy('claude', max_budget=0.0))
+    monkeypatch.setattr(claude_helper, '_breakers', {})
+    monkeypatch.setattr(claude_helper, 'concurrency_limiter', AIMDLimiter('claude', initial_limit=4, max_limit=4))
+    monkeypatch.setenv('LLM_BREAKER_FAILURES', '2')
+    response = SimpleNamespace(status_code=500, headers={}, request=None)
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        raise anthropic.InternalServerError('server error', response=response, body=None)
+
+    monkeypatch.setattr(claude_helper.client.messages, 'create', create)
+    for _ in range(2):
+        with pytest.raises(anthropic.InternalServerError):
+            claude_helper.ask_claude('問題を作って')
+    with pytest.raises(claude_helper.LLM_UNAVAILABLE_ERRORS):
+        claude_helper.ask_claude('問題を作って')
+    assert len(calls) == 2
+    assert claude_helper.circuit_breaker(claude_helper.CLAUDE_MODEL).state == OPEN
+    assert claude_helper.concurrency_limiter.in_flight == 0
+
+
+def test_akinator_shows_pause_message_when_claude_is_unavailable(test_app, monkeypatch):
+    from flask import session
+    from routes import akinator
+
+    def unavailable(prompt):
+        raise CircuitOpenError('model', 30.0)
+
+    monkeypatch.setattr(akinator, 'ask_claude', unavailable)
+    monkeypatch.setattr(akinator, 'render_game', lambda history, show_word=False: (history, show_word))
+    monkeypatch.setattr(akinator, 'get_localized_error_message', lambda key: f'<{key}>')
+    with test_app.test_request_context('/akinator/game', method='POST', data={'message': 'たべもの'}):
+        session.update(akinator_role='user', akinator_level='N5', akinator_word='りんご',
+                       akinator_meaning='apple', akinator_history=[])
+        history, show_word = akinator.akinator_game()
+
+    # 一時停止のメッセージは4択に正規化されず、そのまま表示される
+    assert history == [{'role': 'user', 'text': 'たべもの'},
+                       {'role': 'gpt', 'text': '<feature_temporarily_disabled>'}]
+    assert show_word
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+from types import SimpleNamespace
+
+import pytest
+from flask import Blueprint
+
+
+def _response(input_tokens, output_tokens):
+    return SimpleNamespace(
+        content=[SimpleNamespace(type='text', text='答え')],
+        stop_reason='end_turn',
+        usage=SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens,
+                              cache_read_input_tokens=0, cache_creation_input_tokens=0))
+
+
+def test_claude_calls_are_accounted_per_feature_and_route(test_app, monkeypatch):
+    import claude_helper
+    from utils.llm_usage import usage_store, usage_metrics, estimate_cost
+    usage_store.drain()
+    responses = iter([_response(300, 50), _response(100, 20), _response(1000, 200)])
+    monkeypatch.setattr(claude_helper.client.messages, 'create', lambda **kwargs: next(responses))
+
+    grammar = Blueprint('grammar', __name__)
+
+    @grammar.route('/quiz')
+    def quiz():
+        claude_helper.ask_claude('問題を作って')
+        claude_helper.ask_claude('ふりがな', feature='furigana')
+        return 'ok'
+
+    test_app.register_blueprint(grammar)
+    assert test_app.test_client().get('/quiz').status_code == 200
+    with test_app.app_context():
+        claude_helper.ask_claude('背景ジョブ')
+
+    metrics = usage_metrics(usage_store.drain())
+    assert metrics['llm_calls:grammar'] == 1
+    assert metrics['llm_input_tokens:grammar'] == 300
+    assert metrics['llm_output_tokens:furigana'] == 20
+    assert metrics['llm_calls:background'] == 1
+    assert metrics['llm_cost_usd:grammar'] == pytest.approx(estimate_cost(300, 50))
+    # 1リクエストで2回呼んでもリクエスト数は1
+    assert metrics['llm_requests:grammar.quiz'] == 1
+    assert metrics['llm_route_tokens:grammar.quiz'] == 470
+    assert metrics['llm_prompt_calls:<512'] == 1
+    assert metrics['llm_prompt_calls:<1024'] == 1
+
+
+def test_rejected_calls_are_not_counted_as_claude_calls(test_app, monkeypatch):
+    import claude_helper
+    from utils.circuit_breaker import CircuitBreaker
+    from utils.llm_usage import usage_store, usage_metrics
+    usage_store.drain()
+    breaker = CircuitBreaker(claude_helper.CLAUDE_MODEL, failure_threshold=1, reset_timeout=60.0)
+    breaker.record_failure()
+    monkeypatch.setattr(claude_helper, '_breakers', {claude_helper.CLAUDE_MODEL: breaker})
+    monkeypatch.setattr(claude_helper.client.messages, 'create', lambda **kwargs: _response(100, 20))
+
+    with test_app.app_context():
+        for _ in range(2):
+            with pytest.raises(claude_helper.LLM_UNAVAILABLE_ERRORS):
+                claude_helper.ask_claude('問題を作って', feature='grammar')
+
+    # ブレーカーで断った呼び出しはClaudeの呼び出し・エラー・レイテンシに含めず、拒否として数える
+    metrics = usage_metrics(usage_store.drain())
+    assert metrics['llm_rejected:grammar'] == 2
+    assert metrics['llm_calls:grammar'] == 0
+    assert metrics['llm_errors:grammar'] == 0
+    assert metrics['llm_seconds:grammar'] == 0
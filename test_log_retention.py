@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import json
+from datetime import datetime, timedelta
+
+
+def test_compact_log_tables_rolls_old_rows_into_daily_aggregates(test_app):
+    from models import db, User, GrammarQuizLog, SystemErrorLog, LogDailyAggregate
+    from log_retention import compact_log_tables
+    with test_app.app_context():
+        user = User(email='learner@example.com')
+        db.session.add(user)
+        db.session.commit()
+
+        old = datetime.utcnow() - timedelta(days=100)
+        recent = datetime.utcnow() - timedelta(days=1)
+        for score, created_at in ((50.0, old), (100.0, old), (80.0, recent)):
+            db.session.add(GrammarQuizLog(user_id=user.id, original_sentence='a', user_translation='b',
+                                          jlpt_level='N5', direction='en_to_ja', score=score,
+                                          created_at=created_at))
+        db.session.add(SystemErrorLog(error_type='rate_limit', feature='grammar', created_at=old))
+        db.session.commit()
+
+        results = compact_log_tables(retention_days=90)
+        assert results == {'grammar_quiz_log': 2, 'flashcard_log': 0, 'system_error_logs': 1}
+        assert GrammarQuizLog.query.count() == 1
+
+        grammar = LogDailyAggregate.query.filter_by(source='grammar_quiz_log').one()
+        assert grammar.day == old.date()
+        assert grammar.count == 2 and grammar.value_sum == 150.0
+        assert json.loads(grammar.dimensions) == {'direction': 'en_to_ja', 'jlpt_level': 'N5'}
+
+        # 2回目は何も変わらない
+        assert compact_log_tables(retention_days=90)['grammar_quiz_log'] == 0
+        assert LogDailyAggregate.query.count() == 2
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+from datetime import datetime, timedelta
+
+
+def test_run_metrics_rollup_writes_system_metrics(test_app):
+    from models import db, User, Feedback, GrammarQuizLog, SystemErrorLog, SystemMetrics
+    from metrics_rollup import run_metrics_rollup, latest_metrics, DASHBOARD_METRICS
+    from utils.latency import record_latency, drain_samples
+    with test_app.app_context():
+        now = datetime(2026, 3, 1, 12, 0)
+        active = User(email='active@example.com', created_at=now - timedelta(days=2),
+                      last_login=now - timedelta(hours=1))
+        dormant = User(email='dormant@example.com', created_at=now - timedelta(days=30),
+                       last_login=now - timedelta(days=20))
+        db.session.add_all([active, dormant])
+        db.session.add(Feedback(name='a', email='a@example.com', message='hi', status='unread'))
+        db.session.commit()
+        for minutes in (5, 10, 30):
+            db.session.add(GrammarQuizLog(user_id=active.id, original_sentence='a', user_translation='b',
+                                          jlpt_level='N5', direction='en_to_ja',
+                                          created_at=now - timedelta(minutes=minutes)))
+        db.session.add(SystemErrorLog(error_type='api_error', feature='grammar',
+                                      created_at=now - timedelta(minutes=1)))
+        db.session.commit()
+        drain_samples()
+        for seconds in (0.5, 1.0, 1.5, 4.0):
+            record_latency('claude', seconds)
+
+        assert run_metrics_rollup(now=now) > 0
+        values = {m.metric_type: m.metric_value for m in SystemMetrics.query.all()}
+        assert values['total_users'] == 2
+        assert values['new_users_7d'] == 1
+        assert values['active_users_24h'] == 1
+        assert values['unread_feedback'] == 1
+        assert values['quiz_volume:grammar'] == 3
+        assert values['error_count:grammar'] == 1
+        assert values['error_rate'] == 0.25
+        assert values['api_latency_p50:claude'] == 1.0
+        assert values['api_latency_p99:claude'] == 4.0
+
+        latest = latest_metrics(DASHBOARD_METRICS)
+        assert set(latest) == set(DASHBOARD_METRICS)
+        assert latest['total_users'].period_end == now
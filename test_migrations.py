@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+from sqlalchemy import inspect, text
+
+
+def test_fresh_database_is_stamped_latest(make_test_app):
+    from migrations import upgrade, ensure_schema, get_current_version, LATEST_VERSION
+    test_app = make_test_app(create_tables=False)
+    with test_app.app_context():
+        assert get_current_version() is None
+        assert upgrade() == LATEST_VERSION
+        assert get_current_version() == LATEST_VERSION
+        # 2回目の起動ではイントロスペクションせずスキップされる
+        assert ensure_schema() is False
+
+
+def test_legacy_database_is_migrated(make_test_app):
+    from models import db
+    from migrations import ensure_schema, get_current_version, LATEST_VERSION
+    test_app = make_test_app(create_tables=False)
+    with test_app.app_context():
+        # バージョン管理導入前の、model_answer列が無いテーブルを再現
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE grammar_quiz_log (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+                'original_sentence TEXT NOT NULL, user_translation TEXT NOT NULL, '
+                'jlpt_level VARCHAR(10) NOT NULL, direction VARCHAR(10) NOT NULL, '
+                'score FLOAT, feedback TEXT, created_at DATETIME)'))
+
+        assert ensure_schema() is True
+        columns = [col['name'] for col in inspect(db.engine).get_columns('grammar_quiz_log')]
+        assert 'model_answer' in columns
+        assert get_current_version() == LATEST_VERSION
+        assert ensure_schema() is False
+
+
+def test_duplicate_flashcard_progress_is_merged(make_test_app):
+    from models import db, FlashcardProgress
+    from migrations import upgrade, LATEST_VERSION
+    test_app = make_test_app(create_tables=False)
+    with test_app.app_context():
+        # 一意インデックス導入前に、同時リクエストで同じ単語の進捗が2行できたDBを再現
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE flashcard_progress (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+                'word_id INTEGER NOT NULL, jlpt_level VARCHAR(10) NOT NULL, status VARCHAR(20), '
+                'study_count INTEGER, updated_at DATETIME, next_review DATETIME)'))
+            conn.execute(text('CREATE INDEX ix_flashcard_progress_user_word ON flashcard_progress (user_id, word_id)'))
+            conn.execute(text(
+                "INSERT INTO flashcard_progress (user_id, word_id, jlpt_level, status, study_count) VALUES "
+                "(1, 1, 'N5', 'pending', 1), (1, 1, 'N5', 'learned', 2), (1, 2, 'N5', 'pending', 1)"))
+
+        assert upgrade() == LATEST_VERSION
+        rows = FlashcardProgress.query.order_by(FlashcardProgress.word_id).all()
+        assert [(row.word_id, row.study_count) for row in rows] == [(1, 2), (2, 1)]
+        indexes = {index['name']: index for index in inspect(db.engine).get_indexes('flashcard_progress')}
+        assert indexes['ix_flashcard_progress_user_word']['unique']
+
+
+def test_migration_app_uses_database_url(tmp_path, monkeypatch):
+    from migrations import create_migration_app, upgrade, LATEST_VERSION
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'release.db'}")
+    release_app = create_migration_app()
+    with release_app.app_context():
+        assert upgrade() == LATEST_VERSION
+    assert (tmp_path / 'release.db').exists()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+from datetime import datetime, timedelta
+
+
+def test_keyset_paginate_walks_forward_and_back(test_app):
+    from models import db, SystemErrorLog
+    from utils.pagination import keyset_paginate
+    with test_app.app_context():
+        base = datetime(2026, 1, 1)
+        # 同じcreated_atの行を含めてもidで順序が決まる
+        for i in range(7):
+            db.session.add(SystemErrorLog(error_type='api_error', feature='grammar',
+                                          created_at=base + timedelta(minutes=i // 2)))
+        db.session.commit()
+        expected = [log.id for log in SystemErrorLog.query.order_by(
+            SystemErrorLog.created_at.desc(), SystemErrorLog.id.desc())]
+
+        first = keyset_paginate(SystemErrorLog.query, SystemErrorLog, per_page=3, with_total=True)
+        assert [log.id for log in first.items] == expected[:3]
+        assert first.has_next and not first.has_prev
+        assert first.total == 7
+
+        second = keyset_paginate(SystemErrorLog.query, SystemErrorLog, per_page=3, after=first.next_cursor)
+        assert [log.id for log in second.items] == expected[3:6]
+        assert second.has_next and second.has_prev and second.total is None
+
+        last = keyset_paginate(SystemErrorLog.query, SystemErrorLog, per_page=3, after=second.next_cursor)
+        assert [log.id for log in last.items] == expected[6:]
+        assert not last.has_next
+
+        back = keyset_paginate(SystemErrorLog.query, SystemErrorLog, per_page=3, before=second.prev_cursor)
+        assert [log.id for log in back.items] == expected[:3]
+        assert back.has_next and not back.has_prev
+
+        # 不正なカーソルは1ページ目として扱う
+        invalid = keyset_paginate(SystemErrorLog.query, SystemErrorLog, per_page=3, after='bogus')
+        assert [log.id for log in invalid.items] == expected[:3]
+
+
+def test_keyset_paginate_reaches_rows_without_created_at(test_app):
+    from models import db, SystemErrorLog
+    from utils.pagination import keyset_paginate
+    with test_app.app_context():
+        base = datetime(2026, 1, 1)
+        logs = [SystemErrorLog(error_type='api_error', feature='grammar', created_at=base + timedelta(minutes=i))
+                for i in range(4)]
+        db.session.add_all(logs)
+        db.session.commit()
+        undated = [logs[0].id, logs[2].id]
+        SystemErrorLog.query.filter(SystemErrorLog.id.in_(undated)).update(
+            {SystemErrorLog.created_at: None}, synchronize_session=False)
+        db.session.add(SystemErrorLog(error_type='api_error', feature='grammar', created_at=base))
+        db.session.commit()
+        # 日時のある行を新しい順に、その後に created_at が NULL の行を id の降順に並べる
+        expected = [4, 2, 5, 3, 1]
+
+        pages, cursor = [], None
+        while True:
+            page = keyset_paginate(SystemErrorLog.query, SystemErrorLog, per_page=2, after=cursor)
+            pages.append([log.id for log in page.items])
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        assert pages == [[4, 2], [5, 3], [1]]
+        assert sum(pages, []) == expected
+
+        # NULL の行のカーソルからも前のページへ戻れる
+        back = keyset_paginate(SystemErrorLog.query, SystemErrorLog, per_page=2, before=page.prev_cursor)
+        assert [log.id for log in back.items] == [5, 3]
+        assert back.has_prev
+        first = keyset_paginate(SystemErrorLog.query, SystemErrorLog, per_page=2, before=back.prev_cursor)
+        assert [log.id for log in first.items] == [4, 2]
+        assert not first.has_prev
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import pytest
+from flask_login import login_user, UserMixin
+
+
+class _User(UserMixin):
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+def test_parse_limits():
+    from utils.rate_limit import parse_limits
+    assert parse_limits('grammar=5/10, vocab=7/60,broken') == {'grammar': (5, 10), 'vocab': (7, 60)}
+    assert parse_limits(None) == {}
+
+
+@pytest.mark.parametrize('backend_name', ['memory', 'db'])
+def test_user_and_ip_budgets(make_test_app, monkeypatch, backend_name):
+    from utils import rate_limit
+    backend = rate_limit.MemoryBackend() if backend_name == 'memory' else rate_limit.DatabaseBackend()
+    monkeypatch.setattr(rate_limit, 'backend', backend)
+    monkeypatch.setattr(rate_limit, 'LIMITS', {'grammar': (3, 60), 'other': (3, 60)})
+    monkeypatch.setattr(rate_limit, 'IP_LIMIT_MULTIPLIER', 2)
+    test_app = make_test_app(login=True)
+    now = 6000.0  # ウィンドウの始まり
+
+    with test_app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        login_user(_User(1))
+        for _ in range(3):
+            rate_limit.check('grammar', now=now)
+        with pytest.raises(rate_limit.RateLimitExceeded) as excinfo:
+            rate_limit.check('grammar', now=now)
+        assert excinfo.value.key == 'user:1'
+        # 機能ごとに別の予算
+        rate_limit.check('other', now=now)
+
+    # 同じIPの別ユーザーはユーザーの予算が残っていても、IPの予算（3×2）で止まる
+    with test_app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        login_user(_User(2))
+        for _ in range(3):
+            rate_limit.check('grammar', now=now)
+    with test_app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        login_user(_User(3))
+        with pytest.raises(rate_limit.RateLimitExceeded) as excinfo:
+            rate_limit.check('grammar', now=now)
+        assert excinfo.value.key == 'ip:10.0.0.1'
+
+    # 前のウィンドウの件数は経過に応じて減る
+    with test_app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+        login_user(_User(1))
+        with pytest.raises(rate_limit.RateLimitExceeded):
+            rate_limit.check('grammar', now=now + 61)
+        rate_limit.check('grammar', now=now + 119)
+
+
+def test_background_calls_are_not_limited(monkeypatch):
+    from utils import rate_limit
+    monkeypatch.setattr(rate_limit, 'LIMITS', {'other': (0, 60)})
+    rate_limit.check('other')
+
+
+def test_claude_call_over_budget_is_not_sent(make_test_app, monkeypatch):
+    import claude_helper
+    from utils import rate_limit
+    monkeypatch.setattr(rate_limit, 'backend', rate_limit.MemoryBackend())
+    monkeypatch.setattr(rate_limit, 'LIMITS', {'grammar': (0, 60), 'other': (0, 60)})
+    monkeypatch.setattr(claude_helper.client.messages, 'create',
+                        lambda **kwargs: pytest.fail('over-budget call reached the API'))
+    test_app = make_test_app(login=True)
+
+    with test_app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.3'}):
+        with pytest.raises(claude_helper.LLM_UNAVAILABLE_ERRORS):
+            claude_helper.ask_claude('問題を作って', feature='grammar')
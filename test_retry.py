@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+from types import SimpleNamespace
+
+import pytest
+
+from utils.retry import RetryPolicy, RetryBlockedError, call_with_retry, retry_after_seconds
+
+
+class Transient(Exception):
+    pass
+
+
+class Throttled(Exception):
+    def __init__(self, headers=None):
+        super().__init__('429')
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def test_transient_errors_are_retried_immediately_within_budget():
+    policy = RetryPolicy('test', max_budget=1.0, min_budget_per_second=0.0, budget_ratio=0.0)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise Transient()
+        return 'ok'
+
+    assert call_with_retry(policy, flaky, retryable=(Transient,)) == 'ok'
+    assert len(calls) == 2
+
+    # 予算を使い切った後は再試行せずにすぐ失敗する
+    calls.clear()
+    with pytest.raises(Transient):
+        call_with_retry(policy, flaky, retryable=(Transient,))
+    assert len(calls) == 1
+
+
+def test_throttled_error_blocks_calls_for_retry_after():
+    policy = RetryPolicy('test')
+    calls = []
+
+    def limited():
+        calls.append(1)
+        raise Throttled({'retry-after': '30'})
+
+    with pytest.raises(Throttled):
+        call_with_retry(policy, limited, retryable=(Transient,), throttled=(Throttled,))
+    assert 29 < policy.blocked_for() <= 30
+
+    # ブロック中は呼び出し自体を行わない
+    with pytest.raises(RetryBlockedError) as excinfo:
+        call_with_retry(policy, limited, throttled=(Throttled,))
+    assert excinfo.value.retry_after > 29
+    assert len(calls) == 1
+
+
+def test_retry_after_headers():
+    assert retry_after_seconds(Throttled({'retry-after-ms': '1500'})) == 1.5
+    assert retry_after_seconds(Throttled({'retry-after': '7'})) == 7.0
+    assert retry_after_seconds(Throttled({})) is None
+    assert retry_after_seconds(Exception()) is None
+
+
+def test_cooldown_without_header_is_jittered_and_capped():
+    policy = RetryPolicy('test', default_cooldown=2.0, max_cooldown=60.0)
+    policy.throttled()
+    assert 0.9 < policy.blocked_for() <= 3.0
+    policy.throttled(3600)
+    assert policy.blocked_for() <= 60.0
+
+
+def test_claude_rate_limit_fails_fast_without_sleeping(monkeypatch):
+    import time
+    import anthropic
+    import claude_helper
+
+    monkeypatch.setattr(claude_helper, 'retry_policy', RetryPolicy('claude'))
+    monkeypatch.setattr(time, 'sleep', lambda seconds: pytest.fail('request thread slept'))
+    response = SimpleNamespace(status_code=429, headers={'retry-after': '20'}, request=None)
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        raise anthropic.RateLimitError('rate limited', response=response, body=None)
+
+    monkeypatch.setattr(claude_helper.client.messages, 'create', create)
+    with pytest.raises(anthropic.RateLimitError):
+        claude_helper.ask_claude('問題を作って')
+    with pytest.raises(RetryBlockedError):
+        claude_helper.ask_claude('問題を作って')
+    assert len(calls) == 1
+    assert claude_helper.retry_policy.blocked_for() > 19
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import json
+
+import pytest
+
+
+def test_outbound_spans_are_attached_to_the_request_trace(test_app, tmp_path):
+    from utils import tracing
+    from utils.tracing import trace_span, recent_traces, OTLPFileExporter
+    tracing.init_app(test_app)
+
+    @test_app.route('/lesson')
+    def lesson():
+        with trace_span('google', 'sheets.get') as span:
+            span.set_attribute('http.status_code', 200)
+            span.set_attribute('response.size', 512)
+        with trace_span('google', 'drive.files.list', cache_hit=True):
+            pass
+        with pytest.raises(RuntimeError):
+            with trace_span('claude', 'messages.create'):
+                raise RuntimeError('overloaded')
+        return 'ok'
+
+    assert test_app.test_client().get('/lesson').status_code == 200
+    trace = recent_traces(limit=1)[0]
+    assert trace.name == 'GET lesson'
+    assert trace.attributes['http.status_code'] == 200
+    assert [span.name for span in trace.children] == [
+        'google sheets.get', 'google drive.files.list', 'claude messages.create']
+    assert all(span.trace_id == trace.trace_id and span.parent_id == trace.span_id for span in trace.children)
+    assert trace.children[0].attributes['http.route'] == 'lesson'
+    assert trace.children[2].error == 'RuntimeError: overloaded'
+    # キャッシュヒットは外部API時間に含めない
+    assert set(trace.service_seconds()) == {'google', 'claude'}
+
+    exporter = OTLPFileExporter(str(tmp_path / 'traces.jsonl'), flush_interval=60)
+    exporter.add(trace)
+    assert exporter.flush() == 1
+    exported = json.loads((tmp_path / 'traces.jsonl').read_text())
+    spans = exported['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert len(spans) == 4
+    assert spans[3]['status'] == {'code': 2, 'message': 'RuntimeError: overloaded'}
+    assert {'key': 'cache.hit', 'value': {'boolValue': True}} in spans[2]['attributes']
+    exporter.close()
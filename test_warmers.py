@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import sys
+import os
+sys.path.append('.')
+
+import datetime as dt
+import json
+import time
+
+import google_drive_helper
+
+
+def test_warm_blog_documents_refreshes_before_ttl(monkeypatch):
+    fetches = []
+
+    def fake_get(force=False):
+        fetches.append(force)
+        google_drive_helper._blog_cache.update(data=[], fetched_at=time.time())
+        return []
+
+    monkeypatch.setattr(google_drive_helper, 'get_blog_documents', fake_get)
+    monkeypatch.setattr(google_drive_helper, '_blog_cache', {'data': [], 'fetched_at': time.time()})
+    assert google_drive_helper.warm_blog_documents(60) is False
+
+    google_drive_helper._blog_cache['fetched_at'] -= 120
+    assert google_drive_helper.warm_blog_documents(60) is True
+    assert fetches == [True]
+
+
+def test_daily_quiz_is_built_ahead(monkeypatch, tmp_path):
+    os.environ.setdefault('OPENAI_API_KEY', 'dummy')
+    os.environ.setdefault('SECRET_KEY', 'test')
+    import app
+
+    cache_file = tmp_path / 'quiz.json'
+    yesterday = (dt.date.today() - dt.timedelta(days=1)).isoformat()
+    today = dt.date.today().isoformat()
+    tomorrow = (dt.date.today() + dt.timedelta(days=1)).isoformat()
+    # 旧形式のキャッシュ（前日分）
+    cache_file.write_text(json.dumps({'date': yesterday, 'quiz': {'onomatope': 'old'}}), encoding='utf-8')
+    built = []
+    monkeypatch.setattr(app, 'CACHE_FILE', str(cache_file))
+    monkeypatch.setattr(app, 'build_daily_quiz', lambda date_str: built.append(date_str) or {'onomatope': date_str})
+
+    app.warm_daily_quiz_job()
+    assert built == [today, tomorrow]
+    assert set(json.loads(cache_file.read_text(encoding='utf-8'))['quizzes']) == {today, tomorrow}
+
+    # 作成済みなら、リクエストでも次のウォーマーでも作り直さない
+    assert app.get_today_quiz() == {'onomatope': today}
+    app.warm_daily_quiz_job()
+    assert built == [today, tomorrow]
+
+
+def test_quiz_is_built_once_when_requests_race_the_warmer(monkeypatch, tmp_path):
+    import threading
+    import app
+
+    # import しただけではスケジューラも起動時のジョブもログの書き込みスレッドも動かない
+    assert not app.scheduler.running
+    assert app.flashcard_log_writer._thread is None
+    assert app.error_log_sink._thread is None
+
+    built = []
+
+    def slow_build(date_str):
+        built.append(date_str)
+        time.sleep(0.05)
+        return {'onomatope': date_str}
+
+    monkeypatch.setattr(app, 'CACHE_FILE', str(tmp_path / 'quiz.json'))
+    monkeypatch.setattr(app, 'build_daily_quiz', slow_build)
+    results = []
+    threads = [threading.Thread(target=app.warm_daily_quiz_job)]
+    threads += [threading.Thread(target=lambda: results.append(app.get_today_quiz())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    today = dt.date.today().isoformat()
+    assert results == [{'onomatope': today}] * 4
+    assert built.count(today) == 1
+    assert list(tmp_path.iterdir()) == [tmp_path / 'quiz.json']
@@ -228,6 +228,9 @@ TRANSLATIONS = {
         'words_ready_for_review': 'words ready for review',
         'number_of_cards': 'Number of Cards',
         'card_display_mode': 'Card Display Mode',
+        'new_card_order': 'New Card Order',
+        'order_random': 'Random',
+        'order_list': 'Word list order',
         'front_kanji_reading': 'Front: Kanji + Reading',
         'back_meaning_type': 'Back: Meaning + Type',
         'front_meaning_type': 'Front: Meaning + Type',
@@ -349,7 +352,7 @@ TRANSLATIONS = {
         'youtube_disclaimer_text_3': 'By using this site, you also agree to YouTube\'s <a href="https://www.youtube.com/t/terms" target="_blank" style="color: #1976d2; text-decoration: underline;">Terms of Service</a> and <a href="https://policies.google.com/privacy" target="_blank" style="color: #1976d2; text-decoration: underline;">Privacy Policy</a>. We comply with the YouTube API Developer Policies in implementing embedded content.',
         
         # Error Messages
-        'api_rate_limit_error': 'Too many requests in short time detected. Please wait for more than 2 seconds.',
+        'api_rate_limit_error': 'Too many requests in a short time. Please wait a moment and try again.',
         'api_connection_error': 'Connection error occurred. Please check your internet connection and try again.',
         'database_connection_error': 'Database connection failed. Please try again in a few moments.',
         'service_temporarily_unavailable': 'Service is temporarily unavailable due to high traffic. Please try again later.',
@@ -586,6 +589,9 @@ TRANSLATIONS = {
         'words_ready_for_review': '単語が復習可能です',
         'number_of_cards': 'カード数',
         'card_display_mode': 'カード表示モード',
+        'new_card_order': '新しいカードの順番',
+        'order_random': 'ランダム',
+        'order_list': '単語リスト順',
         'front_kanji_reading': '表：漢字 + 読み',
         'back_meaning_type': '裏：意味 + 品詞',
         'front_meaning_type': '表：意味 + 品詞',
@@ -707,7 +713,7 @@ TRANSLATIONS = {
         'youtube_disclaimer_text_3': 'また、当サイトを使用することにより、ユーザーは YouTube の<a href="https://www.youtube.com/t/terms" target="_blank" style="color: #1976d2; text-decoration: underline;">利用規約</a>および<a href="https://policies.google.com/privacy" target="_blank" style="color: #1976d2; text-decoration: underline;">プライバシーポリシー</a>に同意したものとみなされます。当サイトにおける YouTube API の利用については、Google の Developer Policies を遵守しています。',
         
         # エラーメッセージ
-        'api_rate_limit_error': '文章の生成は最短2秒毎です。2秒以上待ってから再度生成してください。',
+        'api_rate_limit_error': '短時間にリクエストが集中しています。しばらく待ってから再度お試しください。',
         'api_connection_error': '接続エラーが発生しました。インターネット接続を確認して再度お試しください。',
         'database_connection_error': 'データベース接続に失敗しました。しばらくしてから再度お試しください。',
         'service_temporarily_unavailable': 'アクセスが集中しているため、サービスが一時的に利用できません。後でもう一度お試しください。',
@@ -934,6 +940,9 @@ TRANSLATIONS = {
         'words_ready_for_review': 'palabras listas para revisar',
         'number_of_cards': 'Número de tarjetas',
         'card_display_mode': 'Modo de visualización de tarjetas',
+        'new_card_order': 'Orden de tarjetas nuevas',
+        'order_random': 'Aleatorio',
+        'order_list': 'Orden de la lista de palabras',
         'front_kanji_reading': 'Frente: Kanji + Lectura',
         'back_meaning_type': 'Atrás: Significado + Tipo',
         'front_meaning_type': 'Frente: Significado + Tipo',
@@ -0,0 +1,212 @@
+"""
+ログテーブル用のバッファ付き一括INSERTライター
+
+リクエスト処理中は行をメモリに溜めるだけにし、バックグラウンドスレッドが
+件数（flush_size）または時間（flush_interval秒）で一括INSERTする。
+DBへの書き込みに失敗した場合やバッファがあふれた場合は、spill_path が
+設定されていればローカルの追記専用ファイル（JSON Lines）に退避し、
+次に書き込みが成功したときにDBへ再投入する。プロセス終了時には残りを書き出す。
+スレッドは init_app ではなく start() で開始する。
+
+DBには接続できるのに一括INSERTが失敗した場合は、制約違反などの不正な行が
+混ざっているとみなして1行ずつ書き込む。失敗した行だけを次回また試し、
+max_attempts 回失敗したら内容をログに出して捨てる（後続の行を止めないため）。
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import has_app_context
+from sqlalchemy import DateTime, insert, text
+
+
+class BufferedInsertWriter:
+    def __init__(self, model, flush_size=50, flush_interval=2.0, max_buffer=5000, spill_path=None,
+                 max_attempts=3):
+        self.model = model
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.spill_path = spill_path
+        self.max_attempts = max_attempts
+        self.app = None
+        self._buffer = []
+        self._retries = []  # 1行ずつの書き込みに失敗した行: (row, 失敗回数)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._datetime_columns = {
+            column.name for column in model.__table__.columns
+            if isinstance(column.type, DateTime)
+        }
+
+    def init_app(self, app):
+        """アプリを設定し、終了時の書き出しを登録（スレッドは start() で開始する）"""
+        if self.app is None:
+            atexit.register(self.close)
+        self.app = app
+
+    def start(self):
+        """バックグラウンドでの書き出しを開始
+
+        import 時には開始しない（migrations.py やテストが app を import してもスレッドが立たないように）。
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name=f'{self.model.__tablename__}-writer', daemon=True)
+            self._thread.start()
+
+    def add(self, row):
+        """1行をバッファに追加"""
+        self.add_many([row])
+
+    def add_many(self, rows):
+        """複数行をバッファに追加（DBには書き込まない）"""
+        overflow = []
+        with self._lock:
+            self._buffer.extend(rows)
+            if len(self._buffer) > self.max_buffer:
+                overflow = self._buffer[:-self.max_buffer]
+                self._buffer = self._buffer[-self.max_buffer:]
+            should_flush = len(self._buffer) >= self.flush_size
+        if overflow:
+            self._spill(overflow)
+        if should_flush:
+            self._wakeup.set()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._buffer) + len(self._retries)
+
+    def flush(self):
+        """バッファの内容をDBへ一括INSERTし、書き込んだ件数を返す"""
+        if has_app_context():
+            return self._flush()
+        if self.app is None:
+            return 0
+        with self.app.app_context():
+            return self._flush()
+
+    def close(self):
+        """スレッドを止めて残りを書き出す"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Buffered writer error ({self.model.__tablename__}): {e}")
+
+    def _flush(self):
+        from models import db
+
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+                entries, self._retries = self._retries, []
+            entries += [(row, 0) for row in rows]
+            if not entries:
+                return 0
+            try:
+                self._insert(db, [row for row, _ in entries])
+                written = len(entries)
+            except Exception as e:
+                print(f"Failed to write {len(entries)} rows to {self.model.__tablename__}: {e}")
+                if not self._database_available(db):
+                    self._keep(entries)
+                    return 0
+                # DBには書けるので、不正な行が混ざっている。1行ずつ書いて残りを止めない
+                written = self._insert_each(db, entries)
+            self._replay_spill(db)
+            return written
+
+    def _insert(self, db, rows):
+        with db.engine.begin() as conn:
+            conn.execute(insert(self.model.__table__), rows)
+
+    @staticmethod
+    def _database_available(db):
+        try:
+            with db.engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            return True
+        except Exception:
+            return False
+
+    def _keep(self, entries):
+        """DBに接続できない間の行を退避（退避先が無ければバッファに戻して次回再試行）"""
+        if self.spill_path:
+            self._spill([row for row, _ in entries])
+            return
+        with self._lock:
+            self._retries = (entries + self._retries)[-self.max_buffer:]
+
+    def _insert_each(self, db, entries):
+        """1行ずつ書き込み、書けた件数を返す（max_attempts 回失敗した行はログに出して捨てる）"""
+        written = 0
+        failed = []
+        for row, attempts in entries:
+            try:
+                self._insert(db, [row])
+                written += 1
+            except Exception as e:
+                if attempts + 1 >= self.max_attempts:
+                    print(f"Dropped a {self.model.__tablename__} row after {attempts + 1} failed writes: {e} {row!r}")
+                else:
+                    failed.append((row, attempts + 1))
+        if failed:
+            with self._lock:
+                self._retries = (failed + self._retries)[-self.max_buffer:]
+        return written
+
+    def _spill(self, rows):
+        """書き込めなかった行を追記専用ファイルに退避"""
+        if not self.spill_path:
+            print(f"Dropped {len(rows)} buffered rows for {self.model.__tablename__}")
+            return
+        spill_dir = os.path.dirname(self.spill_path)
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        with self._lock, open(self.spill_path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, default=lambda v: v.isoformat(), ensure_ascii=False) + '\n')
+
+    def _replay_spill(self, db):
+        """退避ファイルの行をDBへ再投入"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        replay_path = f'{self.spill_path}.{int(time.time())}.replay'
+        with self._lock:
+            os.replace(self.spill_path, replay_path)
+        with open(replay_path, encoding='utf-8') as f:
+            rows = [self._decode(json.loads(line)) for line in f if line.strip()]
+        for start in range(0, len(rows), 1000):
+            chunk = rows[start:start + 1000]
+            try:
+                self._insert(db, chunk)
+            except Exception as e:
+                print(f"Failed to replay spilled rows for {self.model.__tablename__}: {e}")
+                if not self._database_available(db):
+                    self._spill(rows[start:])
+                    break
+                self._insert_each(db, [(row, 0) for row in chunk])
+        os.remove(replay_path)
+
+    def _decode(self, row):
+        for column in self._datetime_columns:
+            if isinstance(row.get(column), str):
+                row[column] = datetime.fromisoformat(row[column])
+        return row
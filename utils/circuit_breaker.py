@@ -0,0 +1,90 @@
+"""
+外部APIのサーキットブレーカー
+
+連続して failure_threshold 回失敗すると open になり、reset_timeout 秒の間は呼び出しを
+送らずに CircuitOpenError ですぐ失敗させる（タイムアウトまで待つリクエストを増やさない）。
+時間が経つと half_open になり、1件だけ試しに通す。成功すれば closed に戻り、
+失敗すればまた open になる。
+
+allow() は試しの1件にだけトークンを返す（それ以外はNone）。呼び出し側は結果を
+record_success / record_failure / release に同じトークンを渡して報告し、
+試しの枠はそのトークンの持ち主だけが戻せる。
+"""
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """サーキットが open のため呼び出しを行わなかった"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"circuit {name} is open for another {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe = None  # half_open で通した試しの1件のトークン
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probe = None
+        return self._state
+
+    def allow(self):
+        """呼び出してよければトークン（試しの1件ならobject、それ以外はNone）を返し、
+        だめなら CircuitOpenError を送出する
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return None
+            if state == HALF_OPEN and self._probe is None:
+                # 試しの1件だけ通す
+                self._probe = object()
+                return self._probe
+            retry_after = max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+        raise CircuitOpenError(self.name, retry_after)
+
+    def _end_probe(self, token):
+        # 試しの枠の持ち主のときだけ戻す（ほかの呼び出しの結果で2件目を通さないように）
+        if token is not None and token is self._probe:
+            self._probe = None
+
+    def record_success(self, token=None):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._end_probe(token)
+
+    def record_failure(self, token=None):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._end_probe(token)
+
+    def release(self, token=None):
+        """成功・失敗のどちらでもない終わり方（呼び出し側のエラーなど）で試しの枠を戻す"""
+        with self._lock:
+            self._end_probe(token)
@@ -0,0 +1,64 @@
+"""
+同時実行数の適応的な上限（AIMD）
+
+外部APIへの同時呼び出し数を limit までに抑える。上限に達したときは待たずに
+ConcurrencyLimitExceeded を送出し、ワーカースレッドを塞がない。
+
+- 目標時間内に成功するたびに limit を 1/limit ずつ増やす（加算的増加）
+- レート制限・過負荷・タイムアウト、または目標時間を超えた応答で limit を backoff 倍にする（乗算的減少）
+
+API側が遅くなったり制限をかけたりすると同時呼び出し数が自動的に下がり、
+回復すると少しずつ戻る。
+"""
+
+import threading
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """同時実行数の上限に達したため呼び出しを行わなかった"""
+
+    def __init__(self, name, limit):
+        super().__init__(f"{name} concurrency limit {limit} reached")
+        self.name = name
+        self.limit = limit
+
+
+class AIMDLimiter:
+    def __init__(self, name, initial_limit=4, min_limit=1, max_limit=16, backoff=0.5, latency_target=30.0):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        """枠を1つ取る（空きが無ければ ConcurrencyLimitExceeded）"""
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                raise ConcurrencyLimitExceeded(self.name, int(self._limit))
+            self._in_flight += 1
+
+    def release(self, seconds=None, dropped=False):
+        """枠を返し、結果に応じて上限を調整する
+
+        dropped: レート制限・過負荷・タイムアウトなど、API側の混雑を示す失敗だったか
+        seconds: 成功した呼び出しの所要時間（None なら上限を変えない）
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if dropped or (seconds is not None and seconds > self.latency_target):
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+            elif seconds is not None and self._in_flight + 1 >= int(self._limit):
+                # 上限いっぱいまで使われているときだけ増やす
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
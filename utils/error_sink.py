@@ -0,0 +1,77 @@
+"""
+SystemErrorLog 用の非同期エラーシンク
+
+BufferedInsertWriter に重複の集約を加えたもの。同じエラー（種別・機能・パス・
+メッセージ先頭）が dedup_window 秒以内に繰り返された場合、最初の1件だけを
+すぐに書き込み、残りはウィンドウの終わりに occurrences を持つ1行にまとめる。
+API障害中に大量のリクエストが同じエラーを出しても、DBへの書き込みは
+ウィンドウごとに最大2行に抑えられる。
+"""
+
+import threading
+import time
+
+from utils.buffered_writer import BufferedInsertWriter
+
+# 同一エラーとみなすメッセージの先頭文字数
+DEDUP_MESSAGE_LENGTH = 200
+
+# 集約中のエラー種類の上限（超えた分は集約せずにそのまま書き込む）
+MAX_WINDOWS = 1000
+
+
+class ErrorLogSink(BufferedInsertWriter):
+    def __init__(self, model, dedup_window=60.0, **kwargs):
+        super().__init__(model, **kwargs)
+        self.dedup_window = dedup_window
+        self._windows = {}  # key -> {'expires_at', 'row', 'repeats'}
+        self._windows_lock = threading.Lock()
+
+    @staticmethod
+    def _key(row):
+        message = (row.get('error_message') or '')[:DEDUP_MESSAGE_LENGTH]
+        return row.get('error_type'), row.get('feature'), row.get('request_path'), message
+
+    def add(self, row):
+        """エラー1件を記録（同じエラーがウィンドウ内に既にあれば件数だけ数える）"""
+        now = time.monotonic()
+        key = self._key(row)
+        rows = []
+        with self._windows_lock:
+            window = self._windows.pop(key, None)
+            if window is not None:
+                if window['expires_at'] > now:
+                    window['repeats'] += 1
+                    window['row'] = row
+                    self._windows[key] = window
+                    return
+                # 終わったのにまだ書き出していないウィンドウは、置き換える前に繰り返し分を書く
+                if window['repeats']:
+                    rows.append(dict(window['row'], occurrences=window['repeats']))
+            if len(self._windows) < MAX_WINDOWS:
+                self._windows[key] = {'expires_at': now + self.dedup_window, 'row': row, 'repeats': 0}
+        rows.append(row)
+        self.add_many(rows)
+        self._emit_expired(now)
+
+    def _emit_expired(self, now=None):
+        """終わったウィンドウの繰り返し分を1行にまとめてバッファへ"""
+        now = time.monotonic() if now is None else now
+        collapsed = []
+        with self._windows_lock:
+            for key, window in list(self._windows.items()):
+                if window['expires_at'] <= now:
+                    del self._windows[key]
+                    if window['repeats']:
+                        collapsed.append(dict(window['row'], occurrences=window['repeats']))
+        if collapsed:
+            self.add_many(collapsed)
+
+    def close(self):
+        # 終了時はウィンドウの途中でも繰り返し分を書き出す
+        self._emit_expired(now=float('inf'))
+        super().close()
+
+    def _flush(self):
+        self._emit_expired()
+        return super()._flush()
@@ -0,0 +1,27 @@
+"""
+LLMが使えないときの代替結果のプール
+
+正常に生成できたクイズや例文をキー（レベルなど）ごとに直近 maxlen 件だけ保持し、
+サーキットブレーカーが開いている間などはその中からランダムに1件返す。
+"""
+
+import random
+import threading
+from collections import deque
+
+
+class FallbackPool:
+    def __init__(self, maxlen=20):
+        self.maxlen = maxlen
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, value):
+        with self._lock:
+            self._items.setdefault(key, deque(maxlen=self.maxlen)).append(value)
+
+    def pick(self, key):
+        """保持している結果から1件（無ければNone）"""
+        with self._lock:
+            items = self._items.get(key)
+            return random.choice(items) if items else None
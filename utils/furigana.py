@@ -1,5 +1,3 @@
-import time
-
 from claude_helper import ask_claude
 
 # Claudeを使用してひらがな読みを生成
@@ -7,15 +5,12 @@ FURIGANA_AVAILABLE = True
 
 # キャッシュとレート制限対策
 _furigana_cache = {}  # Cleared for new prompt
-_last_request_time = 0
 
 def text_to_ruby_html(text):
     """
     Convert Japanese text with hiragana reading in parentheses using Claude.
     Format: 元の文（ひらがなのよみ）
     """
-    global _last_request_time
-    
     if not text or not text.strip():
         return text
     
@@ -24,13 +19,6 @@ def text_to_ruby_html(text):
         return _furigana_cache[text]
     
     try:
-        # レート制限対策：前回のリクエストから3秒待つ
-        current_time = time.time()
-        time_since_last = current_time - _last_request_time
-        if time_since_last < 3:
-            sleep_time = 3 - time_since_last
-            time.sleep(sleep_time)
-            
         # 最もシンプルなプロンプト
         prompt = f"""この日本語文の後ろに全文のひらがな読みを（）で追加してください:
 
@@ -41,12 +29,11 @@ def text_to_ruby_html(text):
 結果:"""
 
         try:
-            result = ask_claude(prompt, max_tokens=300)
+            result = ask_claude(prompt, max_tokens=300, feature='furigana')
         except Exception as e:
+            # レート制限中は claude_helper がすぐに例外を返すので、待たずに読みなしで表示する
             return text
         
-        _last_request_time = time.time()
-        
         # 結果を清浄化
         if result:
             result = result.strip()
@@ -0,0 +1,321 @@
+"""
+リクエスト単位のパフォーマンス計測
+
+- エンドポイントごとのレイテンシをHDR風の対数-線形バケットのヒストグラムに記録
+- リクエスト中のDBクエリ数と所要時間（SQLAlchemyのイベント）
+- 外部API呼び出しの所要時間（Claude / Google、utils.latency 経由）
+
+記録はスレッドごとのアキュムレータに対して行い、collect() が各スレッドの
+アキュムレータを新しいものと差し替えて回収する。記録と差し替えはスレッドごとの
+ロックで守る（ロックを取り合うのは回収の瞬間だけ）。回収した値は
+Prometheus形式の /metrics（起動からの累計）と、metrics_rollup の定期ジョブが
+SystemMetrics に書き込む期間ごとの値の両方に使う。
+"""
+
+import bisect
+import hmac
+import ipaddress
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+from flask import Response, abort, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# 1ms〜約65秒を2倍ごとの区間に分け、各区間を4等分したバケット境界（秒）
+SUB_BUCKETS = 4
+LATENCY_BUCKETS = tuple(
+    round(0.001 * 2 ** octave * (1 + step / SUB_BUCKETS), 6)
+    for octave in range(16) for step in range(SUB_BUCKETS)
+)
+
+# リクエスト外（スケジューラのジョブなど）の記録先
+BACKGROUND_ENDPOINT = '<background>'
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for i, value in enumerate(other.counts):
+            self.counts[i] += value
+        self.total += other.total
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentile(self, pct):
+        """pct パーセンタイルが入るバケットの上限（最後のバケットなら最大値）"""
+        if not self.count:
+            return None
+        rank = max(1, pct / 100 * self.count)
+        cumulative = 0
+        for i, value in enumerate(self.counts):
+            cumulative += value
+            if cumulative >= rank:
+                return min(LATENCY_BUCKETS[i], self.max) if i < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+
+class _Accumulator:
+    """1スレッド・1回収期間ぶんの計測値"""
+
+    def __init__(self):
+        self.requests = defaultdict(Histogram)      # (endpoint, method) -> Histogram
+        self.statuses = defaultdict(int)            # (endpoint, method, status) -> 件数
+        self.db_queries = defaultdict(int)          # endpoint -> クエリ数
+        self.db_seconds = defaultdict(float)        # endpoint -> 秒
+        self.outbound = defaultdict(Histogram)      # service -> Histogram
+        self.outbound_seconds = defaultdict(float)  # (endpoint, service) -> 秒
+
+    def merge(self, other):
+        for key, histogram in other.requests.items():
+            self.requests[key].merge(histogram)
+        for key, histogram in other.outbound.items():
+            self.outbound[key].merge(histogram)
+        for name in ('statuses', 'db_queries', 'db_seconds', 'outbound_seconds'):
+            target = getattr(self, name)
+            for key, value in getattr(other, name).items():
+                target[key] += value
+
+
+class _ThreadSlot:
+    __slots__ = ('thread', 'accumulator', 'lock')
+
+    def __init__(self):
+        self.thread = weakref.ref(threading.current_thread())
+        self.accumulator = _Accumulator()
+        self.lock = threading.Lock()
+
+
+_local = threading.local()
+_slots = []
+_slots_lock = threading.Lock()
+_collect_lock = threading.Lock()
+_totals = _Accumulator()
+_interval = _Accumulator()
+
+
+def _slot():
+    slot = getattr(_local, 'slot', None)
+    if slot is None:
+        slot = _local.slot = _ThreadSlot()
+        with _slots_lock:
+            _slots.append(slot)
+    return slot
+
+
+def _current_endpoint():
+    return getattr(_local, 'endpoint', None) or BACKGROUND_ENDPOINT
+
+
+def record_db_query(seconds):
+    endpoint = _current_endpoint()
+    slot = _slot()
+    with slot.lock:
+        slot.accumulator.db_queries[endpoint] += 1
+        slot.accumulator.db_seconds[endpoint] += seconds
+
+
+def record_outbound(service, seconds):
+    """外部API（'claude', 'google'）の呼び出し1回分を記録"""
+    endpoint = _current_endpoint()
+    slot = _slot()
+    with slot.lock:
+        slot.accumulator.outbound[service].observe(seconds)
+        slot.accumulator.outbound_seconds[(endpoint, service)] += seconds
+
+
+def collect():
+    """各スレッドの計測値を回収して累計と期間集計に加える"""
+    with _collect_lock:
+        with _slots_lock:
+            slots = list(_slots)
+        for slot in slots:
+            # 終了の判定は回収より先に行う（回収後に最後の記録をして終了したスレッドの値を捨てないように）
+            thread = slot.thread()
+            finished = thread is None or not thread.is_alive()
+            # 差し替え後は所有スレッドが drained に触れないので、ロックの外で合算できる
+            with slot.lock:
+                drained, slot.accumulator = slot.accumulator, _Accumulator()
+            _totals.merge(drained)
+            _interval.merge(drained)
+            if finished:
+                with _slots_lock:
+                    _slots.remove(slot)
+
+
+def drain_interval():
+    """前回の drain_interval() 以降の計測値を返してリセット"""
+    global _interval
+    collect()
+    with _collect_lock:
+        drained, _interval = _interval, _Accumulator()
+    return drained
+
+
+# --- SQLAlchemy ---
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started_at')
+    if started:
+        record_db_query(time.perf_counter() - started.pop())
+
+
+# --- Flask ---
+
+def _start_request():
+    _local.endpoint = request.endpoint or '<unmatched>'
+    g.instrumentation_started_at = time.perf_counter()
+
+
+def _record_request(status):
+    started = g.pop('instrumentation_started_at', None)
+    if started is None:
+        return
+    key = (_local.endpoint, request.method)
+    elapsed = time.perf_counter() - started
+    slot = _slot()
+    with slot.lock:
+        slot.accumulator.requests[key].observe(elapsed)
+        slot.accumulator.statuses[(*key, status)] += 1
+
+
+def _finish_request(response):
+    _record_request(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    # after_request が呼ばれずに終わった（例外）リクエスト
+    _record_request(500)
+    _local.endpoint = None
+
+
+def _is_local_request():
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+
+def metrics_view():
+    """Prometheus形式のメトリクス（ローカルか METRICS_TOKEN のBearer認証のみ）"""
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(authorization, f'Bearer {METRICS_TOKEN}')
+    if not (token_ok or _is_local_request()):
+        abort(404)
+    collect()
+    with _collect_lock:
+        body = render_prometheus(_totals)
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+# --- Prometheus テキスト形式 ---
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, histogram, **labels):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {histogram.count}')
+    lines.append(f'{name}_sum{_labels(**labels)} {histogram.total}')
+    lines.append(f'{name}_count{_labels(**labels)} {histogram.count}')
+    return lines
+
+
+def render_prometheus(accumulator):
+    lines = ['# HELP http_request_duration_seconds Request latency by endpoint',
+             '# TYPE http_request_duration_seconds histogram']
+    for (endpoint, method), histogram in sorted(accumulator.requests.items()):
+        lines += _histogram_lines('http_request_duration_seconds', histogram, endpoint=endpoint, method=method)
+
+    lines += ['# HELP http_requests_total Requests by endpoint and status',
+              '# TYPE http_requests_total counter']
+    for (endpoint, method, status), count in sorted(accumulator.statuses.items()):
+        lines.append(f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    lines += ['# HELP db_queries_total Database queries by endpoint',
+              '# TYPE db_queries_total counter']
+    for endpoint, count in sorted(accumulator.db_queries.items()):
+        lines.append(f'db_queries_total{_labels(endpoint=endpoint)} {count}')
+    lines += ['# HELP db_query_seconds_total Time spent in database queries by endpoint',
+              '# TYPE db_query_seconds_total counter']
+    for endpoint, seconds in sorted(accumulator.db_seconds.items()):
+        lines.append(f'db_query_seconds_total{_labels(endpoint=endpoint)} {seconds}')
+
+    lines += ['# HELP outbound_request_duration_seconds External API latency by service',
+              '# TYPE outbound_request_duration_seconds histogram']
+    for service, histogram in sorted(accumulator.outbound.items()):
+        lines += _histogram_lines('outbound_request_duration_seconds', histogram, service=service)
+    lines += ['# HELP outbound_seconds_total Time spent in external APIs by endpoint and service',
+              '# TYPE outbound_seconds_total counter']
+    for (endpoint, service), seconds in sorted(accumulator.outbound_seconds.items()):
+        lines.append(f'outbound_seconds_total{_labels(endpoint=endpoint, service=service)} {seconds}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- SystemMetrics 用 ---
+
+def interval_metrics(accumulator, percentiles=(50, 95, 99)):
+    """期間の計測値を metric_type -> 値 の dict にする"""
+    metrics = {}
+    by_endpoint = defaultdict(Histogram)
+    for (endpoint, method), histogram in accumulator.requests.items():
+        by_endpoint[endpoint].merge(histogram)
+    for endpoint, histogram in by_endpoint.items():
+        metrics[f'requests:{endpoint}'] = histogram.count
+        for pct in percentiles:
+            metrics[f'request_latency_p{pct}:{endpoint}'] = histogram.percentile(pct)
+        if accumulator.db_queries.get(endpoint):
+            metrics[f'db_queries_per_request:{endpoint}'] = accumulator.db_queries[endpoint] / histogram.count
+            metrics[f'db_seconds_per_request:{endpoint}'] = accumulator.db_seconds[endpoint] / histogram.count
+    for (endpoint, service), seconds in accumulator.outbound_seconds.items():
+        requests_count = by_endpoint[endpoint].count if endpoint in by_endpoint else 0
+        if requests_count:
+            metrics[f'{service}_seconds_per_request:{endpoint}'] = seconds / requests_count
+    server_errors = sum(count for (_, _, status), count in accumulator.statuses.items() if status >= 500)
+    total_requests = sum(accumulator.statuses.values())
+    if total_requests:
+        metrics['http_requests'] = total_requests
+        metrics['http_5xx_rate'] = server_errors / total_requests
+    return metrics
@@ -0,0 +1,47 @@
+"""
+外部API呼び出しのレイテンシ記録
+
+呼び出し側は record_latency() で所要時間を記録するだけにし、
+metrics_rollup の定期ジョブが drain_samples() でまとめて回収して
+パーセンタイルを SystemMetrics に書き込む。同じ値はリクエスト計測
+（utils.instrumentation）のエンドポイント別の外部API時間にも加算される。
+"""
+
+import math
+import threading
+from collections import defaultdict
+
+from utils.instrumentation import record_outbound
+
+# 集計ジョブが止まっていてもメモリを使い過ぎないよう、サービスごとに保持する上限
+MAX_SAMPLES = 5000
+
+_samples = defaultdict(list)
+_lock = threading.Lock()
+
+
+def record_latency(service, seconds):
+    """service（'claude', 'google' など）の呼び出し1回分の所要時間を記録"""
+    record_outbound(service, seconds)
+    with _lock:
+        samples = _samples[service]
+        samples.append(seconds)
+        if len(samples) > MAX_SAMPLES:
+            del samples[:len(samples) - MAX_SAMPLES]
+
+
+def drain_samples():
+    """記録済みのサンプルを取り出して空にする"""
+    global _samples
+    with _lock:
+        drained, _samples = _samples, defaultdict(list)
+    return dict(drained)
+
+
+def percentile(values, pct):
+    """最近傍法によるパーセンタイル（values が空なら None）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
@@ -0,0 +1,134 @@
+"""
+LLM呼び出しのトークン数・コスト・レイテンシの集計
+
+claude_helper が1回の呼び出しごとに usage_store.record() を呼び、機能（vocab, grammar,
+furigana, akinator など）・呼び出し元ルート・プロンプトの大きさごとにメモリ上で加算する。
+APIに送らずに断った呼び出しは record_rejection() で機能別に拒否数として数える。
+metrics_rollup の定期ジョブが drain() で回収して SystemMetrics に書き込み、
+/admin/llm-usage はその集計行を表示する。
+
+コストは LLM_INPUT_PRICE_PER_MTOK / LLM_OUTPUT_PRICE_PER_MTOK（100万トークンあたりのUSD）で
+計算する。キャッシュ読み出し・書き込みのトークンは入力単価にそれぞれ0.1倍・1.25倍を掛ける。
+"""
+
+import bisect
+import os
+import threading
+from collections import defaultdict
+
+INPUT_PRICE_PER_MTOK = float(os.getenv('LLM_INPUT_PRICE_PER_MTOK', '3.0'))
+OUTPUT_PRICE_PER_MTOK = float(os.getenv('LLM_OUTPUT_PRICE_PER_MTOK', '15.0'))
+CACHE_READ_PRICE_FACTOR = 0.1
+CACHE_WRITE_PRICE_FACTOR = 1.25
+
+# プロンプトの大きさとレイテンシの関係を見るための入力トークン数の区切り
+PROMPT_SIZE_BUCKETS = (256, 512, 1024, 2048, 4096)
+
+
+def prompt_size_label(input_tokens):
+    index = bisect.bisect_right(PROMPT_SIZE_BUCKETS, input_tokens)
+    if index == len(PROMPT_SIZE_BUCKETS):
+        return f'{PROMPT_SIZE_BUCKETS[-1]}+'
+    return f'<{PROMPT_SIZE_BUCKETS[index]}'
+
+
+def estimate_cost(input_tokens, output_tokens, cache_read_tokens=0, cache_write_tokens=0):
+    """USD単位の概算コスト"""
+    return (input_tokens * INPUT_PRICE_PER_MTOK
+            + cache_read_tokens * INPUT_PRICE_PER_MTOK * CACHE_READ_PRICE_FACTOR
+            + cache_write_tokens * INPUT_PRICE_PER_MTOK * CACHE_WRITE_PRICE_FACTOR
+            + output_tokens * OUTPUT_PRICE_PER_MTOK) / 1_000_000
+
+
+class UsageTotals:
+    __slots__ = ('calls', 'errors', 'rejected', 'input_tokens', 'output_tokens', 'cache_read_tokens',
+                 'cache_write_tokens', 'cost', 'seconds', 'requests')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        # APIに送らずに断った呼び出し（サーキットブレーカー・同時実行数・レート制限など）
+        self.rejected = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.cost = 0.0
+        self.seconds = 0.0
+        # LLMを呼び出したHTTPリクエストの数（ルート別の集計でのみ使う）
+        self.requests = 0
+
+    @property
+    def total_tokens(self):
+        return self.input_tokens + self.output_tokens + self.cache_read_tokens + self.cache_write_tokens
+
+
+class UsageStore:
+    """機能別・ルート別・プロンプトサイズ別のLLM使用量"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.by_feature = defaultdict(UsageTotals)      # feature -> UsageTotals
+        self.by_route = defaultdict(UsageTotals)        # route -> UsageTotals
+        self.by_prompt_size = defaultdict(UsageTotals)  # prompt_size_label -> UsageTotals
+
+    def record(self, feature, route, seconds, usage=None, new_request=False, error=False):
+        input_tokens = getattr(usage, 'input_tokens', 0) or 0
+        output_tokens = getattr(usage, 'output_tokens', 0) or 0
+        cache_read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        cache_write = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        cost = estimate_cost(input_tokens, output_tokens, cache_read, cache_write)
+        with self._lock:
+            targets = [self.by_feature[feature], self.by_route[route]]
+            if usage is not None:
+                targets.append(self.by_prompt_size[prompt_size_label(input_tokens + cache_read + cache_write)])
+            for totals in targets:
+                totals.calls += 1
+                totals.errors += int(error)
+                totals.input_tokens += input_tokens
+                totals.output_tokens += output_tokens
+                totals.cache_read_tokens += cache_read
+                totals.cache_write_tokens += cache_write
+                totals.cost += cost
+                totals.seconds += seconds
+            if new_request:
+                self.by_route[route].requests += 1
+
+    def record_rejection(self, feature):
+        """APIに送らずに断った呼び出しを数える（呼び出し数・エラー数・レイテンシには含めない）"""
+        with self._lock:
+            self.by_feature[feature].rejected += 1
+
+    def drain(self):
+        """集計済みの値を取り出してリセット"""
+        with self._lock:
+            drained = (self.by_feature, self.by_route, self.by_prompt_size)
+            self._reset()
+        return drained
+
+
+usage_store = UsageStore()
+
+
+def usage_metrics(drained):
+    """drain() の結果を SystemMetrics 用の metric_type -> 値 にする"""
+    by_feature, by_route, by_prompt_size = drained
+    metrics = {}
+    for feature, totals in by_feature.items():
+        metrics[f'llm_calls:{feature}'] = totals.calls
+        metrics[f'llm_errors:{feature}'] = totals.errors
+        metrics[f'llm_rejected:{feature}'] = totals.rejected
+        metrics[f'llm_input_tokens:{feature}'] = totals.input_tokens + totals.cache_read_tokens + totals.cache_write_tokens
+        metrics[f'llm_output_tokens:{feature}'] = totals.output_tokens
+        metrics[f'llm_cost_usd:{feature}'] = totals.cost
+        metrics[f'llm_seconds:{feature}'] = totals.seconds
+    for route, totals in by_route.items():
+        metrics[f'llm_requests:{route}'] = totals.requests
+        metrics[f'llm_route_tokens:{route}'] = totals.total_tokens
+    for label, totals in by_prompt_size.items():
+        metrics[f'llm_prompt_calls:{label}'] = totals.calls
+        metrics[f'llm_prompt_seconds:{label}'] = totals.seconds
+    return metrics
@@ -0,0 +1,141 @@
+"""
+(created_at, id) によるキーセットページネーション
+
+OFFSETとCOUNT(*)を使わず、前ページ最後の行の (created_at, id) より後ろを
+インデックスで直接読むため、深いページでも1ページ目と同じコストで表示できる。
+カーソルは URL の after / before パラメータで受け渡す。
+
+created_at が NULL の行は最後（id の降順）に並べる。NULL の行は別のクエリで読み、
+日時のある行は created_at のインデックスをそのまま使えるようにしている。
+"""
+
+from datetime import datetime
+
+from sqlalchemy import and_, or_, func, text
+
+
+class KeysetPage:
+    def __init__(self, items, has_next, has_prev, next_cursor, prev_cursor, total=None, total_is_estimate=False):
+        self.items = items
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+
+def encode_cursor(row):
+    """行の (created_at, id) をURL用のカーソル文字列にする"""
+    created_at = row.created_at.isoformat() if row.created_at else ''
+    return f'{created_at}_{row.id}'
+
+
+def decode_cursor(cursor):
+    """カーソル文字列を (created_at, id) に戻す（不正な値ならNone）"""
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = cursor.rsplit('_', 1)
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except ValueError:
+        return None
+
+
+def _older_than(model, created_at, row_id):
+    return or_(model.created_at < created_at,
+               and_(model.created_at == created_at, model.id < row_id))
+
+
+def _newer_than(model, created_at, row_id):
+    return or_(model.created_at > created_at,
+               and_(model.created_at == created_at, model.id > row_id))
+
+
+def _dated_rows(query, model, ascending):
+    query = query.filter(model.created_at.isnot(None))
+    if ascending:
+        return query.order_by(model.created_at.asc(), model.id.asc())
+    return query.order_by(model.created_at.desc(), model.id.desc())
+
+
+def _undated_rows(query, model, ascending):
+    query = query.filter(model.created_at.is_(None))
+    return query.order_by(model.id.asc() if ascending else model.id.desc())
+
+
+def _fetch(queries, limit):
+    """並び順につながる queries を順に読み、合わせて limit 行まで返す"""
+    rows = []
+    for query in queries:
+        if len(rows) >= limit:
+            break
+        rows += query.limit(limit - len(rows)).all()
+    return rows
+
+
+def estimate_count(model):
+    """テーブル全体の件数の概算
+
+    PostgreSQLは統計情報（パーティションは子テーブルの合計）を使い、
+    統計が無い場合やSQLiteでは COUNT で数える。
+    """
+    from models import db
+
+    if db.engine.dialect.name == 'postgresql':
+        estimate = db.session.execute(text(
+            "SELECT sum(c.reltuples) FROM pg_class c "
+            "WHERE c.relname = :name OR c.oid IN ("
+            "  SELECT i.inhrelid FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhparent "
+            "  WHERE p.relname = :name)"), {'name': model.__tablename__}).scalar()
+        if estimate and estimate > 0:
+            return int(estimate), True
+    return db.session.query(func.count(model.id)).scalar(), False
+
+
+def keyset_paginate(query, model, per_page=20, after=None, before=None, with_total=False):
+    """query を (created_at, id) の降順でページ分割して KeysetPage を返す
+
+    after: このカーソルより古い行（次のページ）
+    before: このカーソルより新しい行（前のページ）
+    with_total: Trueなら estimate_count による件数の概算を付ける（絞り込み無しの一覧用）
+    """
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+
+    if before_key:
+        created_at, row_id = before_key
+        if created_at is None:
+            queries = [_undated_rows(query.filter(model.id > row_id), model, ascending=True),
+                       _dated_rows(query, model, ascending=True)]
+        else:
+            queries = [_dated_rows(query.filter(_newer_than(model, created_at, row_id)), model, ascending=True)]
+        rows = _fetch(queries, per_page + 1)
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after_key is None:
+            queries = [_dated_rows(query, model, ascending=False),
+                       _undated_rows(query, model, ascending=False)]
+        elif after_key[0] is None:
+            queries = [_undated_rows(query.filter(model.id < after_key[1]), model, ascending=False)]
+        else:
+            queries = [_dated_rows(query.filter(_older_than(model, *after_key)), model, ascending=False),
+                       _undated_rows(query, model, ascending=False)]
+        rows = _fetch(queries, per_page + 1)
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after_key is not None
+
+    total, total_is_estimate = estimate_count(model) if with_total else (None, False)
+
+    return KeysetPage(
+        items=items,
+        has_next=has_next and bool(items),
+        has_prev=has_prev and bool(items),
+        next_cursor=encode_cursor(items[-1]) if items else None,
+        prev_cursor=encode_cursor(items[0]) if items else None,
+        total=total,
+        total_is_estimate=total_is_estimate,
+    )
@@ -0,0 +1,166 @@
+"""
+ユーザー・IPごとのLLM呼び出しのレート制限
+
+claude_helper が呼び出しのたびに check() を呼び、機能（vocab, grammar, furigana,
+akinator など）ごとの予算を超えていれば RateLimitExceeded を送出する。
+ログイン中のユーザーはユーザーIDとIPの両方、未ログインはIPだけで数えるため、
+Cookie を消しても制限は外れない。IPは複数人で共有されることがあるので、
+IPの上限はユーザーの上限の IP_LIMIT_MULTIPLIER 倍にする。
+
+アルゴリズムはスライディングウィンドウカウンター（現在のウィンドウの件数 +
+前のウィンドウの件数 × 残りの割合）。保存先は2つ:
+
+- memory（既定）: プロセス内の辞書。ワーカーごとに数える
+- db: アプリのDBの rate_limit_counters テーブルに UPSERT で加算する。
+  gunicorn のワーカーが複数でも同じ上限を共有できる
+
+予算は RATE_LIMITS="grammar=20/60,furigana=60/60" のように 機能=回数/秒 で上書きできる。
+"""
+
+import os
+import threading
+import time
+
+from flask import current_app, has_request_context, request
+from flask_login import current_user
+
+from models import db, RateLimitCounter
+
+# 機能ごとの既定の予算（回数, 秒）
+DEFAULT_LIMITS = {
+    'vocab': (30, 60),
+    'grammar': (20, 60),
+    'furigana': (60, 60),
+    'akinator': (30, 60),
+    'other': (30, 60),
+}
+
+IP_LIMIT_MULTIPLIER = int(os.getenv('RATE_LIMIT_IP_MULTIPLIER', '3'))
+
+
+def parse_limits(spec):
+    """'grammar=20/60,vocab=30/60' を {'grammar': (20, 60), ...} にする"""
+    limits = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        feature, budget = item.split('=', 1)
+        try:
+            count, seconds = budget.split('/')
+            limits[feature.strip()] = (int(count), int(seconds))
+        except ValueError:
+            print(f"Invalid RATE_LIMITS entry: {item}")
+    return limits
+
+
+LIMITS = dict(DEFAULT_LIMITS, **parse_limits(os.getenv('RATE_LIMITS')))
+
+
+class RateLimitExceeded(Exception):
+    """予算を超えたため呼び出しを行わなかった"""
+
+    def __init__(self, key, feature, retry_after):
+        super().__init__(f"rate limit for {feature} exceeded by {key}; retry after {retry_after:.0f}s")
+        self.key = key
+        self.feature = feature
+        self.retry_after = retry_after
+
+
+def _sliding_count(previous, current, now, period):
+    """前のウィンドウの件数を経過割合で減らして現在の件数に足す"""
+    elapsed = (now % period) / period
+    return previous * (1 - elapsed) + current
+
+
+class MemoryBackend:
+    """プロセス内でウィンドウごとの件数を数える"""
+
+    def __init__(self):
+        self._counts = {}  # (bucket, period, window) -> hits
+        self._lock = threading.Lock()
+        self._pruned_window = {}
+
+    def hit(self, bucket, period, now):
+        """今回の1件を加え、スライディングウィンドウでの件数を返す"""
+        window = int(now // period)
+        with self._lock:
+            current = self._counts.get((bucket, period, window), 0) + 1
+            self._counts[(bucket, period, window)] = current
+            previous = self._counts.get((bucket, period, window - 1), 0)
+            self._prune(period, window)
+        return _sliding_count(previous, current, now, period)
+
+    def _prune(self, period, window):
+        # ウィンドウが進んだときだけ、その周期の古い件数を消す
+        if self._pruned_window.get(period) == window:
+            return
+        self._pruned_window[period] = window
+        for entry in list(self._counts):
+            if entry[1] == period and entry[2] < window - 1:
+                del self._counts[entry]
+
+
+class DatabaseBackend:
+    """アプリのDBで件数を共有する（複数ワーカー用）"""
+
+    def __init__(self, prune_every=1000):
+        self.prune_every = prune_every
+        self._hits = 0
+
+    def hit(self, bucket, period, now):
+        window = int(now // period)
+        table = RateLimitCounter.__table__
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        upsert = insert(table).values(bucket=bucket, window_index=window, hits=1, expires_at=(window + 2) * period)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[table.c.bucket, table.c.window_index],
+            set_={'hits': table.c.hits + 1}).returning(table.c.hits)
+        # リクエストのセッションとは別の接続で、1件ごとにコミットする
+        with db.engine.begin() as conn:
+            current = conn.execute(upsert).scalar()
+            previous = conn.execute(db.select(table.c.hits).where(
+                table.c.bucket == bucket, table.c.window_index == window - 1)).scalar() or 0
+            self._hits += 1
+            if self._hits % self.prune_every == 0:
+                conn.execute(table.delete().where(table.c.expires_at < now))
+        return _sliding_count(previous, current, now, period)
+
+
+def _make_backend():
+    if os.getenv('RATE_LIMIT_BACKEND', 'memory') == 'db':
+        return DatabaseBackend()
+    return MemoryBackend()
+
+
+backend = _make_backend()
+
+
+def request_keys():
+    """レート制限のキーと上限の倍率（リクエスト外では空）"""
+    if not has_request_context():
+        return []
+    keys = []
+    if hasattr(current_app, 'login_manager') and current_user.is_authenticated:
+        keys.append((f'user:{current_user.id}', 1))
+    if request.remote_addr:
+        keys.append((f'ip:{request.remote_addr}', IP_LIMIT_MULTIPLIER))
+    return keys
+
+
+def check(feature, now=None):
+    """この呼び出しを数え、いずれかのキーが予算を超えていれば RateLimitExceeded を送出する"""
+    count_limit, period = LIMITS.get(feature) or LIMITS['other']
+    now = time.time() if now is None else now
+    for key, multiplier in request_keys():
+        bucket = f'{feature}:{key}'
+        try:
+            count = backend.hit(bucket, period, now)
+        except Exception as e:
+            # 保存先の障害で機能を止めない
+            print(f"Rate limit backend error: {e}")
+            return
+        if count > count_limit * multiplier:
+            raise RateLimitExceeded(key, feature, period - now % period)
@@ -0,0 +1,119 @@
+"""
+リクエストスレッドを止めない外部APIのリトライ制御
+
+time.sleep によるバックオフの代わりに、次の3つで再試行の量をプロセス全体で抑える。
+
+- リトライ予算: 呼び出しごとに budget_ratio 分のトークンが貯まり、再試行1回で1つ使う。
+  予算が無ければ再試行せずにすぐ失敗を返す（障害時に再試行が負荷を倍増させない）
+- Retry-After ゲート: 429/529 を受けたら Retry-After ヘッダー（無ければジッター付きの
+  既定値）の間、そのサービスへの呼び出しを送らずに RetryBlockedError ですぐ失敗させる
+- 再試行は待たずに即時に行い、接続エラーやサーバーエラーなど一時的な失敗に限る
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class RetryBlockedError(Exception):
+    """Retry-After の期間中のため呼び出しを行わなかった"""
+
+    def __init__(self, service, retry_after):
+        super().__init__(f"{service} is throttled for another {retry_after:.1f}s")
+        self.service = service
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(exc):
+    """例外のHTTPレスポンスから Retry-After（秒）を取り出す（無ければNone）"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    def __init__(self, service, budget_ratio=0.1, max_budget=10.0, min_budget_per_second=0.1,
+                 default_cooldown=2.0, max_cooldown=60.0):
+        self.service = service
+        self.budget_ratio = budget_ratio
+        self.max_budget = max_budget
+        self.min_budget_per_second = min_budget_per_second
+        self.default_cooldown = default_cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._budget = max_budget
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+
+    def blocked_for(self):
+        """Retry-After の残り秒数（ブロックされていなければ0）"""
+        return max(0.0, self._blocked_until - time.monotonic())
+
+    def record_call(self):
+        """呼び出し1回ごとに予算を積み立てる"""
+        with self._lock:
+            self._refill()
+            self._budget = min(self.max_budget, self._budget + self.budget_ratio)
+
+    def try_acquire_retry(self):
+        """再試行1回分の予算を使う（足りなければFalse）"""
+        with self._lock:
+            self._refill()
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
+
+    def throttled(self, retry_after=None):
+        """429/529 を受けたときに呼ぶ。呼び出し側全体を Retry-After の間止める"""
+        if retry_after is None:
+            # 全スレッドが同時に再開しないようジッターを付ける
+            retry_after = self.default_cooldown * random.uniform(0.5, 1.5)
+        until = time.monotonic() + min(retry_after, self.max_cooldown)
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, until)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._budget = min(self.max_budget, self._budget + (now - self._refilled_at) * self.min_budget_per_second)
+        self._refilled_at = now
+
+
+def call_with_retry(policy, func, retryable=(), throttled=(), max_attempts=2):
+    """func を呼び、一時的な失敗なら予算の範囲で待たずに再試行する
+
+    throttled の例外（レート制限など）は再試行せず、policy を Retry-After の間ブロックして送出する。
+    ブロック中は func を呼ばずに RetryBlockedError を送出する。
+    """
+    for attempt in range(max_attempts):
+        blocked = policy.blocked_for()
+        if blocked:
+            raise RetryBlockedError(policy.service, blocked)
+        policy.record_call()
+        try:
+            return func()
+        except throttled as e:
+            policy.throttled(retry_after_seconds(e))
+            raise
+        except retryable:
+            if attempt == max_attempts - 1 or not policy.try_acquire_retry():
+                raise
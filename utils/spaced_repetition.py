@@ -0,0 +1,242 @@
+"""
+フラッシュカードの間隔反復スケジューラ
+
+FlashcardProgress に保存したカードごとの状態（stability / difficulty / last_interval）から
+次回復習日を計算する。スケジューラは環境変数 FLASHCARD_SCHEDULER で切り替える
+（'fsrs' または 'sm2'、デフォルトは 'fsrs'）。
+
+回答は「覚えた」「覚えていない」の2択なので、FSRSでは Good / Again、
+SM-2 では品質 4 / 1 として扱う。
+"""
+
+import math
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# 「覚えていない」と回答したカードを次に出題するまでの時間
+RELEARN_DELAY = timedelta(minutes=10)
+
+# 間隔の上限（日）
+MAXIMUM_INTERVAL_DAYS = 365
+
+# 次の復習まで この日数以上空いたカードを「覚えた」とみなす（「覚えていない」で0に戻る）
+WELL_LEARNED_INTERVAL_DAYS = 7
+
+
+def _elapsed_days(progress, now):
+    """前回の復習からの経過日数"""
+    if progress.last_review is None:
+        return 0.0
+    return max((now - progress.last_review).total_seconds() / 86400, 0.0)
+
+
+class SM2Scheduler:
+    """SuperMemo SM-2
+
+    difficulty 列には ease factor（初期値2.5、下限1.3）を保存し、
+    stability 列には last_interval と同じ値を入れる。
+    """
+    name = 'sm2'
+
+    INITIAL_EASE = 2.5
+    MINIMUM_EASE = 1.3
+
+    def _quality(self, result):
+        return 4 if result == 'learned' else 1
+
+    def review(self, progress, result, now=None):
+        """回答結果でカードの状態を更新し、次回復習日を返す"""
+        now = now or datetime.utcnow()
+        ease = progress.difficulty or self.INITIAL_EASE
+        last_interval = progress.last_interval or 0.0
+        quality = self._quality(result)
+
+        ease = max(self.MINIMUM_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+        if result == 'learned':
+            if last_interval < 1:
+                interval = 1.0
+            elif last_interval < 6:
+                interval = 6.0
+            else:
+                interval = min(round(last_interval * ease), MAXIMUM_INTERVAL_DAYS)
+            next_review = now + timedelta(days=interval)
+        else:
+            progress.lapses = (progress.lapses or 0) + 1
+            interval = 0.0
+            next_review = now + RELEARN_DELAY
+
+        progress.difficulty = ease
+        progress.stability = interval
+        progress.last_interval = interval
+        progress.last_review = now
+        progress.next_review = next_review
+        return next_review
+
+
+class FSRSScheduler:
+    """FSRS-4.5（Free Spaced Repetition Scheduler）
+
+    DESIRED_RETENTION の記憶保持率を保てる間隔で出題する。
+    """
+    name = 'fsrs'
+
+    WEIGHTS = (0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+               0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755)
+    DESIRED_RETENTION = 0.9
+    DECAY = -0.5
+    FACTOR = 19 / 81
+
+    AGAIN = 1
+    GOOD = 3
+
+    def _rating(self, result):
+        return self.GOOD if result == 'learned' else self.AGAIN
+
+    def initial_stability(self, rating):
+        return self.WEIGHTS[rating - 1]
+
+    def initial_difficulty(self, rating):
+        w = self.WEIGHTS
+        return min(max(w[4] - (rating - 3) * w[5], 1.0), 10.0)
+
+    def retrievability(self, elapsed_days, stability):
+        return (1 + self.FACTOR * elapsed_days / stability) ** self.DECAY
+
+    def interval_for(self, stability):
+        """保持率がDESIRED_RETENTIONに下がるまでの日数"""
+        interval = stability / self.FACTOR * (self.DESIRED_RETENTION ** (1 / self.DECAY) - 1)
+        return min(max(round(interval), 1), MAXIMUM_INTERVAL_DAYS)
+
+    def next_difficulty(self, difficulty, rating):
+        w = self.WEIGHTS
+        updated = difficulty - w[6] * (rating - 3)
+        # 初期難易度へ平均回帰させる
+        updated = w[7] * self.initial_difficulty(self.GOOD) + (1 - w[7]) * updated
+        return min(max(updated, 1.0), 10.0)
+
+    def next_stability(self, difficulty, stability, retrievability, rating):
+        w = self.WEIGHTS
+        if rating == self.AGAIN:
+            return (w[11] * difficulty ** -w[12] * ((stability + 1) ** w[13] - 1)
+                    * math.exp(w[14] * (1 - retrievability)))
+        return stability * (1 + math.exp(w[8]) * (11 - difficulty) * stability ** -w[9]
+                            * (math.exp(w[10] * (1 - retrievability)) - 1))
+
+    def review(self, progress, result, now=None):
+        """回答結果でカードの状態を更新し、次回復習日を返す"""
+        now = now or datetime.utcnow()
+        rating = self._rating(result)
+
+        if not progress.stability:
+            stability = self.initial_stability(rating)
+            difficulty = self.initial_difficulty(rating)
+        else:
+            retrievability = self.retrievability(_elapsed_days(progress, now), progress.stability)
+            difficulty = self.next_difficulty(progress.difficulty or self.initial_difficulty(self.GOOD), rating)
+            stability = self.next_stability(difficulty, progress.stability, retrievability, rating)
+
+        if rating == self.AGAIN:
+            progress.lapses = (progress.lapses or 0) + 1
+            interval = 0.0
+            next_review = now + RELEARN_DELAY
+        else:
+            interval = float(self.interval_for(stability))
+            next_review = now + timedelta(days=interval)
+
+        progress.stability = stability
+        progress.difficulty = difficulty
+        progress.last_interval = interval
+        progress.last_review = now
+        progress.next_review = next_review
+        return next_review
+
+
+SCHEDULERS = {
+    'fsrs': FSRSScheduler,
+    'sm2': SM2Scheduler,
+}
+
+
+def get_scheduler(name=None):
+    """設定されたスケジューラのインスタンスを返す"""
+    name = (name or os.getenv('FLASHCARD_SCHEDULER', 'fsrs')).lower()
+    return SCHEDULERS.get(name, FSRSScheduler)()
+
+
+# 旧方式（study_countに応じた固定の5段階）の間隔
+LEGACY_INTERVAL_DAYS = np.array([1, 3, 7, 14, 30], dtype=float)
+
+
+def initial_state_from_legacy(study_counts, statuses, scheduler):
+    """旧方式の進捗から初期状態をまとめて計算する（ベクトル演算）
+
+    旧方式で予定されていた間隔をそのまま stability / last_interval とみなし、
+    'pending'（覚えていない）のカードは難易度を高めに設定する。
+    戻り値は (stability, difficulty, last_interval) の numpy 配列。
+    """
+    study_counts = np.clip(np.nan_to_num(np.asarray(study_counts, dtype=float)), 0, None)
+    is_pending = np.asarray(statuses) != 'learned'
+
+    # 旧方式は回答時にstudy_countを増やしてから間隔を決めていた
+    ladder_index = np.clip(study_counts, 0, len(LEGACY_INTERVAL_DAYS) - 1).astype(int)
+    last_interval = LEGACY_INTERVAL_DAYS[ladder_index]
+
+    if isinstance(scheduler, SM2Scheduler):
+        difficulty = np.where(is_pending, scheduler.INITIAL_EASE - 0.54, scheduler.INITIAL_EASE)
+        difficulty = np.maximum(difficulty, scheduler.MINIMUM_EASE)
+        stability = last_interval.copy()
+    else:
+        good = scheduler.initial_difficulty(scheduler.GOOD)
+        again = scheduler.initial_difficulty(scheduler.AGAIN)
+        difficulty = np.where(is_pending, again, good)
+        # interval_for の逆関数：保持率90%で last_interval 日持つ stability
+        stability = last_interval * scheduler.FACTOR / (
+            scheduler.DESIRED_RETENTION ** (1 / scheduler.DECAY) - 1)
+
+    return stability, difficulty, last_interval
+
+
+def reschedule_legacy_progress(batch_size=1000, scheduler=None):
+    """状態未設定の FlashcardProgress に初期状態をまとめて設定する
+
+    next_review は既存の値を維持する。更新した件数を返す。
+    """
+    from sqlalchemy import update
+    from models import db, FlashcardProgress
+
+    scheduler = scheduler or get_scheduler()
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(
+            FlashcardProgress.id, FlashcardProgress.study_count,
+            FlashcardProgress.status, FlashcardProgress.updated_at
+        ).filter(
+            FlashcardProgress.id > last_id,
+            FlashcardProgress.stability.is_(None)
+        ).order_by(FlashcardProgress.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        ids, study_counts, statuses, updated_ats = zip(*rows)
+        stability, difficulty, last_interval = initial_state_from_legacy(study_counts, statuses, scheduler)
+
+        db.session.execute(update(FlashcardProgress), [
+            {
+                'id': row_id,
+                'stability': float(s),
+                'difficulty': float(d),
+                'last_interval': float(i),
+                'last_review': reviewed_at,
+                'lapses': 0,
+            }
+            for row_id, s, d, i, reviewed_at in zip(ids, stability, difficulty, last_interval, updated_ats)
+        ])
+        db.session.commit()
+        updated += len(ids)
+        last_id = ids[-1]
+
+    return updated
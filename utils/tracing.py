@@ -0,0 +1,262 @@
+"""
+外部API呼び出しのスパン・トレース
+
+各リクエストをルートスパンとし、その中で行った Claude / Google（Sheets・Drive・
+Docs・YouTube）への呼び出しを子スパンとして所要時間・サイズ・ステータス・
+キャッシュヒット・呼び出し元のルートと一緒に記録する。
+
+- 直近のトレースはメモリに保持し、/admin/traces で確認できる
+- TRACE_EXPORT_PATH を設定すると、OpenTelemetry の OTLP/JSON 形式
+  （1行に1つの ExportTraceServiceRequest）でファイルに書き出す
+- 外部APIスパンの所要時間は utils.latency にも記録され、既存のメトリクス集計に使われる
+"""
+
+import atexit
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import has_request_context, request
+
+from utils.latency import record_latency
+
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH')
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'practice-japanese')
+
+# メモリに保持する直近のトレース数
+RECENT_TRACES = 200
+
+# OTLPのSpanKind
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'service', 'kind',
+                 'start_ns', 'end_ns', 'attributes', 'error', 'children')
+
+    def __init__(self, name, service=None, kind=KIND_CLIENT, parent=None, attributes=None):
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.service = service
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.children = []
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, message):
+        self.error = message
+
+    @property
+    def started_at(self):
+        return datetime.utcfromtimestamp(self.start_ns / 1e9)
+
+    @property
+    def duration(self):
+        """秒単位の所要時間（終了前は現在まで）"""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def service_seconds(self):
+        """子スパンのサービスごとの合計時間"""
+        totals = {}
+        for child in self.children:
+            if child.service and not child.attributes.get('cache.hit'):
+                totals[child.service] = totals.get(child.service, 0.0) + child.duration
+        return totals
+
+
+_local = threading.local()
+_recent = deque(maxlen=RECENT_TRACES)
+
+
+def current_span():
+    return getattr(_local, 'span', None)
+
+
+def _route():
+    if has_request_context():
+        return request.endpoint or '<unmatched>'
+    return '<background>'
+
+
+@contextmanager
+def trace_span(service, operation, cache_hit=False, **attributes):
+    """外部APIの呼び出し1回をスパンとして記録する
+
+    with trace_span('google', 'sheets.get', sheet='N5') as span:
+        response = ...
+        span.set_attribute('http.status_code', response.status_code)
+    """
+    parent = current_span()
+    span = Span(f'{service} {operation}', service=service, parent=parent, attributes=attributes)
+    span.set_attribute('peer.service', service)
+    span.set_attribute('http.route', _route())
+    span.set_attribute('cache.hit', bool(cache_hit))
+    _local.span = span
+    try:
+        yield span
+    except Exception as e:
+        span.set_error(f'{type(e).__name__}: {e}')
+        raise
+    finally:
+        _local.span = parent
+        span.end_ns = time.time_ns()
+        if not cache_hit:
+            record_latency(service, span.duration)
+        if parent is not None:
+            parent.children.append(span)
+        else:
+            # リクエスト外（スケジューラのジョブなど）の呼び出しはそれ自体を1トレースとする
+            _finish_trace(span)
+
+
+def _finish_trace(root):
+    _recent.append(root)
+    # 外部API呼び出しを含まないリクエストは書き出さない
+    if exporter is not None and (root.children or root.service):
+        exporter.add(root)
+
+
+def recent_traces(limit=50):
+    """直近に完了したトレース（新しい順）"""
+    return list(reversed(_recent))[:limit]
+
+
+# --- Flask ---
+
+def _start_request():
+    _local.span = Span(f'{request.method} {request.endpoint or "<unmatched>"}', kind=KIND_SERVER,
+                       attributes={'http.method': request.method, 'http.route': _route(),
+                                   'http.target': request.path})
+
+
+def _finish_request(response):
+    span = current_span()
+    if span is not None and span.kind == KIND_SERVER:
+        span.set_attribute('http.status_code', response.status_code)
+        span.set_attribute('http.response.size', response.content_length)
+    return response
+
+
+def _teardown_request(exc):
+    span = current_span()
+    _local.span = None
+    if span is None or span.kind != KIND_SERVER:
+        return
+    if exc is not None:
+        span.set_error(f'{type(exc).__name__}: {exc}')
+    span.end_ns = time.time_ns()
+    _finish_trace(span)
+
+
+def init_app(app):
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+
+
+# --- OTLP/JSON ファイルエクスポーター ---
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_span(span):
+    data = {
+        'traceId': span.trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': span.kind,
+        'startTimeUnixNano': str(span.start_ns),
+        'endTimeUnixNano': str(span.end_ns),
+        'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in span.attributes.items()],
+        # STATUS_CODE_OK = 1, STATUS_CODE_ERROR = 2
+        'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+    }
+    if span.parent_id:
+        data['parentSpanId'] = span.parent_id
+    return data
+
+
+def _flatten(root):
+    spans = [root]
+    for child in root.children:
+        spans.extend(_flatten(child))
+    return spans
+
+
+def to_otlp(traces):
+    """トレースのリストをOTLP/JSONの ExportTraceServiceRequest にする"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+        'scopeSpans': [{
+            'scope': {'name': 'utils.tracing'},
+            'spans': [_otlp_span(span) for trace in traces for span in _flatten(trace)],
+        }],
+    }]}
+
+
+class OTLPFileExporter:
+    """完了したトレースを溜め、flush_interval秒ごとにOTLP/JSONの1行としてファイルに追記"""
+
+    def __init__(self, path, flush_interval=5.0, max_pending=1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, trace):
+        with self._lock:
+            if len(self._pending) < self.max_pending:
+                self._pending.append(trace)
+
+    def flush(self):
+        with self._lock:
+            traces, self._pending = self._pending, []
+        if not traces:
+            return 0
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(to_otlp(traces), ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"Trace export error: {e}")
+            return 0
+        return len(traces)
+
+    def close(self):
+        self._stopped.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+
+exporter = OTLPFileExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None